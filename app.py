@@ -1,117 +1,449 @@
-from flask import Flask, request, jsonify, render_template, send_from_directory
+from flask import (Flask, Response, request, jsonify, render_template, send_file, send_from_directory,
+                   stream_with_context)
 from urllib.parse import urlparse
+import itertools
+import json
 import os
-import threading
+import socket
 import uuid
 import time
 
 # Import functions from existing CLI module
-from main import obtener_urls_directas, explorar_sitio, filtrar_urls_administrativas
+from main import obtener_urls_directas, explorar_sitio, guardar_cambios, ARCHIVO_ESTADO
+from rastreador.acceso import cache_urls_base
+from rastreador.alcance import Alcance, leer_regla
+from rastreador.cache_http import CacheHTTP
+from rastreador.cache_resultados import CacheResultados, CacheResultadosSQLite
+from rastreador.canonico import PARAMETROS_DENEGADOS, Canonizador
+from rastreador.checkpoint import Checkpoint, leer_checkpoint
+from rastreador.clasificador import CATEGORIAS, clasificar_url
+from rastreador.cliente import obtener_cliente
+from rastreador.constantes import CONCURRENCIA_GLOBAL
+from rastreador.estado import EstadoRastreo
+from rastreador.metricas import combinar, exportar, indicador, registro
+from rastreador.perfilado import Perfilador
+from rastreador.planificador import ColaLlena, PlanificadorSQLite, PlanificadorTrabajos, normalizar_objetivo
+from rastreador.salida import (FORMATOS, GRUPO_NO_ADMINISTRATIVA, GRUPOS_TODAS, SalidaIncremental, es_sitio_peru,
+                               escribir_agrupado, leer_grupos, leer_urls, ordenar_resultados)
+from rastreador.registro import configurar_registro
+from rastreador.trabajos import AlmacenTrabajos, AlmacenTrabajosSQLite, publico
 
 app = Flask(__name__, static_folder="static", template_folder="templates")
 
-# Simple in-memory job store. For production use persistent queue (Redis, RQ, Celery, etc.)
-jobs = {}
-jobs_lock = threading.Lock()
+# Crawl log messages: LOG_LEVEL (DEBUG, INFO, WARNING, ERROR) and LOG_FORMAT ('text' or one JSON object per line)
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text')
+configurar_registro(LOG_LEVEL, 'json' if LOG_FORMAT == 'json' else 'texto',
+                    plantilla='%(asctime)s %(levelname)s %(name)s: %(message)s')
 
+# Job backend: 'memory' (single process, crawls run on threads of the web process) or 'sqlite'
+# (JOB_DB_PATH shared by every gunicorn worker; crawls run in `python worker.py` processes).
+# Either way job metadata has a TTL and a maximum count, and each job's output file and URL lists
+# are written to JOB_RESULTS_DIR/<job_id>/ and served page by page from /results/<job_id>
+JOB_BACKEND = os.environ.get('JOB_BACKEND', 'memory')
+JOB_DB_PATH = os.environ.get('JOB_DB_PATH', 'trabajos.sqlite')
+JOB_RESULTS_DIR = os.environ.get('JOB_RESULTS_DIR', 'job_results')
+JOB_TTL = int(os.environ.get('JOB_TTL', 3600))
+JOB_MAX = int(os.environ.get('JOB_MAX', 500))
+# Progress events of a finished job are kept this many seconds for late /events clients
+CHANNEL_TTL = int(os.environ.get('CHANNEL_TTL', 300))
+# A running SQLite job whose worker process sends no heartbeat for this many seconds is marked failed
+JOB_LEASE_SECONDS = int(os.environ.get('JOB_LEASE_SECONDS', 60))
+if JOB_BACKEND == 'sqlite':
+    jobs = AlmacenTrabajosSQLite(JOB_DB_PATH, JOB_RESULTS_DIR, ttl=JOB_TTL, max_trabajos=JOB_MAX,
+                                 ttl_canales=CHANNEL_TTL, concesion=JOB_LEASE_SECONDS)
+elif JOB_BACKEND == 'memory':
+    jobs = AlmacenTrabajos(JOB_RESULTS_DIR, ttl=JOB_TTL, max_trabajos=JOB_MAX, ttl_canales=CHANNEL_TTL)
+else:
+    raise ValueError(f"Unknown JOB_BACKEND {JOB_BACKEND!r} (use 'memory' or 'sqlite')")
+# Default and maximum page size of /results
+RESULTS_PAGE_SIZE = 100
+MAX_RESULTS_PAGE_SIZE = 1000
 
-def process_job(job_id, url, depth):
-    with jobs_lock:
-        jobs[job_id]['status'] = 'running'
-        jobs[job_id]['message'] = 'Connecting to target...'
+# Upper bound for the per-job crawl concurrency accepted from clients
+MAX_CONCURRENCY = 20
+# Safety cap on pages fetched per job (crawls are otherwise bounded by depth)
+MAX_PAGES = int(os.environ.get('MAX_PAGES', 20000))
 
+# Optional persistent HTTP cache shared by all jobs (SQLite file path)
+HTTP_CACHE_PATH = os.environ.get('HTTP_CACHE_PATH')
+http_cache = CacheHTTP(HTTP_CACHE_PATH, tamano_maximo=int(os.environ.get('HTTP_CACHE_MAX_MB', 500)) * 1024 * 1024) \
+    if HTTP_CACHE_PATH else None
+
+# Per-URL crawl state used by incremental jobs (SQLite file path)
+CRAWL_STATE_PATH = os.environ.get('CRAWL_STATE_PATH', ARCHIVO_ESTADO)
+
+# Per-job crawl checkpoints; an interrupted job can be resumed with POST /resume/<job_id>
+CHECKPOINT_DIR = os.environ.get('CHECKPOINT_DIR', 'checkpoints')
+
+# Crawls running at the same time and jobs allowed to wait; beyond that /extract answers 429
+CRAWL_WORKERS = int(os.environ.get('CRAWL_WORKERS', 2))
+QUEUE_CAPACITY = int(os.environ.get('QUEUE_CAPACITY', 20))
+
+# Finished non-incremental results are reused for identical requests within the TTL
+RESULT_CACHE_TTL = int(os.environ.get('RESULT_CACHE_TTL', 3600))
+RESULT_CACHE_MAX = int(os.environ.get('RESULT_CACHE_MAX', 256))
+if JOB_BACKEND == 'sqlite':
+    result_cache = CacheResultadosSQLite(JOB_DB_PATH, ttl=RESULT_CACHE_TTL, max_entradas=RESULT_CACHE_MAX)
+else:
+    result_cache = CacheResultados(ttl=RESULT_CACHE_TTL, max_entradas=RESULT_CACHE_MAX)
+# Job fields that describe a single run rather than its result
+RUN_FIELDS = ('created_at', 'finished_at', 'queue_wait_s', 'run_time_s', 'resumed', 'cached', 'cached_at',
+              'hosts', 'profile', '_profile', 'canonicalization', 'out_of_scope_links')
+
+
+def result_key(url, depth, sitemap=None, respect_robots=True, formats=(), compress=False, scope=None,
+               canonical=None):
+    return (normalizar_objetivo(url), depth, sitemap, respect_robots, formats, compress, config_key(scope),
+            config_key(canonical))
+
+
+def scope_config(scope):
+    """
+    Validated crawl scope (rastreador.alcance) from the /extract 'scope' object:
+    {"include": [rules], "exclude": [rules], "max_query_length": n, "subdomains": bool}.
+    Rules are 'type:value' strings (glob, regex, path, ext, type, domain). Raises ValueError.
+    """
+    if not isinstance(scope, dict):
+        raise ValueError("'scope' must be an object")
+    unknown = set(scope) - {'include', 'exclude', 'max_query_length', 'subdomains'}
+    if unknown:
+        raise ValueError(f"Unknown 'scope' fields: {', '.join(sorted(unknown))}")
+    rules = []
+    for field, include in (('include', True), ('exclude', False)):
+        values = scope.get(field) or []
+        if isinstance(values, str):
+            values = [values]
+        if not isinstance(values, list) or not all(isinstance(value, str) for value in values):
+            raise ValueError(f"'scope.{field}' must be a list of 'type:value' rules")
+        rules += [leer_regla(value, incluir=include) for value in values]
+    max_query = scope.get('max_query_length')
+    if max_query is not None and (isinstance(max_query, bool) or not isinstance(max_query, int) or max_query < 0):
+        raise ValueError("'scope.max_query_length' must be a non-negative integer")
+    return Alcance(rules, max_consulta=max_query, subdominios=bool(scope.get('subdomains', False))).configuracion()
+
+
+def canonical_config(canonical):
+    """
+    Validated URL canonicalization options (rastreador.canonico) from the /extract 'canonical' object:
+    {"keep_query": bool, "allowed_params": [names], "denied_params": [names], "host_aliases": [hosts],
+    "fold_www": bool}. allowed_params implies keep_query; denied_params are removed on top of the
+    tracking and session parameters. Raises ValueError.
+    """
+    if not isinstance(canonical, dict):
+        raise ValueError("'canonical' must be an object")
+    unknown = set(canonical) - {'keep_query', 'allowed_params', 'denied_params', 'host_aliases', 'fold_www'}
+    if unknown:
+        raise ValueError(f"Unknown 'canonical' fields: {', '.join(sorted(unknown))}")
+    lists = {}
+    for field in ('allowed_params', 'denied_params', 'host_aliases'):
+        values = canonical.get(field)
+        if isinstance(values, str):
+            values = [values]
+        if values is not None and (not isinstance(values, list) or
+                                   not all(isinstance(value, str) and value for value in values)):
+            raise ValueError(f"'canonical.{field}' must be a list of strings")
+        lists[field] = values
+    for alias in lists['host_aliases'] or ():
+        try:
+            urlparse(alias if '://' in alias else '//' + alias).port
+        except ValueError:
+            raise ValueError(f"Invalid host in 'canonical.host_aliases': {alias!r}")
+    allowed = lists['allowed_params']
+    return {
+        'alias_host': lists['host_aliases'] or [],
+        'plegar_www': bool(canonical.get('fold_www', True)),
+        'conservar_consulta': bool(canonical.get('keep_query', False)) or allowed is not None,
+        'parametros_permitidos': None if allowed is None else sorted({name.lower() for name in allowed}),
+        'parametros_denegados': list(PARAMETROS_DENEGADOS) + (lists['denied_params'] or []),
+    }
+
+
+def config_key(config):
+    # Hashable form of a scope_config() or canonical_config() result for the coalescing and result-cache keys
+    return json.dumps(config, sort_keys=True) if config else None
+
+
+# Values of the /extract 'sitemap' option and the crawl mode each one maps to
+SITEMAP_MODES = {'seed': 'semilla', 'only': 'solo'}
+
+
+# Values of the /extract 'profile' option and the profiler mode each one maps to (true means cprofile).
+# The artifacts are written to JOB_RESULTS_DIR/<job_id>/profile/ and served by /profile/<job_id>
+PROFILE_MODES = {'cprofile': 'cprofile', 'sampling': 'muestreo'}
+
+
+# Result list each discovered URL belongs to, by administrative category
+LIST_BY_CATEGORY = {'departamento': 'departamentos', 'provincia': 'provincias', 'distrito': 'distritos',
+                    'otra': 'otras'}
+
+
+def publish(job_id, kind, data):
+    # Progress events streamed by /events/<job_id>; the channel lives in the job store
+    channel = jobs.canal(job_id)
+    if channel is not None:
+        channel.publicar(kind, data)
+
+
+def close_channel(job_id):
+    channel = jobs.canal(job_id)
+    if channel is None:
+        return
+    job = jobs.obtener(job_id) or {}
+    channel.publicar('done' if job.get('status') == 'done' else 'failed', publico(job))
+    channel.cerrar()
+
+
+def checkpoint_path(job_id):
+    return os.path.join(CHECKPOINT_DIR, f"{job_id}.log")
+
+
+# With the SQLite backend crawls run in worker processes, which publish a snapshot of their
+# metrics to the job store at most every METRICS_PUBLISH_INTERVAL seconds and when a job ends
+METRICS_PUBLISH_INTERVAL = float(os.environ.get('METRICS_PUBLISH_INTERVAL', 5))
+# Live job counters (visited, pending, hosts...) are written to the job store at most every
+# PROGRESS_UPDATE_INTERVAL seconds or PROGRESS_UPDATE_PAGES pages, and once more when the crawl ends
+PROGRESS_UPDATE_INTERVAL = float(os.environ.get('PROGRESS_UPDATE_INTERVAL', 0.5))
+PROGRESS_UPDATE_PAGES = int(os.environ.get('PROGRESS_UPDATE_PAGES', 100))
+PROCESS_ID = f"{socket.gethostname()}:{os.getpid()}"
+_metrics_published_at = 0.0
+
+
+def publish_metrics(force=False):
+    global _metrics_published_at
+    now = time.monotonic()
+    if JOB_BACKEND != 'sqlite' or (not force and now - _metrics_published_at < METRICS_PUBLISH_INTERVAL):
+        return
+    _metrics_published_at = now
+    jobs.publicar_metricas(PROCESS_ID, registro.instantanea())
+
+
+def process_job(job_id, url, depth, concurrency=CONCURRENCIA_GLOBAL, incremental=False, max_age_hours=24,
+                resume=False, sitemap=None, respect_robots=True, formats=(), compress=False, profile=None,
+                scope=None, canonical=None):
+    message = 'Resuming crawl...' if resume else 'Connecting to target...'
+    jobs.actualizar(job_id, status='running', message=message)
+    publish(job_id, 'status', {'status': 'running', 'message': message})
+
+    # Opt-in CPU (cProfile or sampling) and tracemalloc profile of this crawl, in this process
+    profiler = None
+    if profile is not None:
+        profiler = Perfilador(os.path.join(jobs.directorio_trabajo(job_id), 'profile'),
+                              PROFILE_MODES[profile]).iniciar()
     try:
-        urls_directas = obtener_urls_directas(url)
-        if not urls_directas:
-            with jobs_lock:
-                jobs[job_id].update({'status': 'error', 'message': 'Could not access target URL'})
-            return
+        run_job(job_id, url, depth, concurrency, incremental, max_age_hours, resume, sitemap, respect_robots,
+                formats, compress, profile, profiler, scope, canonical)
+    finally:
+        # A finished job has already stopped its profiler; this covers failed ones
+        finish_profile(job_id, profiler)
+        close_channel(job_id)
+        publish_metrics(force=True)
+
+
+def finish_profile(job_id, profiler):
+    if profiler is None or profiler.detenido:
+        return
+    artifacts = profiler.detener()
+    # cProfile falls back to sampling when another job of this process is already using it
+    mode = next(name for name, modo in PROFILE_MODES.items() if modo == profiler.modo)
+    jobs.actualizar(job_id, profile={'mode': mode, 'artifacts': sorted(artifacts), 'url': f'/profile/{job_id}'},
+                    _profile=artifacts)
 
-        url_base = next(iter(urls_directas))
-        with jobs_lock:
-            jobs[job_id].update({'message': f'Exploring {url_base}...', 'domain': urlparse(url_base).netloc.replace('www.', '')})
 
-        urls_encontradas = explorar_sitio(url_base, profundidad_maxima=depth)
+def run_job(job_id, url, depth, concurrency, incremental, max_age_hours, resume, sitemap, respect_robots,
+            formats, compress, profile=None, profiler=None, scope=None, canonical=None):
+    checkpoint = None
+    salida = None
+    try:
+        if resume:
+            # The checkpoint header stores the resolved base URL, so no need to probe again
+            url_base = url
+        else:
+            urls_directas = obtener_urls_directas(url)
+            if not urls_directas:
+                jobs.actualizar(job_id, status='error', message='Could not access target URL')
+                return
+            url_base = next(iter(urls_directas))
+        jobs.actualizar(job_id, message=f'Exploring {url_base}...', domain=urlparse(url_base).netloc.replace('www.', ''))
+        publish(job_id, 'status', {'status': 'running', 'message': f'Exploring {url_base}...'})
+
+        is_peru = es_sitio_peru(url_base)
+        # Looked up once: with the SQLite backend every lookup is a query
+        channel = jobs.canal(job_id)
+        # Pages and time of the last counter update written to the job store
+        last_update = {'pages': 0, 'at': 0.0}
 
-        is_peru = 'enperu.org' in url_base or 'peru' in url_base.lower()
+        def progress_counters(data):
+            counters = {'visited': data['visitadas'], 'pending': data['pendientes'],
+                        'found': data['encontradas'], 'errors': data['errores']}
+            total = data['visitadas'] + data['pendientes']
+            counters['progress'] = round(100 * data['visitadas'] / total, 1) if total else 0.0
+            return counters
+
+        def on_progress(event, data):
+            # Runs on the crawl loop after every page: push it to the stream and keep live counters.
+            # 'hosts' is the per-host rate controller state (limit, effective rate, back-offs)
+            if event == 'fin':
+                # Final flush of the throttled counters, plus the fetches avoided by URL
+                # canonicalization (rastreador.canonico)
+                canonical = data.get('canonicalizacion', {})
+                jobs.actualizar(job_id, **progress_counters(data), hosts=data.get('hosts', {}), canonicalization={
+                    'fetches_saved': canonical.get('peticiones_evitadas', 0),
+                    'folded_variants': canonical.get('variantes_plegadas', 0),
+                    'learned_redirects': canonical.get('redirecciones_aprendidas', 0),
+                }, out_of_scope_links=data.get('fuera_de_alcance', 0))
+                if profiler is not None:
+                    # Memory snapshot while the frontier and the crawl results are still alive
+                    profiler.capturar_memoria()
+                return
+            if event != 'pagina':
+                return
+            counters = progress_counters(data)
+            last_update['pages'] += 1
+            now = time.monotonic()
+            # Each store update is a read-modify-write transaction with the SQLite backend
+            if last_update['pages'] >= PROGRESS_UPDATE_PAGES or now - last_update['at'] >= PROGRESS_UPDATE_INTERVAL:
+                last_update.update(pages=0, at=now)
+                jobs.actualizar(job_id, hosts=data['hosts'], **counters)
+                publish_metrics()
+            page = {'url': data['url'], 'depth': data['profundidad'], 'found_url': data['encontrada'], **counters}
+            if data['encontrada']:
+                if is_peru:
+                    clasificacion = clasificar_url(data['url'])
+                    page['list'] = LIST_BY_CATEGORY[clasificacion.categoria] if clasificacion else None
+                else:
+                    page['list'] = 'urls'
+            if channel is not None:
+                channel.publicar('page', page)
+
+        checkpoint = Checkpoint(checkpoint_path(job_id), metadatos={
+            'url_base': url_base, 'profundidad': depth, 'concurrency': concurrency,
+            'incremental': incremental, 'max_age_hours': max_age_hours,
+            'sitemap': sitemap, 'respect_robots': respect_robots, 'formats': formats, 'compress': compress,
+            'profile': profile, 'scope': scope, 'canonical': canonical,
+        }, reanudar=resume)
+
+        # Pages are written as they are visited: found URLs to found.txt (sorted at the end) and,
+        # when requested, every visited page to pages.<format>[.gz]. A resumed job appends
+        job_dir = jobs.directorio_trabajo(job_id)
+        paths = [os.path.join(job_dir, 'found.txt')] + \
+            [os.path.join(job_dir, f"pages.{fmt}{'.gz' if compress else ''}") for fmt in formats]
+        salida = SalidaIncremental(paths, clasificar=is_peru, anadir=resume and checkpoint.previo is not None,
+                                   observador=on_progress)
+
+        # Incremental mode: reuse per-URL state from previous runs and report the diff
+        state = EstadoRastreo(CRAWL_STATE_PATH, urlparse(url_base).netloc) if incremental else None
+
+        # Scope and canonicalization rules; the canonicalizer admits the hosts the scope allows
+        alcance = Alcance.desde_configuracion(scope).fijar_base(urlparse(url_base).netloc)
+        canonico = Canonizador.desde_configuracion(url_base, canonical, admitir_host=alcance.admite_host)
+        urls_encontradas = explorar_sitio(url_base, profundidad_maxima=depth, concurrencia=concurrency,
+                                          limite_paginas=MAX_PAGES, cache=http_cache, estado=state,
+                                          edad_maxima=max_age_hours * 3600 if incremental else None,
+                                          checkpoint=checkpoint, observador=salida,
+                                          sitemap=SITEMAP_MODES.get(sitemap), respetar_robots=respect_robots,
+                                          canonico=canonico, alcance=alcance)
+
+        salida.cerrar()
         dominio = urlparse(url_base).netloc.replace('www.', '')
+        # Incremental mode diff lists (added/removed); the other lists are streamed from disk below
+        extra_lists = []
+
+        if state is not None:
+            added, removed = state.finalizar(urls_encontradas)
+            state.cerrar()
+            extra_lists = [('added', sorted(added)), ('removed', sorted(removed))]
+            # Written to the job directory so jobs for the same domain don't overwrite each other
+            changes_path = guardar_cambios(dominio, added, removed, job_dir)
+            jobs.actualizar(job_id, changes_file=os.path.basename(changes_path), _changes_path=changes_path,
+                            incremental_stats=state.contadores)
+
+        # The output file and the paginated lists come from an external sort of the URLs
+        # streamed to disk during the crawl, grouped by category on Peruvian sites
+        found = leer_urls(paths[0])
+        if resume and checkpoint.previo is not None:
+            found = itertools.chain(found, checkpoint.previo.resultados)
+        sorted_path = os.path.join(job_dir, 'sorted.txt')
+        counts = ordenar_resultados(found, sorted_path, administrativas=is_peru)
+        total_found = sum(counts.values())
+        filename = f"urls_administrativas_{dominio}.txt" if is_peru else f"urls_{dominio}.txt"
+        file_path = os.path.join(job_dir, filename)
+        escribir_agrupado(sorted_path, file_path, dominio, counts, administrativas=is_peru)
 
         if is_peru:
-            urls_admin = filtrar_urls_administrativas(urls_encontradas)
-            departamentos = set()
-            provincias = set()
-            distritos = set()
-            otras = set()
-
-            for u in urls_admin:
-                u_low = u.lower()
-                if any(u_low.endswith(f'/{d}') or u_low.endswith(f'/{d}/') for d in ['amazonas','ancash','apurimac','arequipa','ayacucho','cajamarca','cusco','callao','huancavelica','huanuco','ica','junin','la-libertad','lambayeque','lima','loreto','madre-de-dios','moquegua','pasco','piura','puno','san-martin','tacna','tumbes','ucayali']):
-                    departamentos.add(u)
-                elif 'informacion-' in u_low and '/distrito' in u_low:
-                    distritos.add(u)
-                elif '/provincia' in u_low:
-                    provincias.add(u)
-                else:
-                    otras.add(u)
-
-            filename = f"urls_administrativas_{dominio}.txt"
-            with open(filename, 'w', encoding='utf-8') as f:
-                f.write(f"=== RESULTADOS PARA {dominio} ===\n")
-                f.write(f"Total de URLs encontradas: {len(urls_encontradas)}\n")
-                f.write(f"URLs administrativas: {len(urls_admin)}\n\n")
-                if departamentos:
-                    f.write('=== DEPARTAMENTOS ===\n')
-                    for x in sorted(departamentos):
-                        f.write(x + '\n')
-                    f.write('\n')
-                if provincias:
-                    f.write('=== PROVINCIAS ===\n')
-                    for x in sorted(provincias):
-                        f.write(x + '\n')
-                    f.write('\n')
-                if distritos:
-                    f.write('=== DISTRITOS ===\n')
-                    for x in sorted(distritos):
-                        f.write(x + '\n')
-                    f.write('\n')
-                if otras:
-                    f.write('=== OTRAS URLs ADMINISTRATIVAS ===\n')
-                    for x in sorted(otras):
-                        f.write(x + '\n')
-
-            with jobs_lock:
-                jobs[job_id].update({
-                    'status': 'done',
-                    'message': 'Completed',
-                    'file': filename,
-                    'domain': dominio,
-                    'found': len(urls_encontradas),
-                    'administrative': len(urls_admin),
-                    'departamentos': sorted(departamentos),
-                    'provincias': sorted(provincias),
-                    'distritos': sorted(distritos),
-                    'otras': sorted(otras),
-                })
+            groups = leer_grupos(sorted_path, CATEGORIAS)
+            summary = {'file': filename, 'found': total_found,
+                       'administrative': total_found - counts[GRUPO_NO_ADMINISTRATIVA]}
         else:
-            filename = f"urls_{dominio}.txt"
-            with open(filename, 'w', encoding='utf-8') as f:
-                f.write(f"=== TODAS LAS URLs ENCONTRADAS EN {dominio} ===\n\n")
-                for u in sorted(urls_encontradas):
-                    f.write(u + '\n')
-
-            with jobs_lock:
-                jobs[job_id].update({
-                    'status': 'done',
-                    'message': 'Completed',
-                    'file': filename,
-                    'domain': dominio,
-                    'found': len(urls_encontradas),
-                    'urls': sorted(urls_encontradas),
-                })
+            groups = leer_grupos(sorted_path, GRUPOS_TODAS)
+            summary = {'file': filename, 'found': total_found}
+        jobs.guardar_resultados(job_id, itertools.chain(
+            ((LIST_BY_CATEGORY.get(group, group), urls) for group, urls in groups), extra_lists))
+        os.remove(sorted_path)
+        os.remove(paths[0])
+        outputs = dict(zip(formats, paths[1:]))
+        # The profile artifacts are listed before clients can see the job as done
+        finish_profile(job_id, profiler)
+        jobs.actualizar(job_id, status='done', message='Completed', domain=dominio, _file_path=file_path,
+                        _outputs=outputs, outputs=sorted(outputs), **summary)
+
+        if not incremental:
+            snapshot = {k: v for k, v in jobs.obtener(job_id).items() if k not in RUN_FIELDS}
+            result_cache.guardar(result_key(url, depth, sitemap, respect_robots, formats, compress, scope,
+                                            canonical), snapshot)
+
+        checkpoint.eliminar()
 
     except Exception as e:
-        with jobs_lock:
-            jobs[job_id].update({'status': 'error', 'message': str(e)})
+        jobs.actualizar(job_id, status='error', message=str(e))
+        if salida is not None:
+            salida.cerrar()
+        if checkpoint is not None:
+            # Keep the progress on disk so the job can be resumed
+            checkpoint.cerrar()
+            jobs.actualizar(job_id, resumable=True)
+
+
+def record_job_metrics(job_id, metrics):
+    jobs.actualizar(job_id, **metrics)
+
+
+if JOB_BACKEND == 'sqlite':
+    # The web process only queues; worker.py processes run the crawls
+    scheduler = PlanificadorSQLite(jobs, capacidad=QUEUE_CAPACITY, al_terminar=record_job_metrics,
+                                   trabajadores=CRAWL_WORKERS)
+else:
+    scheduler = PlanificadorTrabajos(process_job, trabajadores=CRAWL_WORKERS, capacidad=QUEUE_CAPACITY,
+                                     al_terminar=record_job_metrics)
+
+
+def submit_job(key, *args, **job_fields):
+    """
+    Queue a crawl on the scheduler. Returns (response, http_status); identical requests
+    already queued or running are coalesced onto the existing job.
+    """
+    job_id = job_fields.pop('job_id', None) or uuid.uuid4().hex
+    previous = jobs.obtener(job_id)
+    jobs.crear(job_id, {'status': 'queued', 'message': 'Queued', 'created_at': time.time(), **job_fields})
+    # The channel exists before a worker can pick the job, so no event is lost
+    jobs.abrir_canal(job_id).publicar('status', {'status': 'queued', 'message': 'Queued'})
+    try:
+        assigned_id, is_new = scheduler.enviar(job_id, key, *args)
+    except ColaLlena as e:
+        # Undo the entries made for a job the scheduler did not accept
+        jobs.reemplazar(job_id, previous)
+        response = jsonify({'error': 'Too many crawls queued, try again later',
+                            'queued': e.en_cola, 'retry_after': e.reintentar_en})
+        response.headers['Retry-After'] = str(e.reintentar_en)
+        return response, 429
+    if not is_new:
+        jobs.reemplazar(job_id, previous)
+    body = {'job_id': assigned_id, 'status_url': f'/status/{assigned_id}', 'result_url': f'/result/{assigned_id}',
+            'events_url': f'/events/{assigned_id}', 'coalesced': not is_new}
+    position = (scheduler.metricas(assigned_id) or {}).get('queue_position')
+    if position is not None:
+        body['queue_position'] = position
+    return jsonify(body), 202
 
 
 @app.route('/')
@@ -127,40 +459,287 @@ def extract():
         depth = int(data.get('depth', 2))
     except Exception:
         depth = 2
+    try:
+        concurrency = min(max(int(data.get('concurrency', CONCURRENCIA_GLOBAL)), 1), MAX_CONCURRENCY)
+    except Exception:
+        concurrency = CONCURRENCIA_GLOBAL
+    incremental = bool(data.get('incremental', False))
+    try:
+        max_age_hours = float(data.get('max_age_hours', 24))
+    except Exception:
+        max_age_hours = 24
+
+    refresh = bool(data.get('refresh', False))
+    # 'seed' adds the site's sitemap URLs to the crawl, 'only' returns them without crawling
+    sitemap = data.get('sitemap') or None
+    respect_robots = bool(data.get('respect_robots', True))
+    # Extra per-page outputs (jsonl, csv) written during the crawl, optionally gzipped
+    formats = data.get('formats') or []
+    if isinstance(formats, str):
+        formats = [formats]
+    compress = bool(data.get('gzip', False))
+    # Profile this crawl: true or 'cprofile' (deterministic) or 'sampling' (lower overhead)
+    profile = data.get('profile') or None
+    if profile is True:
+        profile = 'cprofile'
+    # Crawl scope rules; out-of-scope links are dropped before they are queued
+    scope = data.get('scope') or None
+    # URL canonicalization options (query parameters kept or dropped, host aliases)
+    canonical = data.get('canonical') or None
 
     if not url:
         return jsonify({'error': "Missing 'url' parameter"}), 400
+    if sitemap is not None and sitemap not in SITEMAP_MODES:
+        return jsonify({'error': f"'sitemap' must be one of: {', '.join(SITEMAP_MODES)}"}), 400
+    if not isinstance(formats, list) or any(fmt not in FORMATOS for fmt in formats):
+        return jsonify({'error': f"'formats' must be a list of: {', '.join(FORMATOS)}"}), 400
+    formats = tuple(sorted(set(formats)))
+    if profile is not None and profile not in PROFILE_MODES:
+        return jsonify({'error': f"'profile' must be true or one of: {', '.join(PROFILE_MODES)}"}), 400
+    if scope is not None:
+        try:
+            scope = scope_config(scope)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+    if canonical is not None:
+        try:
+            canonical = canonical_config(canonical)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
 
-    job_id = uuid.uuid4().hex
-    with jobs_lock:
-        jobs[job_id] = {'status': 'queued', 'message': 'Queued', 'created_at': time.time()}
-
-    thread = threading.Thread(target=process_job, args=(job_id, url, depth), daemon=True)
-    thread.start()
+    # A recent identical crawl answers immediately unless a refresh is forced (or a profile is requested)
+    if not incremental and not refresh and profile is None:
+        hit = result_cache.obtener(result_key(url, depth, sitemap, respect_robots, formats, compress, scope,
+                                              canonical),
+                                   valida=lambda job: os.path.exists(job['_file_path']) and os.path.exists(
+                                       job['_results']))
+        if hit is not None:
+            cached_job, cached_at = hit
+            job_id = uuid.uuid4().hex
+            jobs.crear(job_id, {**cached_job, 'created_at': time.time(), 'cached': True, 'cached_at': cached_at})
+            return jsonify({'job_id': job_id, 'status_url': f'/status/{job_id}', 'result_url': f'/result/{job_id}',
+                            'status': 'done', 'cached': True, 'cached_at': cached_at}), 200
 
-    return jsonify({'job_id': job_id, 'status_url': f'/status/{job_id}', 'result_url': f'/result/{job_id}'}), 202
+    key = (normalizar_objetivo(url), depth, incremental, max_age_hours if incremental else None, sitemap,
+           respect_robots, formats, compress, profile, config_key(scope), config_key(canonical))
+    return submit_job(key, url, depth, concurrency, incremental, max_age_hours, False, sitemap, respect_robots,
+                      formats, compress, profile, scope, canonical)
 
 
 @app.route('/status/<job_id>')
 def status(job_id):
-    with jobs_lock:
-        job = jobs.get(job_id)
+    job = jobs.obtener(job_id)
+    if job:
+        # Counters only; the URL lists are paginated by /results/<job_id>
+        job = publico(job)
+        # Live queue position / wait and run times while the job is in the scheduler
+        metrics = scheduler.metricas(job_id)
+        if metrics:
+            job.update(metrics)
+            if 'queue_position' in metrics:
+                job['message'] = f"Queued (position {metrics['queue_position']})"
+        return jsonify(job)
+    # Jobs lost on a server restart still have their checkpoint on disk
+    saved = leer_checkpoint(checkpoint_path(job_id))
+    if saved is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify({
+        'status': 'interrupted',
+        'message': f'Interrupted after {len(saved.visitadas)} pages; POST /resume/{job_id} to continue',
+        'domain': urlparse(saved.metadatos.get('url_base', '')).netloc.replace('www.', ''),
+        'visited': len(saved.visitadas),
+        'pending': len(saved.pendientes),
+        'found': len(saved.resultados),
+        'resumable': True,
+    })
+
+
+def sse(event_id, kind, data):
+    return f"id: {event_id}\nevent: {kind}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.route('/events/<job_id>')
+def events(job_id):
+    """
+    Server-Sent Events stream of a job: 'status', one 'page' per crawled page
+    (with live counters and progress) and a final 'done' or 'failed' summary.
+    Reconnecting clients resume after Last-Event-ID; if those events were already dropped
+    from the capped channel, a 'status' snapshot of the job comes first.
+    """
+    channel = jobs.canal(job_id)
+    if channel is None:
+        job = jobs.obtener(job_id)
         if not job:
             return jsonify({'error': 'Job not found'}), 404
-        return jsonify(job)
+        # Cached result or expired channel: only the final state is available
+        kind = 'done' if job.get('status') == 'done' else 'failed' if job.get('status') == 'error' else 'status'
+        return Response(sse(0, kind, publico(job)), mimetype='text/event-stream')
+
+    try:
+        start = int(request.headers.get('Last-Event-ID', request.args.get('from', -1))) + 1
+    except ValueError:
+        start = 0
+
+    def stream():
+        position = start
+        while True:
+            first, new_events, closed = channel.leer(position)
+            if first > position:
+                # Events the client missed are gone: it gets the current job state instead
+                yield sse(first - 1, 'status', publico(jobs.obtener(job_id) or {}))
+                position = first
+            for kind, data in new_events:
+                yield sse(position, kind, data)
+                position += 1
+            if closed and position >= len(channel):
+                break
+            if not new_events:
+                # Keeps proxies from closing an idle connection
+                yield ": keep-alive\n\n"
+
+    return Response(stream_with_context(stream()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.route('/resume/<job_id>', methods=['POST'])
+def resume(job_id):
+    job = jobs.obtener(job_id)
+    if job and job.get('status') in ('queued', 'running'):
+        return jsonify({'error': 'Job is still running'}), 409
+    saved = leer_checkpoint(checkpoint_path(job_id))
+    if saved is None or 'url_base' not in saved.metadatos:
+        return jsonify({'error': 'No checkpoint for this job'}), 404
+
+    meta = saved.metadatos
+    return submit_job(('resume', job_id), meta['url_base'], meta.get('profundidad', 2),
+                      meta.get('concurrency', CONCURRENCIA_GLOBAL), meta.get('incremental', False),
+                      meta.get('max_age_hours', 24), True, meta.get('sitemap'), meta.get('respect_robots', True),
+                      tuple(meta.get('formats', ())), meta.get('compress', False), meta.get('profile'),
+                      meta.get('scope'), meta.get('canonical'), job_id=job_id, resumed=True)
+
+
+@app.route('/http-stats')
+def http_stats():
+    # Connection reuse and DNS cache counters of the shared HTTP client (per worker process)
+    stats = obtener_cliente().estadisticas()
+    if http_cache is not None:
+        stats['cache'] = http_cache.estadisticas()
+    stats['base_url_cache'] = cache_urls_base.estadisticas()
+    return jsonify(stats)
+
+
+@app.route('/queue-stats')
+def queue_stats():
+    return jsonify(scheduler.estadisticas())
+
+
+@app.route('/cache-stats')
+def cache_stats():
+    # Hit/miss counters of the /extract result cache
+    return jsonify(result_cache.estadisticas())
+
+
+@app.route('/job-stats')
+def job_stats():
+    return jsonify(jobs.estadisticas())
+
+
+@app.route('/metrics')
+def metrics():
+    """
+    Crawl metrics in Prometheus text format: per-phase timing histograms (dns, connect, ttfb,
+    download, parse, classify) and request/page counters per host, summed over every process
+    that runs crawls, plus the current queue and result cache state.
+    """
+    snapshot = combinar([registro.instantanea()] + jobs.leer_metricas(excluir=PROCESS_ID))
+    queue = scheduler.estadisticas()
+    cache = result_cache.estadisticas()
+    snapshot['crawler_jobs'] = indicador('Crawl jobs waiting in the queue or running', ('state',),
+                                         {('queued',): queue['queued'], ('running',): queue['busy']})
+    snapshot['crawler_result_cache_entries'] = indicador('Finished results kept in the /extract cache', (),
+                                                         {(): cache['entradas']})
+    return Response(exportar(snapshot), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/results/<job_id>')
+def results(job_id):
+    """
+    One page of a finished job's URLs: ?list=<name>&offset=0&limit=100.
+    Without `list` it returns the available lists and their sizes.
+    """
+    job = jobs.obtener(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    if job.get('status') != 'done':
+        return jsonify({'error': 'Not ready'}), 409
+    available = job.get('lists', {})
+    name = request.args.get('list')
+    if name is None:
+        return jsonify({'job_id': job_id, 'lists': available})
+    try:
+        offset = max(int(request.args.get('offset', 0)), 0)
+        limit = min(max(int(request.args.get('limit', RESULTS_PAGE_SIZE)), 1), MAX_RESULTS_PAGE_SIZE)
+    except ValueError:
+        return jsonify({'error': 'offset and limit must be integers'}), 400
+    page = jobs.leer_resultados(job_id, name, offset, limit)
+    if page is None:
+        return jsonify({'error': f"Unknown list '{name}'", 'lists': available}), 404
+    items, total = page
+    body = {'job_id': job_id, 'list': name, 'offset': offset, 'limit': limit, 'total': total, 'items': items}
+    if offset + len(items) < total:
+        body['next_offset'] = offset + len(items)
+    return jsonify(body)
 
 
 @app.route('/result/<job_id>')
 def result(job_id):
-    with jobs_lock:
-        job = jobs.get(job_id)
-        if not job:
-            return "Not found", 404
-        if job.get('status') != 'done' or 'file' not in job:
-            return "Not ready", 409
-        filename = job['file']
-    directory = os.getcwd()
-    return send_from_directory(directory, filename, as_attachment=True)
+    """
+    The job's URL file, or with ?format=jsonl|csv the per-page file written during the crawl
+    (?format=changes: the added/removed URLs of an incremental job).
+    """
+    job = jobs.obtener(job_id)
+    if not job:
+        return "Not found", 404
+    if job.get('status') != 'done' or '_file_path' not in job:
+        return "Not ready", 409
+    fmt = request.args.get('format')
+    if fmt == 'changes':
+        if '_changes_path' not in job:
+            return "No changes file for this job (not incremental)", 404
+        return send_file(os.path.abspath(job['_changes_path']), as_attachment=True, download_name=job['changes_file'])
+    if fmt:
+        path = job.get('_outputs', {}).get(fmt)
+        if path is None:
+            return f"No '{fmt}' output for this job", 404
+        name = f"pages_{job.get('domain', job_id)}{os.path.basename(path)[len('pages'):]}"
+        return send_file(os.path.abspath(path), as_attachment=True, download_name=name)
+    return send_file(os.path.abspath(job['_file_path']), as_attachment=True, download_name=job['file'])
+
+
+@app.route('/profile/<job_id>')
+def profile_artifacts(job_id):
+    """
+    Profile artifacts of a job run with 'profile': cProfile stats (perfil.pstats, perfil.txt) or
+    sampled stacks (muestras.txt in collapsed format, muestras_top.txt), and memoria.txt (tracemalloc)
+    """
+    job = jobs.obtener(job_id)
+    if not job:
+        return jsonify({'error': 'Not found'}), 404
+    if '_profile' not in job:
+        if job.get('status') in ('queued', 'running'):
+            return jsonify({'error': 'Profile not ready until the job ends'}), 409
+        return jsonify({'error': 'This job was not profiled'}), 404
+    return jsonify({'job_id': job_id, 'mode': job['profile']['mode'],
+                    'artifacts': {name: f'/profile/{job_id}/{name}' for name in sorted(job['_profile'])}})
+
+
+@app.route('/profile/<job_id>/<name>')
+def profile_artifact(job_id, name):
+    job = jobs.obtener(job_id)
+    path = (job or {}).get('_profile', {}).get(name)
+    if path is None or not os.path.exists(path):
+        return "Not found", 404
+    return send_file(os.path.abspath(path), as_attachment=True, download_name=f"{job_id}_{name}")
 
 
 @app.route('/download/<path:filename>')
@@ -0,0 +1,47 @@
+"""
+Compara páginas por segundo de explorar_sitio con distintos niveles de concurrencia
+contra un sitio sintético local. Todo el sitio está en un único host, así que el
+límite por host se iguala al global.
+
+Uso:
+    python -m benchmarks.bench_concurrencia [--paginas 200] [--latencia 0.05]
+"""
+import argparse
+import contextlib
+import io
+import time
+
+from main import explorar_sitio
+from benchmarks.servidor_sintetico import ServidorSintetico
+
+
+def medir(paginas, latencia, concurrencia):
+    with ServidorSintetico(paginas=paginas, latencia=latencia) as servidor:
+        inicio = time.perf_counter()
+        # Silenciar la salida por página del rastreador
+        with contextlib.redirect_stdout(io.StringIO()):
+            urls = explorar_sitio(servidor.url, profundidad_maxima=paginas,
+                                  concurrencia=concurrencia,
+                                  concurrencia_por_host=concurrencia, pausa=0)
+        duracion = time.perf_counter() - inicio
+    return len(urls), duracion
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--paginas', type=int, default=200)
+    parser.add_argument('--latencia', type=float, default=0.05)
+    parser.add_argument('--concurrencia', type=int, nargs='+', default=[1, 5, 10, 20])
+    args = parser.parse_args()
+
+    base = None
+    print(f"{'concurrencia':>12} {'páginas':>8} {'segundos':>9} {'pág/s':>8} {'mejora':>7}")
+    for concurrencia in args.concurrencia:
+        total, duracion = medir(args.paginas, args.latencia, concurrencia)
+        paginas_segundo = total / duracion if duracion else 0.0
+        base = base or paginas_segundo
+        print(f"{concurrencia:>12} {total:>8} {duracion:>9.2f} {paginas_segundo:>8.1f} {paginas_segundo / base:>6.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""
+Compara los extractores de enlaces con el análisis BeautifulSoup original.
+
+1. Comprueba que cada backend devuelve exactamente los mismos enlaces <a>/<link>
+   que `BeautifulSoup(...).find_all(['a', 'link'], href=True)` en el corpus de
+   páginas guardadas (benchmarks/corpus).
+2. Mide tiempo y memoria máxima (tracemalloc) sobre un HTML grande.
+
+Uso:
+    python -m benchmarks.bench_enlaces [--enlaces 20000] [--repeticiones 3]
+"""
+import argparse
+import os
+import time
+import tracemalloc
+from urllib.parse import urljoin
+
+from bs4 import BeautifulSoup
+
+from rastreador.enlaces import extraer_enlaces, etree, PREFIJOS_IGNORADOS
+
+DIRECTORIO_CORPUS = os.path.join(os.path.dirname(__file__), 'corpus')
+
+# URL desde la que se guardó cada página del corpus
+URLS_CORPUS = {
+    'departamento_cusco.html': 'https://enperu.org/cusco/',
+    'blog_entidades.html': 'https://ejemplo.com/blog/',
+    'sitio_pequeno.html': 'https://pureqtravel.com/',
+}
+
+# Diferencias aceptadas respecto al original: (página, backend) -> URLs que cambian
+DIFERENCIAS_CONOCIDAS = {
+    # libxml2 conserva el primer atributo href duplicado; BeautifulSoup el último
+    ('blog_entidades.html', 'lxml'): {
+        'https://ejemplo.com/blog/duplicado', 'https://ejemplo.com/blog/duplicado-2',
+    },
+}
+
+
+def extraer_original(contenido, url_pagina):
+    """
+    Reproduce la extracción que hacía explorar_sitio con BeautifulSoup
+    """
+    soup = BeautifulSoup(contenido, 'html.parser')
+    urls = []
+    for link in soup.find_all(['a', 'link'], href=True):
+        href = link['href'].strip()
+        if not href or href.startswith(PREFIJOS_IGNORADOS):
+            continue
+        urls.append(urljoin(url_pagina, href))
+    return urls
+
+
+def backends():
+    disponibles = ['html.parser', 'bs4']
+    if etree is not None:
+        disponibles.append('lxml')
+    return disponibles
+
+
+def comprobar_corpus():
+    correcto = True
+    for nombre, url_pagina in sorted(URLS_CORPUS.items()):
+        with open(os.path.join(DIRECTORIO_CORPUS, nombre), 'rb') as f:
+            contenido = f.read()
+        esperado = extraer_original(contenido, url_pagina)
+        for backend in backends():
+            obtenido = extraer_enlaces(contenido, url_pagina, backend=backend, etiquetas={'a', 'link'})
+            conocidas = DIFERENCIAS_CONOCIDAS.get((nombre, backend), set())
+            iguales = (sorted(u for u in obtenido if u not in conocidas)
+                       == sorted(u for u in esperado if u not in conocidas))
+            correcto = correcto and iguales
+            estado = 'DIFERENTE' if not iguales else ('OK*' if conocidas else 'OK')
+            print(f"  {nombre:<28} {backend:<12} {len(obtenido):>4} enlaces  {estado}")
+            if conocidas and iguales:
+                print(f"    * diferencia conocida: {sorted(conocidas)}")
+            if not iguales:
+                print(f"    sobran: {sorted(set(obtenido) - set(esperado))}")
+                print(f"    faltan: {sorted(set(esperado) - set(obtenido))}")
+    return correcto
+
+
+def generar_html_grande(enlaces):
+    filas = ''.join(
+        f'<tr><td><a href="/seccion/{i % 50}/pagina-{i}" class="enlace">Página {i}</a></td>'
+        f'<td>{"texto " * 10}</td></tr>'
+        for i in range(enlaces)
+    )
+    return (f'<!doctype html><html><head><title>Grande</title></head>'
+            f'<body><table>{filas}</table></body></html>').encode('utf-8')
+
+
+def medir(funcion, contenido, repeticiones):
+    mejor = float('inf')
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion(contenido)
+        mejor = min(mejor, time.perf_counter() - inicio)
+
+    tracemalloc.start()
+    funcion(contenido)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return mejor, pico
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--enlaces', type=int, default=20000)
+    parser.add_argument('--repeticiones', type=int, default=3)
+    args = parser.parse_args()
+
+    print("=== CORPUS ===")
+    correcto = comprobar_corpus()
+
+    contenido = generar_html_grande(args.enlaces)
+    url = 'https://ejemplo.com/'
+    print(f"\n=== HTML GRANDE ({len(contenido) / 1024 / 1024:.1f} MB, {args.enlaces} enlaces) ===")
+    print(f"{'extractor':<14} {'segundos':>9} {'memoria pico':>13} {'aceleración':>12}")
+    tiempo_base = None
+    candidatos = [('original', lambda c: extraer_original(c, url))]
+    candidatos += [(b, lambda c, b=b: extraer_enlaces(c, url, backend=b)) for b in backends() if b != 'bs4']
+    for nombre, funcion in candidatos:
+        tiempo, pico = medir(funcion, contenido, args.repeticiones)
+        tiempo_base = tiempo_base or tiempo
+        print(f"{nombre:<14} {tiempo:>9.3f} {pico / 1024 / 1024:>11.1f} MB {tiempo_base / tiempo:>11.1f}x")
+
+    if not correcto:
+        raise SystemExit("Los extractores no coinciden con el original en el corpus")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Compara la memoria y la velocidad del conjunto de URLs vistas de la frontera
+(rastreador.vistas.ConjuntoVistas) con un set de cadenas.
+
+Variantes: set de Python, ConjuntoVistas en memoria, con filtro de Bloom y con
+volcado a disco (límite de memoria de una octava parte de lo necesario).
+
+Uso:
+    python -m benchmarks.bench_vistas [--urls 1000000] [--consultas 200000]
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+
+from rastreador.vistas import ConjuntoVistas
+
+DEPARTAMENTOS = ('lima', 'cusco', 'arequipa', 'piura', 'puno', 'loreto', 'junin', 'ancash')
+
+
+def generar_urls(n, desplazamiento=0):
+    # URLs con la forma de las de un sitio de Perú grande (~70 caracteres)
+    for i in range(desplazamiento, desplazamiento + n):
+        departamento = DEPARTAMENTOS[i % len(DEPARTAMENTOS)]
+        yield f"https://www.enperu.org/{departamento}/provincia-{i // 1000}/distrito-{i}-informacion"
+
+
+class _Set(set):
+    """
+    set de cadenas con la interfaz de ConjuntoVistas (así guardaba la frontera las URLs)
+    """
+
+    def agregar(self, url):
+        if url in self:
+            return False
+        self.add(url)
+        return True
+
+    def cerrar(self):
+        pass
+
+
+def variantes(n):
+    necesaria = 8 * 2 ** (int(n / 0.7) - 1).bit_length()
+    return [
+        ('set de cadenas', _Set),
+        ('ConjuntoVistas', lambda: ConjuntoVistas(memoria_maxima=None)),
+        ('+ Bloom', lambda: ConjuntoVistas(memoria_maxima=None, bloom=True, capacidad=n)),
+        ('+ Bloom y disco', lambda: ConjuntoVistas(memoria_maxima=necesaria // 8, bloom=True, capacidad=n)),
+    ]
+
+
+def medir_memoria(crear, n):
+    gc.collect()
+    tracemalloc.start()
+    conjunto = crear()
+    for url in generar_urls(n):
+        conjunto.agregar(url)
+    memoria, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    conjunto.cerrar()
+    return memoria, pico
+
+
+def medir_velocidad(crear, n, consultas):
+    conjunto = crear()
+    inicio = time.perf_counter()
+    for url in generar_urls(n):
+        conjunto.agregar(url)
+    insercion = time.perf_counter() - inicio
+
+    # Mitad de consultas a URLs ya vistas (el caso habitual: enlaces repetidos) y mitad nuevas
+    vistas = list(generar_urls(consultas // 2, desplazamiento=n // 3))
+    nuevas = list(generar_urls(consultas // 2, desplazamiento=n * 2))
+    inicio = time.perf_counter()
+    aciertos = sum(url in conjunto for url in vistas)
+    falsos = sum(url in conjunto for url in nuevas)
+    consulta = time.perf_counter() - inicio
+    conjunto.cerrar()
+    return insercion, consulta, aciertos, falsos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--urls', type=int, default=1_000_000)
+    parser.add_argument('--consultas', type=int, default=200_000)
+    args = parser.parse_args()
+
+    print(f"{args.urls} URLs, {args.consultas} consultas (mitad vistas, mitad nuevas)\n")
+    print(f"{'variante':<16} {'MB':>7} {'pico MB':>8} {'bytes/URL':>10} {'inserción/s':>12} "
+          f"{'consultas/s':>12} {'aciertos':>9} {'falsos +':>9}")
+    for nombre, crear in variantes(args.urls):
+        memoria, pico = medir_memoria(crear, args.urls)
+        insercion, consulta, aciertos, falsos = medir_velocidad(crear, args.urls, args.consultas)
+        print(f"{nombre:<16} {memoria / 2 ** 20:>7.1f} {pico / 2 ** 20:>8.1f} {memoria / args.urls:>10.1f} "
+              f"{args.urls / insercion:>12,.0f} {args.consultas / consulta:>12,.0f} {aciertos:>9} {falsos:>9}")
+
+
+if __name__ == '__main__':
+    main()
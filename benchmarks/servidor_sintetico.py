@@ -0,0 +1,202 @@
+"""
+Servidor HTTP local que genera un sitio sintético para medir el rastreador sin
+salir a Internet.
+
+Forma 'arbol': cada página /p/<n> enlaza a sus `fan_out` hijas (/p/<n*fan_out+1> ...)
+hasta completar `paginas` páginas.
+
+Forma 'peru': árbol de URLs administrativas como el de enperu.org. La portada enlaza
+los 25 departamentos; cada departamento, `fan_out` provincias (/<dep>/provincia-<p>)
+y una página de turismo que no es administrativa; cada provincia, `fan_out` distritos
+(/<dep>/informacion-<p>/distrito-<n>), que vuelven a enlazar a su provincia y a la
+portada. En total 1 + 25 * (2 + fan_out + fan_out²) páginas; `paginas` no se usa.
+
+Las páginas responden tras `latencia` segundos, llevan unos `peso` bytes de texto de
+relleno, tienen ETag y responden 304 a las peticiones condicionales. Una fracción
+`errores` de las páginas (siempre las mismas, salvo la portada) responde 500.
+"""
+import hashlib
+import threading
+import time
+import zlib
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from rastreador.clasificador import DEPARTAMENTOS
+
+FORMAS = ('arbol', 'peru')
+
+
+def _letras(numero):
+    # 0 -> 'a', 25 -> 'z', 26 -> 'ba'...: los nombres de provincia solo llevan letras
+    nombre = ''
+    while True:
+        numero, resto = divmod(numero, 26)
+        nombre = chr(ord('a') + resto) + nombre
+        if not numero:
+            return nombre
+
+
+def enlaces_peru(ruta, fan_out):
+    """
+    Enlaces de una página del sitio con forma 'peru', o None si la página no existe
+    """
+    partes = [parte for parte in ruta.split('/') if parte]
+    if not partes:
+        return [f'/{dep}' for dep in DEPARTAMENTOS]
+    if partes[0] not in DEPARTAMENTOS:
+        return None
+    dep = partes[0]
+    provincias = [_letras(i) for i in range(fan_out)]
+    if len(partes) == 1:
+        return [f'/{dep}/provincia-{p}' for p in provincias] + [f'/{dep}/turismo']
+    if len(partes) == 2 and partes[1] == 'turismo':
+        return [f'/{dep}', '/']
+    if len(partes) == 2 and partes[1].startswith('provincia-') and partes[1][10:] in provincias:
+        p = partes[1][10:]
+        return [f'/{dep}/informacion-{p}/distrito-{n}' for n in range(fan_out)] + [f'/{dep}']
+    if len(partes) == 3 and partes[1].startswith('informacion-') and partes[1][12:] in provincias \
+            and partes[2].startswith('distrito-') and partes[2][9:].isdigit() and int(partes[2][9:]) < fan_out:
+        return [f'/{dep}/provincia-{partes[1][12:]}', '/']
+    return None
+
+
+class _Manejador(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Cabeceras y cuerpo se escriben por separado: sin esto Nagle añade ~40 ms por respuesta
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _enlaces(self):
+        config = self.server.config
+        if config['forma'] == 'peru':
+            return enlaces_peru(self.path, config['fan_out'])
+        if self.path in ('/', ''):
+            numero = 0
+        elif self.path.startswith('/p/'):
+            try:
+                numero = int(self.path[3:].strip('/'))
+            except ValueError:
+                return None
+        else:
+            return None
+        if numero >= config['paginas']:
+            return None
+
+        primera_hija = numero * config['fan_out'] + 1
+        return [f'/p/{h}' for h in range(primera_hija, min(primera_hija + config['fan_out'], config['paginas']))]
+
+    def _pagina(self):
+        enlaces = self._enlaces()
+        if enlaces is None:
+            return None
+        lista = ''.join(f'<li><a href="{enlace}">{enlace}</a></li>' for enlace in enlaces)
+        peso = self.server.config['peso']
+        relleno = '<p>' + ('lorem ipsum ' * (peso // 12 + 1))[:peso] + '</p>'
+        return (
+            f'<!doctype html><html><head><title>{self.path}</title></head>'
+            f'<body><h1>{self.path}</h1><ul>{lista}</ul>{relleno}</body></html>'
+        ).encode('utf-8')
+
+    def _falla(self):
+        errores = self.server.config['errores']
+        return errores > 0 and self.path not in ('/', '') and \
+            zlib.crc32(self.path.encode()) % 10000 < errores * 10000
+
+    def _responder(self, con_cuerpo):
+        with self.server.lock:
+            self.server.peticiones += 1
+        time.sleep(self.server.config['latencia'])
+        falla = self._falla()
+        cuerpo = None if falla else self._pagina()
+        if falla:
+            cuerpo = b'Internal Server Error'
+            self.send_response(500)
+            self.send_header('Content-Type', 'text/plain')
+            with self.server.lock:
+                self.server.errores += 1
+        elif cuerpo is None:
+            cuerpo = b'Not found'
+            self.send_response(404)
+            self.send_header('Content-Type', 'text/plain')
+        else:
+            etag = '"%s"' % hashlib.sha1(cuerpo).hexdigest()[:16]
+            if self.headers.get('If-None-Match') == etag:
+                with self.server.lock:
+                    self.server.no_modificadas += 1
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Content-Length', str(len(cuerpo)))
+        self.end_headers()
+        if con_cuerpo:
+            self.wfile.write(cuerpo)
+
+    def do_GET(self):
+        self._responder(True)
+
+    def do_HEAD(self):
+        self._responder(False)
+
+
+class ServidorSintetico:
+    """
+    Sitio sintético servido en un hilo en segundo plano. Se usa como gestor de contexto:
+
+        with ServidorSintetico(paginas=200) as servidor:
+            explorar_sitio(servidor.url, ...)
+    """
+
+    def __init__(self, paginas=200, fan_out=5, latencia=0.02, peso=600, errores=0.0, forma='arbol'):
+        if forma not in FORMAS:
+            raise ValueError(f"Forma de sitio desconocida: {forma!r} (use {', '.join(FORMAS)})")
+        self.config = {
+            'paginas': paginas,
+            'fan_out': fan_out,
+            'latencia': latencia,
+            'peso': peso,
+            'errores': errores,
+            'forma': forma,
+        }
+        self._servidor = None
+        self._hilo = None
+
+    @property
+    def url(self):
+        host, puerto = self._servidor.server_address[:2]
+        return f'http://{host}:{puerto}/'
+
+    @property
+    def peticiones(self):
+        return self._servidor.peticiones
+
+    @property
+    def no_modificadas(self):
+        return self._servidor.no_modificadas
+
+    @property
+    def errores(self):
+        return self._servidor.errores
+
+    def __enter__(self):
+        self._servidor = ThreadingHTTPServer(('127.0.0.1', 0), _Manejador)
+        self._servidor.daemon_threads = True
+        self._servidor.config = self.config
+        self._servidor.lock = threading.Lock()
+        self._servidor.peticiones = 0
+        self._servidor.no_modificadas = 0
+        self._servidor.errores = 0
+        self._hilo = threading.Thread(target=self._servidor.serve_forever, daemon=True)
+        self._hilo.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._servidor.shutdown()
+        self._servidor.server_close()
@@ -0,0 +1,261 @@
+"""
+Suite de rendimiento del rastreador contra sitios sintéticos locales (sin Internet).
+
+Mide:
+- explorar_sitio sobre un árbol genérico y sobre un árbol administrativo tipo
+  enperu.org: páginas por segundo, latencia de descarga p50/p99 y memoria máxima
+  (RSS) del proceso. Cada rastreo se hace en un proceso nuevo para que el RSS sea
+  solo suyo. Se informa también del tiempo medio de cada fase (rastreador.metricas),
+  sin compararlo con la línea base.
+- filtrar_urls_administrativas: URLs clasificadas por segundo.
+- Escritores de salida (rastreador.salida): páginas por segundo en jsonl, csv y
+  jsonl.gz, y URLs por segundo del archivo agrupado con orden externo.
+
+Los resultados se comparan con la línea base guardada (benchmarks/linea_base.json);
+una métrica que empeora más de la tolerancia cuenta como regresión y el programa
+termina con código 1.
+
+Uso:
+    python -m benchmarks.suite [--solo rastreo clasificador escritura] [--tolerancia 0.3]
+    python -m benchmarks.suite --guardar-linea-base
+"""
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import deque
+
+from benchmarks.servidor_sintetico import ServidorSintetico, enlaces_peru
+
+ARCHIVO_LINEA_BASE = os.path.join(os.path.dirname(__file__), 'linea_base.json')
+GRUPOS = ('rastreo', 'clasificador', 'escritura')
+
+# Sitios rastreados: tamaño, ramificación, latencia del servidor (s), peso de página (bytes)
+# y fracción de páginas que responden 500
+ESCENARIOS = {
+    'arbol': {'forma': 'arbol', 'paginas': 2000, 'fan_out': 6, 'latencia': 0.005, 'peso': 4000, 'errores': 0.02},
+    'peru': {'forma': 'peru', 'fan_out': 8, 'latencia': 0.005, 'peso': 4000, 'errores': 0.02},
+}
+CONCURRENCIA = 10
+# URLs del árbol administrativo usadas para el clasificador y los escritores
+FAN_OUT_URLS = 20
+
+# Métricas en las que un valor menor es mejor; en el resto, mayor es mejor
+MENOR_ES_MEJOR = ('latencia_p50_ms', 'latencia_p99_ms', 'rss_mb', 'pico_mb')
+
+
+def percentil(valores, p):
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+def _rastrear(url):
+    """
+    Rastreo completo en un proceso hijo; devuelve sus métricas
+    """
+    from main import explorar_sitio
+    from rastreador.cliente import obtener_cliente
+    from rastreador.metricas import DURACION_FASES
+    from rastreador.registro import configurar_registro
+
+    latencias = []
+    # Tiempo hasta recibir las cabeceras de cada respuesta
+    obtener_cliente().sesion.hooks['response'].append(
+        lambda response, *args, **kwargs: latencias.append(response.elapsed.total_seconds()))
+    inicio = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        # Mismo nivel de registro que la CLI, con los mensajes descartados
+        configurar_registro('INFO')
+        urls = explorar_sitio(url, profundidad_maxima=50, concurrencia=CONCURRENCIA,
+                              concurrencia_por_host=CONCURRENCIA, pausa=0)
+    duracion = time.perf_counter() - inicio
+    fases = {}
+    for (fase, _), (_, suma, n) in DURACION_FASES.series():
+        fases[fase] = (fases.get(fase, (0.0, 0))[0] + suma, fases.get(fase, (0.0, 0))[1] + n)
+    return {
+        'paginas': len(latencias),
+        'encontradas': len(urls),
+        'segundos': round(duracion, 3),
+        'paginas_s': round(len(latencias) / duracion, 1),
+        'latencia_p50_ms': round(percentil(latencias, 50) * 1000, 2),
+        'latencia_p99_ms': round(percentil(latencias, 99) * 1000, 2),
+        # ru_maxrss está en KB en Linux y en bytes en macOS
+        'rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss /
+                        (2 ** 20 if sys.platform == 'darwin' else 2 ** 10), 1),
+        'fases_media_ms': {fase: round(suma / n * 1000, 3) for fase, (suma, n) in sorted(fases.items())},
+    }
+
+
+def medir_rastreo():
+    resultados = {}
+    contexto = multiprocessing.get_context('spawn')
+    for nombre, config in ESCENARIOS.items():
+        with ServidorSintetico(**config) as servidor, contexto.Pool(1) as pool:
+            resultados[nombre] = pool.apply(_rastrear, (servidor.url,))
+            resultados[nombre]['errores_servidor'] = servidor.errores
+    return resultados
+
+
+def urls_peru(fan_out=FAN_OUT_URLS, host='https://www.enperu.org'):
+    """
+    Todas las URLs del árbol administrativo sintético (unas 25 * fan_out² distritos)
+    """
+    vistas = {'/'}
+    pendientes = deque(['/'])
+    while pendientes:
+        for enlace in enlaces_peru(pendientes.popleft(), fan_out):
+            if enlace not in vistas:
+                vistas.add(enlace)
+                pendientes.append(enlace)
+    return [host + ruta for ruta in sorted(vistas)]
+
+
+def _por_segundo(funcion, unidades, minimo=1.0):
+    # Repite la función hasta sumar `minimo` segundos
+    repeticiones = 0
+    inicio = time.perf_counter()
+    while True:
+        funcion()
+        repeticiones += 1
+        duracion = time.perf_counter() - inicio
+        if duracion >= minimo:
+            return round(unidades * repeticiones / duracion)
+
+
+def medir_clasificador(urls):
+    from main import filtrar_urls_administrativas
+
+    administrativas = len(filtrar_urls_administrativas(urls))
+    return {'urls': len(urls), 'administrativas': administrativas,
+            'urls_s': _por_segundo(lambda: filtrar_urls_administrativas(urls), len(urls))}
+
+
+def medir_escritura(urls):
+    from rastreador.salida import SalidaIncremental, guardar_agrupado
+
+    directorio = tempfile.mkdtemp(prefix='bench_salida_')
+    resultados = {}
+    try:
+        paginas = [{'url': url, 'profundidad': url.count('/') - 2, 'encontrada': True, 'estado': 200,
+                    'padre': url.rsplit('/', 1)[0]} for url in urls]
+        for nombre in ('jsonl', 'csv', 'jsonl.gz'):
+            ruta = os.path.join(directorio, f'paginas.{nombre}')
+
+            def escribir():
+                salida = SalidaIncremental([ruta], clasificar=True)
+                for pagina in paginas:
+                    salida.escribir(pagina)
+                salida.cerrar()
+            resultados[nombre] = {'paginas_s': _por_segundo(escribir, len(paginas))}
+
+        ruta = os.path.join(directorio, 'urls_enperu.org.txt')
+
+        def agrupar():
+            # Bloques pequeños para que el orden externo pase por disco como en un sitio grande
+            guardar_agrupado(iter(urls), ruta, 'enperu.org', administrativas=True, lineas_por_bloque=2000)
+        urls_s = _por_segundo(agrupar, len(urls))
+        tracemalloc.start()
+        agrupar()
+        pico = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        resultados['agrupado'] = {'urls_s': urls_s, 'pico_mb': round(pico / 2 ** 20, 2)}
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+    return resultados
+
+
+def aplanar(resultados, prefijo=''):
+    metricas = {}
+    for clave, valor in resultados.items():
+        if isinstance(valor, dict):
+            metricas.update(aplanar(valor, f'{prefijo}{clave}.'))
+        else:
+            metricas[prefijo + clave] = valor
+    return metricas
+
+
+def comparar(metricas, base, tolerancia):
+    """
+    Imprime cada métrica junto a la línea base y devuelve las que han empeorado
+    """
+    regresiones = []
+    print(f"\n{'métrica':<42} {'actual':>12} {'base':>12} {'cambio':>8}")
+    for nombre, valor in metricas.items():
+        anterior = base.get(nombre)
+        medible = nombre.rsplit('.', 1)[-1] in MENOR_ES_MEJOR or nombre.endswith('_s')
+        if anterior is None or not medible or not anterior:
+            print(f"{nombre:<42} {valor:>12} {'-' if anterior is None else anterior:>12}")
+            continue
+        cambio = (valor - anterior) / anterior
+        peor = -cambio if nombre.rsplit('.', 1)[-1] not in MENOR_ES_MEJOR else cambio
+        marca = '  REGRESIÓN' if peor > tolerancia else ''
+        print(f"{nombre:<42} {valor:>12} {anterior:>12} {cambio:>+7.0%}{marca}")
+        if marca:
+            regresiones.append(nombre)
+    return regresiones
+
+
+def entorno():
+    return {'python': platform.python_version(), 'sistema': platform.platform(), 'cpus': os.cpu_count(),
+            'fecha': time.strftime('%Y-%m-%d')}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--solo', nargs='+', choices=GRUPOS, default=list(GRUPOS),
+                        help="Grupos de medidas a ejecutar")
+    parser.add_argument('--linea-base', default=ARCHIVO_LINEA_BASE, metavar='RUTA')
+    parser.add_argument('--guardar-linea-base', action='store_true',
+                        help="Guarda los resultados como nueva línea base en lugar de compararlos")
+    parser.add_argument('--tolerancia', type=float, default=0.3,
+                        help="Empeoramiento relativo aceptado antes de marcar una regresión (predeterminado 0.3)")
+    args = parser.parse_args()
+
+    resultados = {}
+    if 'rastreo' in args.solo:
+        print("Rastreando sitios sintéticos...")
+        resultados['rastreo'] = medir_rastreo()
+    urls = urls_peru() if {'clasificador', 'escritura'} & set(args.solo) else []
+    if 'clasificador' in args.solo:
+        print("Midiendo el clasificador...")
+        resultados['clasificador'] = medir_clasificador(urls)
+    if 'escritura' in args.solo:
+        print("Midiendo los escritores de salida...")
+        resultados['escritura'] = medir_escritura(urls)
+    metricas = aplanar(resultados)
+
+    if args.guardar_linea_base:
+        with open(args.linea_base, 'w', encoding='utf-8') as f:
+            json.dump({'entorno': entorno(), 'metricas': metricas}, f, ensure_ascii=False, indent=2)
+            f.write('\n')
+        print(f"Línea base guardada en {args.linea_base}")
+        return 0
+
+    base = {}
+    if os.path.exists(args.linea_base):
+        with open(args.linea_base, encoding='utf-8') as f:
+            guardada = json.load(f)
+        base = guardada['metricas']
+        print(f"Línea base: {guardada['entorno']}")
+    else:
+        print("Sin línea base: use --guardar-linea-base para crearla")
+    regresiones = comparar(metricas, base, args.tolerancia)
+    if regresiones:
+        print(f"\n{len(regresiones)} regresiones por encima del {args.tolerancia:.0%}: {', '.join(regresiones)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
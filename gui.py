@@ -1,14 +1,30 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 from urllib.parse import urlparse
+import itertools
 import threading
 import os
 
+from rastreador.alcance import Alcance, leer_reglas
+from rastreador.cache_http import CacheHTTP
+from rastreador.canonico import PARAMETROS_DENEGADOS, Canonizador
+from rastreador.checkpoint import Checkpoint, leer_checkpoint
+from rastreador.clasificador import CATEGORIAS
+from rastreador.cliente import obtener_cliente
+from rastreador.constantes import CONCURRENCIA_GLOBAL
+from rastreador.perfilado import Perfilador
+from rastreador.registro import configurar_registro
+from rastreador.salida import (GRUPO_NO_ADMINISTRATIVA, TITULOS_CATEGORIA, SalidaIncremental, es_sitio_peru,
+                               guardar_agrupado, leer_urls)
+
+# Archivo de la caché HTTP persistente de la GUI
+ARCHIVO_CACHE = "cache_http.sqlite"
+
 class URLExtractorApp:
     def __init__(self, root):
         self.root = root
         self.root.title("Extractor de URLs")
-        self.root.geometry("600x400")
+        self.root.geometry("600x480")
         self.root.resizable(True, True)
         
         # Variables
@@ -16,6 +32,12 @@ class URLExtractorApp:
         self.progress_var = tk.DoubleVar()
         self.status_var = tk.StringVar(value="Listo")
         self.download_button_state = tk.StringVar(value="disabled")
+        self.cache_var = tk.BooleanVar(value=False)
+        self.profile_var = tk.BooleanVar(value=False)
+        self.scope_var = tk.StringVar()
+        self.query_var = tk.BooleanVar(value=False)
+        self.params_var = tk.StringVar()
+        self.aliases_var = tk.StringVar()
         self.output_file = ""
         
         # Configurar el estilo
@@ -75,6 +97,80 @@ class URLExtractorApp:
         self.depth_spinbox.set("2")
         self.depth_spinbox.pack(side=tk.LEFT, padx=5)
         
+        ttk.Label(depth_frame, text="Concurrencia (1-20):").pack(side=tk.LEFT)
+        
+        self.concurrency_spinbox = ttk.Spinbox(
+            depth_frame, 
+            from_=1, 
+            to=20, 
+            width=5
+        )
+        self.concurrency_spinbox.set(str(CONCURRENCIA_GLOBAL))
+        self.concurrency_spinbox.pack(side=tk.LEFT, padx=5)
+        
+        # Caché HTTP persistente
+        self.cache_check = ttk.Checkbutton(
+            input_frame,
+            text=f"Usar caché HTTP ({ARCHIVO_CACHE})",
+            variable=self.cache_var
+        )
+        self.cache_check.pack(anchor=tk.W, pady=5)
+        
+        # Perfil de CPU y memoria del rastreo (cProfile + tracemalloc)
+        self.profile_check = ttk.Checkbutton(
+            input_frame,
+            text="Perfilar el rastreo (informes en perfil_<dominio>/)",
+            variable=self.profile_var
+        )
+        self.profile_check.pack(anchor=tk.W, pady=5)
+        
+        # Reglas de alcance (rastreador.alcance), separadas por ';': -ruta:/noticias; -tipo:imagen
+        scope_frame = ttk.Frame(input_frame)
+        scope_frame.pack(fill=tk.X, pady=5)
+        
+        ttk.Label(scope_frame, text="Reglas de alcance:").pack(side=tk.LEFT)
+        
+        self.scope_entry = ttk.Entry(
+            scope_frame,
+            textvariable=self.scope_var,
+            width=50
+        )
+        self.scope_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        
+        # Canonicalización de URLs (rastreador.canonico): consulta conservada y alias del host
+        self.query_check = ttk.Checkbutton(
+            input_frame,
+            text="Conservar la consulta (?...) de las URLs, sin parámetros de seguimiento",
+            variable=self.query_var
+        )
+        self.query_check.pack(anchor=tk.W, pady=5)
+        
+        # Parámetros separados por ';': los que empiezan por '-' se eliminan y los demás son los únicos conservados
+        params_frame = ttk.Frame(input_frame)
+        params_frame.pack(fill=tk.X, pady=5)
+        
+        ttk.Label(params_frame, text="Parámetros de consulta:").pack(side=tk.LEFT)
+        
+        self.params_entry = ttk.Entry(
+            params_frame,
+            textvariable=self.params_var,
+            width=50
+        )
+        self.params_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        
+        # Otros hosts que sirven el mismo sitio, separados por ';'
+        aliases_frame = ttk.Frame(input_frame)
+        aliases_frame.pack(fill=tk.X, pady=5)
+        
+        ttk.Label(aliases_frame, text="Alias del host:").pack(side=tk.LEFT)
+        
+        self.aliases_entry = ttk.Entry(
+            aliases_frame,
+            textvariable=self.aliases_var,
+            width=50
+        )
+        self.aliases_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        
         # Botones
         button_frame = ttk.Frame(input_frame)
         button_frame.pack(fill=tk.X, pady=10)
@@ -165,6 +261,13 @@ class URLExtractorApp:
             state = "disabled" if extracting else "normal"
             self.url_entry.config(state=state)
             self.depth_spinbox.config(state=state)
+            self.concurrency_spinbox.config(state=state)
+            self.cache_check.config(state=state)
+            self.profile_check.config(state=state)
+            self.scope_entry.config(state=state)
+            self.query_check.config(state=state)
+            self.params_entry.config(state=state)
+            self.aliases_entry.config(state=state)
             self.start_button.config(state=state)
         self.root.after(0, _toggle)
     
@@ -183,6 +286,42 @@ class URLExtractorApp:
             messagebox.showerror("Error", "La profundidad debe ser un número entre 1 y 5")
             return
         
+        try:
+            concurrency = int(self.concurrency_spinbox.get())
+            if concurrency < 1 or concurrency > 20:
+                raise ValueError("La concurrencia debe estar entre 1 y 20")
+        except ValueError:
+            messagebox.showerror("Error", "La concurrencia debe ser un número entre 1 y 20")
+            return
+        
+        try:
+            scope_rules = leer_reglas(self.scope_var.get().replace(';', '\n'))
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return
+        
+        # Opciones del Canonizador: '-nombre' deniega un parámetro, los demás son los únicos permitidos
+        parametros = [p.strip() for p in self.params_var.get().split(';') if p.strip()]
+        permitidos = [p for p in parametros if not p.startswith('-')] or None
+        canonical_options = {
+            'alias_host': [a.strip() for a in self.aliases_var.get().split(';') if a.strip()],
+            'conservar_consulta': self.query_var.get() or permitidos is not None,
+            'parametros_permitidos': permitidos,
+            'parametros_denegados': PARAMETROS_DENEGADOS + tuple(p[1:] for p in parametros if p.startswith('-')),
+        }
+        
+        # Ofrecer reanudar si quedó un rastreo sin terminar para este sitio
+        from main import ruta_checkpoint
+        url_completa = url if url.startswith(('http://', 'https://')) else 'https://' + url
+        previo = leer_checkpoint(ruta_checkpoint(url_completa))
+        resume = False
+        if previo is not None and not previo.terminado:
+            resume = messagebox.askyesno(
+                "Reanudar",
+                f"Hay un rastreo sin terminar de este sitio ({len(previo.visitadas)} páginas visitadas).\n"
+                "¿Desea reanudarlo?"
+            )
+        
         # Limpiar consola
         self.console.configure(state='normal')
         self.console.delete(1.0, tk.END)
@@ -197,7 +336,8 @@ class URLExtractorApp:
         # Iniciar extracción en un hilo separado
         self.extraction_thread = threading.Thread(
             target=self.run_extraction,
-            args=(url, depth),
+            args=(url, depth, concurrency, self.cache_var.get(), resume, self.profile_var.get(), scope_rules,
+                  canonical_options),
             daemon=True
         )
         self.extraction_thread.start()
@@ -219,16 +359,20 @@ class URLExtractorApp:
             if hasattr(self, 'output_file') and self.output_file:
                 self.download_button.config(state="normal")
     
-    def run_extraction(self, url, depth):
+    def run_extraction(self, url, depth, concurrency=CONCURRENCIA_GLOBAL, use_cache=False, resume=False,
+                       use_profile=False, scope_rules=(), canonical_options=None):
         """Ejecuta la extracción de URLs"""
+        checkpoint = None
+        salida = None
+        perfilador = None
         try:
             # Importar aquí para evitar problemas de importación circular
             from urllib.parse import urlparse
-            import time
-            from main import explorar_sitio, filtrar_urls_administrativas
+            from main import explorar_sitio, ruta_checkpoint, ruta_perfil
             
             self.log(f"Iniciando extracción de: {url}")
             self.log(f"Profundidad de búsqueda: {depth}")
+            self.log(f"Peticiones simultáneas: {concurrency}")
             
             # Actualizar estado inicial
             self.update_status("Conectando al sitio...", "blue")
@@ -250,54 +394,90 @@ class URLExtractorApp:
             
             # Realizar la exploración del sitio
             self.log("\nIniciando exploración del sitio...")
-            urls_encontradas = explorar_sitio(url_base, profundidad_maxima=depth)
+            cache = CacheHTTP(ARCHIVO_CACHE) if use_cache else None
+            # El progreso se registra para poder reanudar si la extracción se interrumpe
+            checkpoint = Checkpoint(ruta_checkpoint(url_base),
+                                    metadatos={'url_base': url_base, 'profundidad': depth}, reanudar=resume)
+            if checkpoint.previo is not None:
+                self.log(f"Reanudando: {len(checkpoint.previo.visitadas)} páginas ya visitadas")
+            ruta_parcial = f"{ruta_checkpoint(url_base)}.parcial"
+            if use_profile:
+                perfilador = Perfilador(ruta_perfil(url_base)).iniciar()
+            salida = SalidaIncremental([ruta_parcial], clasificar=es_sitio_peru(url),
+                                       anadir=checkpoint.previo is not None,
+                                       observador=perfilador.observador if perfilador is not None else None)
+            alcance = Alcance(scope_rules).fijar_base(urlparse(url_base).netloc)
+            if scope_rules:
+                self.log(f"Reglas de alcance: {' '.join(alcance.configuracion()['reglas'])}")
+            canonico = Canonizador(url_base, **(canonical_options or {}), admitir_host=alcance.admite_host)
+            urls_encontradas = explorar_sitio(url_base, profundidad_maxima=depth, concurrencia=concurrency,
+                                              cache=cache, checkpoint=checkpoint, observador=salida,
+                                              canonico=canonico, alcance=alcance)
+            salida.cerrar()
             
             if not urls_encontradas:
                 self.update_status("No se encontraron URLs", "orange")
                 self.log("No se encontraron URLs en el sitio")
+                os.remove(ruta_parcial)
                 return
                 
             self.log(f"\nTotal de URLs encontradas: {len(urls_encontradas)}")
+            if alcance.descartadas:
+                self.log(f"Enlaces fuera del alcance descartados sin petición: {alcance.descartadas}")
+            evitadas = canonico.estadisticas()['peticiones_evitadas']
+            if evitadas:
+                self.log(f"Peticiones evitadas por la canonicalización de URLs: {evitadas}")
+            stats = obtener_cliente().estadisticas()
+            self.log(f"Conexiones HTTP reutilizadas: {stats['conexiones_reutilizadas']}/{stats['peticiones']} "
+                     f"(ahorro estimado: {stats['tiempo_ahorrado_estimado_s']} s)")
+            if cache is not None:
+                stats_cache = cache.estadisticas()
+                self.log(f"Caché HTTP: {stats_cache['revalidadas_304']} páginas sin cambios, "
+                         f"{stats_cache['guardadas']} guardadas")
+                cache.cerrar()
             
-            # Filtrar URLs administrativas si es un sitio peruano
-            if 'enperu.org' in url or 'peru' in url.lower():
+            # Las URLs encontradas se escriben en disco durante el rastreo y aquí se
+            # ordenan por bloques para generar el archivo agrupado
+            dominio = urlparse(url_base).netloc.replace('www.', '')
+            administrativas = es_sitio_peru(url)
+            if administrativas:
                 self.log("\nFiltrando URLs administrativas...")
-                urls_administrativas = filtrar_urls_administrativas(urls_encontradas)
-                self.log(f"URLs administrativas encontradas: {len(urls_administrativas)}")
-                
-                # Guardar resultados
-                dominio = urlparse(url_base).netloc.replace('www.', '')
                 self.output_file = f"urls_administrativas_{dominio}.txt"
-                
-                with open(self.output_file, 'w', encoding='utf-8') as f:
-                    f.write(f"=== RESULTADOS PARA {dominio} ===\n")
-                    f.write(f"Total de URLs encontradas: {len(urls_encontradas)}\n")
-                    f.write(f"URLs administrativas: {len(urls_administrativas)}\n\n")
-                    
-                    # Escribir todas las URLs administrativas
-                    for url in sorted(urls_administrativas):
-                        f.write(f"{url}\n")
             else:
                 # Para sitios que no son de Perú, guardar todas las URLs encontradas
-                dominio = urlparse(url_base).netloc.replace('www.', '')
                 self.output_file = f"urls_{dominio}.txt"
-                
-                with open(self.output_file, 'w', encoding='utf-8') as f:
-                    f.write(f"=== TODAS LAS URLs ENCONTRADAS EN {dominio} ===\n\n")
-                    for url in sorted(urls_encontradas):
-                        f.write(f"{url}\n")
+            encontradas = leer_urls(ruta_parcial)
+            if checkpoint.previo is not None:
+                encontradas = itertools.chain(encontradas, checkpoint.previo.resultados)
+            conteo = guardar_agrupado(encontradas, self.output_file, dominio, administrativas=administrativas)
+            os.remove(ruta_parcial)
+            if administrativas:
+                self.log(f"URLs administrativas encontradas: "
+                         f"{sum(conteo.values()) - conteo[GRUPO_NO_ADMINISTRATIVA]}")
+                for categoria in CATEGORIAS:
+                    if conteo[categoria]:
+                        self.log(f"  {TITULOS_CATEGORIA[categoria].capitalize()}: {conteo[categoria]}")
             
             # Actualizar interfaz
             self.update_status("Extracción completada", "green")
             self.update_progress(100)
             self.log(f"\n¡Extracción completada con éxito!")
             self.log(f"Resultados guardados en: {self.output_file}")
+            checkpoint.eliminar()
             
         except Exception as e:
             import traceback
             error_msg = f"Error durante la extracción: {str(e)}\n\n{traceback.format_exc()}"
             self.log(f"\n{error_msg}")
             self.update_status(f"Error: {str(e)}", "red")
+            if salida is not None:
+                salida.cerrar()
+            if checkpoint is not None:
+                self.log(f"Progreso guardado en {checkpoint.ruta}; puede reanudarse en la próxima extracción")
+        finally:
+            if perfilador is not None:
+                artefactos = perfilador.detener()
+                self.log(f"Perfil guardado en {perfilador.directorio}/: {', '.join(sorted(artefactos))}")
     
     def download_results(self):
         """Permite al usuario guardar los resultados en una ubicación específica"""
@@ -328,6 +508,9 @@ class URLExtractorApp:
             self.root.after(0, _save_file)
 
 def main():
+    # Los mensajes del rastreo (página a página) siguen saliendo por la consola
+    configurar_registro()
+
     # Crear la ventana principal
     try:
         from ttkthemes import ThemedTk
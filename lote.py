@@ -0,0 +1,289 @@
+"""
+Rastreo por lotes de muchos dominios, repartidos entre varios procesos.
+
+Uso: python lote.py dominios.txt [-j PROCESOS] [-c CONCURRENCIA] [-o DIRECTORIO]
+
+El archivo tiene un dominio por línea (se ignoran las líneas vacías y las que
+empiezan por '#'). Cada dominio se rastrea en un proceso del pool; sus URLs se
+escriben en DIRECTORIO/urls_<dominio>.txt.parcial a medida que se encuentran y, al
+terminar, se ordenan en DIRECTORIO/urls_<dominio>.txt. Por cada dominio se añade una
+línea a DIRECTORIO/manifiesto.jsonl con su estado, tiempos y errores; si el rastreo
+falla, el archivo parcial se conserva y el manifiesto lo indica. Si un proceso muere
+(por ejemplo, sin memoria), los dominios que estaban en curso se registran con error y
+el lote sigue con un pool nuevo; con --limite-tiempo, un dominio que lo supera se
+interrumpe y se registra con error. Con --reanudar se saltan los dominios que el
+manifiesto ya da por terminados.
+"""
+import _thread
+import argparse
+import contextlib
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from main import explorar_sitio, guardar_resultados, obtener_urls_directas, rutas_incrementales
+from rastreador.constantes import CONCURRENCIA_GLOBAL
+from rastreador.registro import FORMATOS_REGISTRO, NIVELES, configurar_registro
+from rastreador.salida import SalidaIncremental, leer_urls
+from rastreador.sitemap import MODOS_SITEMAP
+
+ARCHIVO_MANIFIESTO = 'manifiesto.jsonl'
+ARCHIVO_RESUMEN = 'resumen.json'
+# Dominios rastreados por cada proceso antes de reemplazarlo (libera la memoria acumulada)
+DOMINIOS_POR_PROCESO = 50
+
+
+def leer_dominios(ruta):
+    """
+    Dominios del archivo de entrada, sin repetir y en su orden original
+    """
+    dominios = []
+    vistos = set()
+    with open(ruta, encoding='utf-8') as f:
+        for linea in f:
+            dominio = linea.split('#', 1)[0].strip()
+            if not dominio or dominio.lower() in vistos:
+                continue
+            vistos.add(dominio.lower())
+            dominios.append(dominio)
+    return dominios
+
+
+def leer_manifiesto(ruta):
+    """
+    Último registro de cada dominio en un manifiesto existente
+    """
+    registros = {}
+    if not os.path.exists(ruta):
+        return registros
+    with open(ruta, encoding='utf-8') as f:
+        for linea in f:
+            try:
+                registro = json.loads(linea)
+            except ValueError:
+                # Línea incompleta de una ejecución interrumpida
+                continue
+            registros[registro['dominio'].lower()] = registro
+    return registros
+
+
+def _nombre_registro(dominio):
+    return re.sub(r'[^\w.-]+', '_', dominio) + '.log'
+
+
+def _conservar_parcial(registro, salida):
+    """
+    Anota en el registro el archivo parcial de un rastreo fallido, con lo encontrado antes del fallo
+    """
+    if salida is None:
+        return
+    salida.cerrar()
+    if os.path.exists(salida.escritores[0].ruta):
+        registro.update(archivo_parcial=os.path.basename(salida.escritores[0].ruta),
+                        urls_parciales=sum(1 for _ in leer_urls(salida.escritores[0].ruta)))
+
+
+def rastrear_dominio(tarea):
+    """
+    Rastrea un dominio en un proceso del pool y devuelve su registro para el manifiesto.
+    La salida por pantalla del rastreo va a DIRECTORIO/registros/<dominio>.log.
+    """
+    dominio, opciones = tarea
+    inicio = time.time()
+    registro = {'dominio': dominio, 'inicio': round(inicio, 3), 'pid': os.getpid()}
+    ruta_registro = os.path.join(opciones['directorio'], 'registros', _nombre_registro(dominio))
+    salida = None
+    # Límite de tiempo: el temporizador interrumpe el hilo principal como un Ctrl+C
+    limite = opciones['limite_tiempo']
+    vencido = threading.Event()
+    temporizador = None
+    if limite:
+        def vencer():
+            vencido.set()
+            _thread.interrupt_main()
+        temporizador = threading.Timer(limite, vencer)
+        temporizador.daemon = True
+        temporizador.start()
+    with open(ruta_registro, 'w', encoding='utf-8') as registro_dominio, contextlib.redirect_stdout(registro_dominio):
+        configurar_registro(opciones['nivel_log'], opciones['formato_log'])
+        try:
+            urls_directas = obtener_urls_directas(dominio)
+            if not urls_directas:
+                registro.update(estado='inaccesible', error='No se pudo acceder al dominio')
+            else:
+                url_base = next(iter(urls_directas))
+                registro['url_base'] = url_base
+                # Las URLs se escriben en disco a medida que se encuentran, no al final del rastreo
+                ruta_parcial = os.path.join(opciones['directorio'], rutas_incrementales(url_base)[0])
+                salida = SalidaIncremental([ruta_parcial])
+                inicio_rastreo = time.time()
+                urls = len(explorar_sitio(url_base, profundidad_maxima=opciones['profundidad'],
+                                          concurrencia=opciones['concurrencia'],
+                                          limite_paginas=opciones['limite_paginas'],
+                                          sitemap=opciones['sitemap'],
+                                          respetar_robots=opciones['respetar_robots'], observador=salida))
+                registro['rastreo_s'] = round(time.time() - inicio_rastreo, 2)
+                salida.cerrar()
+                archivo = guardar_resultados(url_base, leer_urls(ruta_parcial), opciones['directorio'])
+                os.remove(ruta_parcial)
+                registro.update(estado='ok', urls=urls, archivo=os.path.basename(archivo))
+        except KeyboardInterrupt:
+            if not vencido.is_set():
+                raise
+            print(f"\nLímite de tiempo superado ({limite} s)")
+            registro.update(estado='error', error=f"TimeoutError: límite de {limite} s superado")
+            _conservar_parcial(registro, salida)
+        except Exception as e:
+            print(f"\nError durante la exploración: {e}")
+            registro.update(estado='error', error=f"{type(e).__name__}: {e}")
+            _conservar_parcial(registro, salida)
+        finally:
+            if temporizador is not None:
+                temporizador.cancel()
+    registro['duracion_s'] = round(time.time() - inicio, 2)
+    return registro
+
+
+def analizar_argumentos(argv=None):
+    parser = argparse.ArgumentParser(description="Rastreo por lotes de una lista de dominios")
+    parser.add_argument('archivo', help="Archivo con un dominio por línea")
+    parser.add_argument('-o', '--salida', default='resultados_lote',
+                        help="Directorio de resultados (predeterminado resultados_lote)")
+    parser.add_argument('-j', '--procesos', type=int, default=os.cpu_count() or 1,
+                        help="Dominios rastreados a la vez, uno por proceso (predeterminado: núcleos de la CPU)")
+    parser.add_argument('-c', '--concurrencia', type=int, default=CONCURRENCIA_GLOBAL,
+                        help=f"Páginas descargadas en paralelo por dominio (predeterminado {CONCURRENCIA_GLOBAL})")
+    parser.add_argument('-p', '--profundidad', type=int, default=2,
+                        help="Profundidad de búsqueda (1-5, predeterminado 2)")
+    parser.add_argument('--limite-paginas', type=int, default=None,
+                        help="Máximo de páginas por dominio")
+    parser.add_argument('--sitemap', choices=MODOS_SITEMAP, default=None,
+                        help="Usa los sitemaps de cada dominio ('semilla' o 'solo')")
+    parser.add_argument('--ignorar-robots', action='store_true',
+                        help="Rastrea también las URLs que robots.txt no permite")
+    parser.add_argument('--limite-tiempo', type=float, default=None, metavar='SEGUNDOS',
+                        help="Tiempo máximo de rastreo de cada dominio; al superarlo se registra con error")
+    parser.add_argument('--reanudar', action='store_true',
+                        help="Salta los dominios que el manifiesto ya da por terminados")
+    parser.add_argument('--nivel-log', choices=NIVELES, default='INFO', type=str.upper,
+                        help="Nivel mínimo de los mensajes de los registros de cada dominio (predeterminado INFO)")
+    parser.add_argument('--formato-log', choices=FORMATOS_REGISTRO, default='texto',
+                        help="'json' escribe los registros de cada dominio con un objeto JSON por línea")
+    return parser.parse_args(argv)
+
+
+def main(args):
+    dominios = leer_dominios(args.archivo)
+    os.makedirs(os.path.join(args.salida, 'registros'), exist_ok=True)
+    ruta_manifiesto = os.path.join(args.salida, ARCHIVO_MANIFIESTO)
+
+    if args.reanudar:
+        previos = leer_manifiesto(ruta_manifiesto)
+        terminados = {d for d, r in previos.items() if r.get('estado') in ('ok', 'inaccesible')}
+        pendientes = [d for d in dominios if d.lower() not in terminados]
+        print(f"Reanudando: {len(dominios) - len(pendientes)} dominios ya terminados")
+    else:
+        pendientes = dominios
+        # Sin --reanudar el manifiesto empieza de cero
+        open(ruta_manifiesto, 'w').close()
+
+    opciones = {
+        'directorio': args.salida,
+        'profundidad': min(max(args.profundidad, 1), 5),
+        'concurrencia': max(1, args.concurrencia),
+        'limite_paginas': args.limite_paginas,
+        'sitemap': args.sitemap,
+        'respetar_robots': not args.ignorar_robots,
+        'nivel_log': args.nivel_log,
+        'formato_log': args.formato_log,
+        'limite_tiempo': args.limite_tiempo,
+    }
+    procesos = max(1, min(args.procesos, len(pendientes) or 1))
+    print(f"=== RASTREO POR LOTES: {len(pendientes)} dominios, {procesos} procesos ===")
+
+    inicio = time.time()
+    # Se envían tantos dominios como procesos: si el pool se rompe, solo se pierden los que estaban en curso
+    cola = iter(pendientes)
+    en_curso = {}
+    n = 0
+    pool = ProcessPoolExecutor(procesos, max_tasks_per_child=DOMINIOS_POR_PROCESO)
+    try:
+        with open(ruta_manifiesto, 'a', encoding='utf-8') as manifiesto:
+            while True:
+                for dominio in cola:
+                    en_curso[pool.submit(rastrear_dominio, (dominio, opciones))] = (dominio, time.time())
+                    if len(en_curso) >= procesos:
+                        break
+                if not en_curso:
+                    break
+                terminados, _ = wait(en_curso, return_when=FIRST_COMPLETED)
+                roto = any(isinstance(futuro.exception(), BrokenProcessPool) for futuro in terminados)
+                if roto:
+                    # Un proceso murió (sin memoria, señal...): el pool ya no acepta tareas y todas
+                    # las que estaban en curso fallan. No se sabe cuál lo causó, así que se registran todas
+                    terminados, _ = wait(en_curso)
+                for futuro in terminados:
+                    dominio, enviado = en_curso.pop(futuro)
+                    if futuro.exception() is None:
+                        registro = futuro.result()
+                    else:
+                        registro = {'dominio': dominio, 'inicio': round(enviado, 3), 'estado': 'error',
+                                    'error': f"{type(futuro.exception()).__name__}: {futuro.exception()}",
+                                    'duracion_s': round(time.time() - enviado, 2)}
+                    # Cada dominio queda registrado en cuanto termina
+                    manifiesto.write(json.dumps(registro, ensure_ascii=False) + '\n')
+                    manifiesto.flush()
+                    n += 1
+                    detalle = f"{registro['urls']} URLs" if registro['estado'] == 'ok' else registro['error']
+                    print(f"[{n}/{len(pendientes)}] {registro['dominio']}: {registro['estado']} "
+                          f"({detalle}, {registro['duracion_s']} s)")
+                if roto:
+                    pool.shutdown()
+                    print("Un proceso del pool terminó de forma inesperada; se continúa con uno nuevo")
+                    pool = ProcessPoolExecutor(procesos, max_tasks_per_child=DOMINIOS_POR_PROCESO)
+    except KeyboardInterrupt:
+        pool.shutdown(wait=False, cancel_futures=True)
+        print("\nLote interrumpido. Use --reanudar para continuar con los dominios pendientes.")
+        raise
+    finally:
+        pool.shutdown()
+
+    # El resumen cubre todo el lote, incluidos los dominios de ejecuciones anteriores
+    duracion = time.time() - inicio
+    del_lote = {dominio.lower() for dominio in dominios}
+    registros = [r for d, r in leer_manifiesto(ruta_manifiesto).items() if d in del_lote]
+    cuentas = {estado: sum(1 for r in registros if r['estado'] == estado)
+               for estado in ('ok', 'inaccesible', 'error')}
+    urls_totales = sum(r.get('urls', 0) for r in registros)
+    lentos = sorted(registros, key=lambda r: r['duracion_s'], reverse=True)[:10]
+    resumen = {
+        'archivo': args.archivo,
+        'dominios': len(dominios),
+        **cuentas,
+        'urls': urls_totales,
+        'procesos': procesos,
+        'concurrencia_por_dominio': opciones['concurrencia'],
+        'rastreados_en_esta_ejecucion': len(pendientes),
+        'duracion_s': round(duracion, 2),
+        'dominios_por_minuto': round(len(pendientes) / duracion * 60, 2) if duracion > 0 else None,
+        'mas_lentos': [{'dominio': r['dominio'], 'duracion_s': r['duracion_s']} for r in lentos],
+        'fallidos': [{'dominio': r['dominio'], 'estado': r['estado'], 'error': r['error']}
+                     for r in registros if r['estado'] != 'ok'],
+    }
+    with open(os.path.join(args.salida, ARCHIVO_RESUMEN), 'w', encoding='utf-8') as f:
+        json.dump(resumen, f, ensure_ascii=False, indent=2)
+    print(f"\n=== LOTE TERMINADO en {resumen['duracion_s']} s ===")
+    print(f"Correctos: {cuentas['ok']} | inaccesibles: {cuentas['inaccesible']} | con error: {cuentas['error']} "
+          f"| URLs: {urls_totales}")
+    print(f"Manifiesto: {ruta_manifiesto}")
+
+
+if __name__ == '__main__':
+    try:
+        main(analizar_argumentos())
+    except KeyboardInterrupt:
+        pass
@@ -1,296 +1,465 @@
-import requests
-from urllib.parse import urlparse, urljoin
-from bs4 import BeautifulSoup
-import time
-import re
+import argparse
+import itertools
+import logging
+import os
+from urllib.parse import urlparse
+
+from rastreador.acceso import resolver_url_base
+from rastreador.alcance import Alcance, leer_regla, leer_reglas
+from rastreador.cache_http import CacheHTTP, TAMANO_MAXIMO
+from rastreador.canonico import PARAMETROS_DENEGADOS, Canonizador
+from rastreador.checkpoint import Checkpoint, leer_checkpoint
+from rastreador.clasificador import es_administrativa, clasificar_lote
+from rastreador.cliente import obtener_cliente
+from rastreador.constantes import CONCURRENCIA_GLOBAL, CONCURRENCIA_POR_HOST, LIMITE_PAGINAS, MEMORIA_VISTAS
+from rastreador.estado import EstadoRastreo
+from rastreador.motor import MotorRastreo
+from rastreador.perfilado import MODOS_PERFIL, Perfilador
+from rastreador.registro import FORMATOS_REGISTRO, NIVELES, configurar_registro
+from rastreador.robots import obtener_robots
+from rastreador.salida import FORMATOS, GRUPO_NO_ADMINISTRATIVA, SalidaIncremental, es_sitio_peru, \
+    guardar_agrupado, leer_urls
+from rastreador.sitemap import MODOS_SITEMAP, descubrir_urls
+
+# Archivo predeterminado del estado del modo incremental
+ARCHIVO_ESTADO = "estado_rastreo.sqlite"
+
+logger = logging.getLogger(__name__)
 
 def es_url_administrativa(url):
     """
     Identifica si una URL corresponde a un departamento, provincia o distrito
     """
-    # Lista de departamentos del Perú
-    departamentos = [
-        'amazonas', 'ancash', 'apurimac', 'arequipa', 'ayacucho', 'cajamarca',
-        'cusco', 'callao', 'huancavelica', 'huanuco', 'ica', 'junin',
-        'la-libertad', 'lambayeque', 'lima', 'loreto', 'madre-de-dios',
-        'moquegua', 'pasco', 'piura', 'puno', 'san-martin', 'tacna',
-        'tumbes', 'ucayali'
-    ]
-    
-    # Convertir URL a minúsculas para comparación
-    url_lower = url.lower()
-    
-    # Patrones para identificar URLs administrativas
-    patrones = [
-        # Departamentos: /departamento o /departamento/
-        r'/(' + '|'.join(departamentos) + r')/?$',
-        
-        # Provincias: /departamento/provincia-xxx o /departamento/provincias/
-        r'/(' + '|'.join(departamentos) + r')/provincia[s]?-',
-        r'/(' + '|'.join(departamentos) + r')/provincia[s]/',
-        
-        # Distritos: /departamento/informacion-xxx/distrito-xxx o /departamento/informacion-xxx/distrito-de-xxx
-        r'/(' + '|'.join(departamentos) + r')/informacion-[a-z]+/distrito',
-        
-        # Distritos alternativos: /departamento/distrito-xxx
-        r'/(' + '|'.join(departamentos) + r')/distrito'
-    ]
-    
-    # Verificar si la URL coincide con algún patrón
-    for patron in patrones:
-        if re.search(patron, url_lower):
-            return True
-    
-    return False
+    return es_administrativa(url)
 
 def filtrar_urls_administrativas(urls):
     """
     Filtra un conjunto de URLs para quedarse solo con las administrativas
     """
-    return {url for url in urls if es_url_administrativa(url)}
+    return {url for url, _ in clasificar_lote(urls)}
 
 def obtener_urls_directas(url_objetivo):
     """
     Intenta acceder a la URL objetivo y devuelve la URL base accesible
     """
-    urls_encontradas = set()
-    
-    # Asegurarse de que la URL tenga el esquema correcto
-    if not url_objetivo.startswith(('http://', 'https://')):
-        url_objetivo = 'https://' + url_objetivo
-    
-    # Intentar con y sin www
-    variantes_url = [url_objetivo]
-    if 'www.' not in url_objetivo:
-        variantes_url.append(url_objetivo.replace('://', '://www.'))
-    
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-    }
-    
-    print(f"Intentando acceder a: {url_objetivo}")
-    
-    for url in variantes_url:
-        try:
-            print(f"Probando: {url}")
-            response = requests.head(url, headers=headers, timeout=10, allow_redirects=True)
-            
-            if response.status_code == 200:
-                final_url = response.url.rstrip('/') + '/'  # Normalizar URL
-                print(f"Acceso exitoso a: {final_url}")
-                urls_encontradas.add(final_url)
-                break
-        except requests.exceptions.SSLError:
-            # Intentar con HTTP si falla HTTPS
-            try:
-                http_url = url.replace('https://', 'http://')
-                print(f"Error SSL, probando con HTTP: {http_url}")
-                response = requests.head(http_url, headers=headers, timeout=10, allow_redirects=True)
-                if response.status_code == 200:
-                    final_url = response.url.rstrip('/') + '/'  # Normalizar URL
-                    print(f"Acceso exitoso a: {final_url}")
-                    urls_encontradas.add(final_url)
-                    break
-            except Exception as e:
-                print(f"Error al acceder a {http_url}: {e}")
-        except Exception as e:
-            print(f"Error al acceder a {url}: {e}")
-    
-    return urls_encontradas
+    logger.info("Intentando acceder a: %s", url_objetivo)
+    # Variantes https/http y con/sin www en paralelo; el resultado queda en caché por dominio
+    url_base = resolver_url_base(url_objetivo)
+    return {url_base} if url_base else set()
 
-def explorar_sitio(url_base, profundidad_maxima=2):
+def explorar_sitio(url_base, profundidad_maxima=2, concurrencia=CONCURRENCIA_GLOBAL,
+                   concurrencia_por_host=CONCURRENCIA_POR_HOST, pausa=None,
+                   limite_paginas=LIMITE_PAGINAS, modo_frontera='bfs', extractor='auto', cache=None,
+                   estado=None, edad_maxima=None, checkpoint=None, observador=None, sitemap=None,
+                   respetar_robots=True, memoria_vistas=MEMORIA_VISTAS, canonico=None, alcance=None):
     """
-    Explora recursivamente un sitio web a partir de una URL base
-    y devuelve todas las URLs encontradas hasta la profundidad especificada
+    Explora un sitio web a partir de una URL base y devuelve todas las URLs
+    encontradas hasta la profundidad especificada (la URL base es la profundidad 0).
+    Las páginas se descargan en paralelo con un límite global y otro por host.
+    pausa: segundos fijos de espera tras cada página; con None (predeterminado) el ritmo de
+    cada host se adapta a su latencia y a sus respuestas 429/503 (rastreador.cortesia).
+    modo_frontera: 'bfs' (nivel a nivel) o 'prioridad' (rutas más cortas primero).
+    extractor: backend de extracción de enlaces ('auto', 'html.parser', 'lxml' o 'bs4').
+    cache: CacheHTTP (o ruta de su archivo SQLite) para revalidar páginas ya descargadas.
+    estado: EstadoRastreo para el modo incremental; las páginas visitadas hace menos de
+    edad_maxima segundos no se vuelven a pedir y las que no cambian reutilizan sus enlaces.
+    checkpoint: Checkpoint donde se registra el progreso; si trae estado previo, el rastreo se reanuda.
+    observador: función observador(evento, datos) que recibe el progreso del rastreo página a página.
+    sitemap: 'semilla' añade a la frontera las URLs de los sitemaps del sitio; 'solo' las
+    devuelve directamente sin rastrear. respetar_robots: no rastrea las URLs que prohíbe robots.txt.
+    memoria_vistas: bytes de memoria para las URLs vistas; por encima se guardan en disco.
+    canonico: Canonizador con las reglas de canonicalización de URLs (por defecto las de rastreador.canonico).
+    alcance: Alcance con las reglas de qué URLs se rastrean (por defecto todas las del sitio salvo los
+    archivos); los enlaces que no las cumplen no se piden.
     """
-    urls_encontradas = set()
-    urls_por_visitar = set([url_base])
-    urls_visitadas = set()
-    
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-    }
-    
-    while urls_por_visitar and len(urls_visitadas) < 1000:  # Límite de seguridad
-        url_actual = urls_por_visitar.pop()
-        
-        # Evitar visitar la misma URL múltiples veces
-        if url_actual in urls_visitadas:
-            continue
-            
-        urls_visitadas.add(url_actual)
-        print(f"Explorando: {url_actual} (nivel {len(urls_visitadas)})")
-        
-        try:
-            # Usar HEAD primero para verificar si la URL es accesible
-            try:
-                head_response = requests.head(url_actual, headers=headers, timeout=10, allow_redirects=True)
-                if head_response.status_code != 200:
-                    print(f"  Error: Código {head_response.status_code} para {url_actual}")
-                    continue
-            except Exception as e:
-                print(f"  Error en HEAD para {url_actual}: {e}")
+    if sitemap is not None and sitemap not in MODOS_SITEMAP:
+        raise ValueError(f"Modo de sitemap desconocido: {sitemap!r} (use {', '.join(MODOS_SITEMAP)})")
+    robots = obtener_robots(url_base) if respetar_robots or sitemap else None
+    if robots is not None and len(robots):
+        logger.info("robots.txt: %d reglas, %d sitemaps declarados", len(robots), len(robots.sitemaps))
+    alcance = (alcance or Alcance()).fijar_base(urlparse(url_base).netloc)
+    canonico = canonico or Canonizador(url_base, memoria_vistas=memoria_vistas, admitir_host=alcance.admite_host)
+    semillas = None
+    if sitemap is not None:
+        semillas = descubrir_urls(url_base, sitemaps=robots.sitemaps, robots=robots if respetar_robots else None,
+                                  limite=limite_paginas, canonico=canonico)
+    if sitemap == 'solo':
+        urls_encontradas = set()
+        for url in semillas:
+            if not alcance.admite(url):
                 continue
-            
-            # Si es un archivo (ej: .pdf, .jpg, etc.), saltar
-            if any(url_actual.lower().endswith(ext) for ext in ['.pdf', '.jpg', '.jpeg', '.png', '.gif', '.zip', '.doc', '.docx', '.xls', '.xlsx']):
-                print(f"  Saltando archivo: {url_actual}")
-                continue
-                
-            # Obtener el contenido completo de la página
-            response = requests.get(url_actual, headers=headers, timeout=15)
-            
-            if response.status_code == 200:
-                # Agregar la URL a las encontradas
-                urls_encontradas.add(url_actual)
-                
-                # Analizar el contenido HTML
-                soup = BeautifulSoup(response.content, 'html.parser')
-                
-                # Obtener todas las URLs de la página
-                for link in soup.find_all(['a', 'link'], href=True):
-                    href = link['href'].strip()
-                    if not href or href.startswith(('javascript:', 'mailto:', 'tel:', '#')):
-                        continue
-                        
-                    # Construir URL completa
-                    full_url = urljoin(url_actual, href)
-                    parsed_url = urlparse(full_url)
-                    
-                    # Normalizar la URL (eliminar fragmentos y parámetros de seguimiento comunes)
-                    clean_url = f"{parsed_url.scheme}://{parsed_url.netloc}{parsed_url.path}"
-                    clean_url = clean_url.rstrip('/')
-                    
-                    # Verificar si es una URL del mismo dominio
-                    if parsed_url.netloc == urlparse(url_base).netloc:
-                        # Si no la hemos visitado ni está en la lista por visitar
-                        if clean_url not in urls_visitadas and clean_url not in urls_por_visitar:
-                            # Si no hemos alcanzado la profundidad máxima
-                            if len(urls_visitadas) + len(urls_por_visitar) < (100 * (profundidad_maxima + 1)):
-                                urls_por_visitar.add(clean_url)
-                
-                # Pequeña pausa para no saturar el servidor
-                time.sleep(0.5)
-                
-        except Exception as e:
-            print(f"  Error al procesar {url_actual}: {e}")
+            urls_encontradas.add(url)
+            if observador is not None:
+                # Cada URL del sitemap se notifica como una página encontrada y no visitada
+                observador('pagina', {'visitadas': 0, 'pendientes': 0, 'encontradas': len(urls_encontradas),
+                                      'errores': 0, 'hosts': {}, 'url': url, 'profundidad': 1,
+                                      'encontrada': True, 'estado': None, 'padre': None})
+        logger.info("URLs encontradas en los sitemaps: %d", len(urls_encontradas))
+        if observador is not None:
+            observador('fin', {'visitadas': 0, 'pendientes': 0, 'encontradas': len(urls_encontradas),
+                               'errores': 0})
+        return urls_encontradas
+
+    motor = MotorRastreo(
+        url_base,
+        profundidad_maxima=profundidad_maxima,
+        concurrencia=concurrencia,
+        concurrencia_por_host=concurrencia_por_host,
+        pausa=pausa,
+        limite_paginas=limite_paginas,
+        modo_frontera=modo_frontera,
+        extractor=extractor,
+        cache=CacheHTTP(cache) if isinstance(cache, str) else cache,
+        estado=estado,
+        edad_maxima=edad_maxima,
+        checkpoint=checkpoint,
+        observador=observador,
+        robots=robots if respetar_robots else None,
+        semillas=semillas,
+        memoria_vistas=memoria_vistas,
+        canonico=canonico,
+        alcance=alcance,
+    )
+    return motor.ejecutar()
+
+def imprimir_estadisticas_http():
+    """
+    Muestra cuántas conexiones HTTP se reutilizaron y el tiempo de conexión ahorrado
+    """
+    stats = obtener_cliente().estadisticas()
+    print(f"Peticiones HTTP: {stats['peticiones']} | conexiones nuevas: {stats['conexiones_nuevas']} "
+          f"| reutilizadas: {stats['conexiones_reutilizadas']} ({stats['tasa_reutilizacion']:.0%})")
+    print(f"Tiempo de conexión medio: {stats['tiempo_conexion_medio_ms']} ms "
+          f"| ahorro estimado: {stats['tiempo_ahorrado_estimado_s']} s "
+          f"| DNS en caché: {stats['dns_aciertos']}/{stats['dns_aciertos'] + stats['dns_fallos']}")
+
+def guardar_cambios(dominio, anadidas, eliminadas, directorio=None):
+    """
+    Guarda las URLs añadidas y eliminadas respecto a la ejecución anterior (modo incremental)
+    en cambios_<dominio>.txt, dentro de `directorio` si se indica. Devuelve la ruta del archivo.
+    """
+    archivo_cambios = f"cambios_{dominio}.txt"
+    if directorio:
+        archivo_cambios = os.path.join(directorio, archivo_cambios)
+    with open(archivo_cambios, "w", encoding="utf-8") as f:
+        f.write(f"=== CAMBIOS EN {dominio} ===\n")
+        f.write(f"URLs añadidas: {len(anadidas)}\n")
+        f.write(f"URLs eliminadas: {len(eliminadas)}\n\n")
+        if anadidas:
+            f.write("=== AÑADIDAS ===\n")
+            for url in sorted(anadidas):
+                f.write(f"+ {url}\n")
+            f.write("\n")
+        if eliminadas:
+            f.write("=== ELIMINADAS ===\n")
+            for url in sorted(eliminadas):
+                f.write(f"- {url}\n")
+    return archivo_cambios
+
+def guardar_resultados(url_base, urls_encontradas, directorio=None):
+    """
+    Guarda las URLs encontradas (cualquier iterable, por ejemplo un archivo incremental
+    leído con rastreador.salida.leer_urls) en urls_<dominio>.txt, dentro de `directorio`
+    si se indica. En los sitios de Perú solo se guardan las administrativas, agrupadas por
+    categoría. Las URLs se ordenan por bloques en disco. Devuelve la ruta del archivo.
+    """
+    dominio = urlparse(url_base).netloc.replace('www.', '')
+    archivo_salida = f"urls_{dominio}.txt"
+    if directorio:
+        archivo_salida = os.path.join(directorio, archivo_salida)
+    
+    administrativas = es_sitio_peru(url_base)
+    conteo = guardar_agrupado(urls_encontradas, archivo_salida, dominio, administrativas=administrativas)
     
-    print(f"\nExploración completada. URLs encontradas: {len(urls_encontradas)}")
-    return urls_encontradas
+    # Filtrar URLs administrativas si el sitio es de Perú
+    if administrativas:
+        print("\n=== FILTRANDO URLs ADMINISTRATIVAS ===")
+        print(f"URLs administrativas encontradas: {sum(conteo.values()) - conteo[GRUPO_NO_ADMINISTRATIVA]}")
+    return archivo_salida
+
+def rutas_incrementales(url_base, formatos=(), comprimir=False):
+    """
+    Archivos que se escriben durante el rastreo: la lista provisional de URLs encontradas
+    (urls_<dominio>.txt.parcial) y, por cada formato pedido, paginas_<dominio>.<formato>[.gz]
+    """
+    dominio = urlparse(url_base).netloc.replace('www.', '')
+    extension = '.gz' if comprimir else ''
+    return [f"urls_{dominio}.txt.parcial"] + [f"paginas_{dominio}.{formato}{extension}" for formato in formatos]
+
+def ruta_perfil(url_base):
+    """
+    Directorio predeterminado de los artefactos de --perfil para un sitio
+    """
+    return f"perfil_{urlparse(url_base).netloc.replace('www.', '')}"
+
+def ruta_checkpoint(url_base):
+    """
+    Archivo de checkpoint predeterminado para un sitio
+    """
+    return f"checkpoint_{urlparse(url_base).netloc.replace('www.', '')}.log"
+
+def crear_alcance(args, guardado=None):
+    """
+    Alcance del rastreo a partir de --incluir, --excluir, --reglas, --max-consulta y --subdominios;
+    sin ninguna de ellas se usa la configuración `guardado` (la del checkpoint que se reanuda)
+    """
+    reglas = [leer_regla(regla, incluir=True) for regla in args.incluir] + \
+        [leer_regla(regla, incluir=False) for regla in args.excluir]
+    if args.reglas:
+        with open(args.reglas, encoding='utf-8') as f:
+            reglas += leer_reglas(f.read())
+    if not reglas and args.max_consulta is None and not args.subdominios and guardado:
+        return Alcance.desde_configuracion(guardado)
+    return Alcance(reglas, max_consulta=args.max_consulta, subdominios=args.subdominios)
+
+def analizar_argumentos(argv=None):
+    """
+    Opciones de línea de comandos. Sin URL el programa pregunta los datos de forma interactiva.
+    """
+    parser = argparse.ArgumentParser(description="Extractor de subdirecciones web")
+    parser.add_argument('url', nargs='?', help="URL del sitio web a analizar (ej: ejemplo.com)")
+    parser.add_argument('-p', '--profundidad', type=int, default=None,
+                        help="Profundidad de búsqueda (1-5, predeterminado 2)")
+    parser.add_argument('-c', '--concurrencia', type=int, default=CONCURRENCIA_GLOBAL,
+                        help=f"Páginas descargadas en paralelo (predeterminado {CONCURRENCIA_GLOBAL})")
+    parser.add_argument('--cache', metavar='RUTA', default=None,
+                        help="Archivo SQLite de caché HTTP persistente entre ejecuciones")
+    parser.add_argument('--cache-max-mb', type=int, default=TAMANO_MAXIMO // (1024 * 1024),
+                        help="Tamaño máximo de la caché HTTP en MB")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Solo vuelve a descargar las páginas cambiadas y genera las URLs añadidas/eliminadas")
+    parser.add_argument('--estado', metavar='RUTA', default=ARCHIVO_ESTADO,
+                        help=f"Archivo SQLite con el estado del modo incremental (predeterminado {ARCHIVO_ESTADO})")
+    parser.add_argument('--edad-maxima', type=float, default=24, metavar='HORAS',
+                        help="En modo incremental, no se vuelven a pedir las páginas visitadas hace menos de HORAS")
+    parser.add_argument('--checkpoint', metavar='RUTA', default=None,
+                        help="Registro de progreso para reanudar el rastreo (predeterminado checkpoint_<dominio>.log)")
+    parser.add_argument('--reanudar', action='store_true',
+                        help="Reanuda el rastreo desde el checkpoint; sin URL se usan la URL y profundidad guardadas")
+    parser.add_argument('--sin-checkpoint', action='store_true',
+                        help="No guarda el progreso del rastreo")
+    parser.add_argument('--sitemap', choices=MODOS_SITEMAP, default=None,
+                        help="Usa los sitemaps del sitio: 'semilla' los añade al rastreo, "
+                             "'solo' devuelve sus URLs sin rastrear")
+    parser.add_argument('--pausa', type=float, default=None, metavar='SEGUNDOS',
+                        help="Pausa fija tras cada página en lugar del ritmo adaptativo por host")
+    parser.add_argument('--ignorar-robots', action='store_true',
+                        help="Rastrea también las URLs que robots.txt no permite")
+    parser.add_argument('--formato', choices=FORMATOS, action='append', default=[],
+                        help="Guarda además cada página visitada, según se rastrea, en paginas_<dominio>.<formato> "
+                             "(se puede repetir)")
+    parser.add_argument('--gzip', action='store_true',
+                        help="Comprime con gzip los archivos de --formato")
+    parser.add_argument('--memoria-vistas', type=int, default=MEMORIA_VISTAS // (1024 * 1024), metavar='MB',
+                        help="Memoria para recordar las URLs vistas; por encima se usa el disco "
+                             f"(predeterminado {MEMORIA_VISTAS // (1024 * 1024)})")
+    parser.add_argument('--conservar-consulta', action='store_true',
+                        help="Conserva la consulta (?...) de las URLs sin los parámetros de seguimiento y sesión; "
+                             "por defecto se descarta, como en las versiones anteriores")
+    parser.add_argument('--parametros-permitidos', nargs='+', metavar='NOMBRE', default=None,
+                        help="Conserva solo estos parámetros de consulta (implica --conservar-consulta)")
+    parser.add_argument('--parametros-denegados', nargs='+', metavar='NOMBRE', default=[],
+                        help="Parámetros de consulta que se eliminan además de los de seguimiento y sesión "
+                             "(admite comodines, como 'orden*')")
+    parser.add_argument('--alias-host', nargs='+', metavar='HOST', default=[],
+                        help="Otros hosts que sirven el mismo sitio; sus enlaces se pliegan al host base")
+    parser.add_argument('--incluir', action='append', default=[], metavar='REGLA',
+                        help="Solo se rastrean las URLs que cumplen alguna regla de inclusión: glob:PATRÓN, "
+                             "regex:EXPR, ruta:PREFIJO, ext:pdf,doc, tipo:CLASE (imagen, documento... o un tipo "
+                             "MIME) o dominio:HOST (añade ese host y sus subdominios); se puede repetir")
+    parser.add_argument('--excluir', action='append', default=[], metavar='REGLA',
+                        help="No se rastrean las URLs que cumplen la regla (mismos tipos que --incluir); "
+                             "se puede repetir")
+    parser.add_argument('--reglas', metavar='ARCHIVO', default=None,
+                        help="Archivo de reglas de alcance, una por línea: +tipo:valor incluye, -tipo:valor excluye")
+    parser.add_argument('--max-consulta', type=int, default=None, metavar='CARACTERES',
+                        help="No rastrea las URLs con una consulta (?...) más larga")
+    parser.add_argument('--subdominios', action='store_true',
+                        help="Rastrea también los subdominios del sitio")
+    parser.add_argument('--nivel-log', choices=NIVELES, default='INFO', type=str.upper,
+                        help="Nivel mínimo de los mensajes del rastreo; WARNING oculta la línea de cada página "
+                             "(predeterminado INFO)")
+    parser.add_argument('--formato-log', choices=FORMATOS_REGISTRO, default='texto',
+                        help="'json' escribe cada mensaje del rastreo como un objeto JSON por línea")
+    parser.add_argument('--perfil', choices=MODOS_PERFIL, default=None,
+                        help="Perfila el rastreo: 'cprofile' (determinista) o 'muestreo' (menos coste), más las "
+                             "asignaciones de memoria (tracemalloc); los informes van a perfil_<dominio>/")
+    return parser.parse_args(argv)
 
-def main():
+def main(args=None):
+    args = args or analizar_argumentos([])
+    configurar_registro(args.nivel_log, args.formato_log)
+    
     # Configuración
     print("=== EXTRACTOR DE SUBDIRECCIONES WEB ===\n")
     
-    # Solicitar URL al usuario
-    url_objetivo = input("Ingrese la URL del sitio web a analizar (ej: ejemplo.com o https://www.ejemplo.com): ")
+    # Reanudar sin URL: la URL base y la profundidad salen de la cabecera del checkpoint
+    previo = None
+    if args.reanudar and not args.url and args.checkpoint:
+        previo = leer_checkpoint(args.checkpoint)
+        if previo is None:
+            print(f"No existe el checkpoint {args.checkpoint}")
+            return
+    
+    url_objetivo = args.url or (previo.metadatos.get('url_base') if previo else None)
     if not url_objetivo:
-        url_objetivo = "enperu.org"  # Valor por defecto
+        # Solicitar URL al usuario
+        url_objetivo = input("Ingrese la URL del sitio web a analizar (ej: ejemplo.com o https://www.ejemplo.com): ")
+        if not url_objetivo:
+            url_objetivo = "enperu.org"  # Valor por defecto
     
-    profundidad = input("Profundidad de búsqueda (1-5, predeterminado 2): ")
-    try:
-        profundidad = min(max(int(profundidad), 1), 5) if profundidad.strip() else 2
-    except ValueError:
-        profundidad = 2
+    profundidad = args.profundidad
+    if profundidad is None and previo is not None:
+        profundidad = previo.metadatos.get('profundidad')
+    if profundidad is None and not args.url:
+        profundidad = input("Profundidad de búsqueda (1-5, predeterminado 2): ")
+        try:
+            profundidad = int(profundidad) if profundidad.strip() else 2
+        except ValueError:
+            profundidad = 2
+    profundidad = min(max(profundidad or 2, 1), 5)
+    formatos = args.formato or (previo.metadatos.get('formatos', []) if previo is not None else [])
+    comprimir = args.gzip or (previo is not None and previo.metadatos.get('comprimir', False))
+    
+    cache = CacheHTTP(args.cache, tamano_maximo=args.cache_max_mb * 1024 * 1024) if args.cache else None
     
     print("\n=== INICIANDO BÚSQUEDA ===")
     
-    # Obtener URL base accesible
-    urls_directas = obtener_urls_directas(url_objetivo)
+    if previo is not None:
+        url_base = url_objetivo
+    else:
+        # Obtener URL base accesible
+        urls_directas = obtener_urls_directas(url_objetivo)
+        
+        if not urls_directas:
+            print("\nNo se pudo acceder a la URL proporcionada. Verifique la URL e intente nuevamente.")
+            return
+        
+        url_base = next(iter(urls_directas))  # Tomar la primera URL accesible
+    print(f"\nURL base accesible: {url_base}")
     
-    if not urls_directas:
-        print("\nNo se pudo acceder a la URL proporcionada. Verifique la URL e intente nuevamente.")
+    # Reglas de alcance: las de la línea de comandos o, al reanudar sin ellas, las del checkpoint
+    try:
+        alcance = crear_alcance(args, previo.metadatos.get('alcance') if previo is not None else None)
+    except (OSError, ValueError) as e:
+        print(f"\nReglas de alcance no válidas: {e}")
         return
+    if alcance.reglas:
+        print(f"Reglas de alcance: {' '.join(alcance.configuracion()['reglas'])}")
     
-    url_base = next(iter(urls_directas))  # Tomar la primera URL accesible
-    print(f"\nURL base accesible: {url_base}")
+    checkpoint = None
+    if not args.sin_checkpoint:
+        archivo_checkpoint = args.checkpoint or ruta_checkpoint(url_base)
+        reanudar = args.reanudar
+        existente = previo or leer_checkpoint(archivo_checkpoint)
+        if existente is not None and not existente.terminado and not reanudar and not args.url:
+            respuesta = input(f"Hay un rastreo sin terminar en {archivo_checkpoint} "
+                              f"({len(existente.visitadas)} páginas visitadas). ¿Reanudarlo? (s/n): ")
+            reanudar = respuesta.strip().lower().startswith('s')
+        checkpoint = Checkpoint(archivo_checkpoint,
+                                metadatos={'url_base': url_base, 'profundidad': profundidad,
+                                           'formatos': formatos, 'comprimir': comprimir,
+                                           'alcance': alcance.configuracion()},
+                                reanudar=reanudar)
     
     print("\n=== EXPLORANDO SITIO WEB ===")
     print(f"Esto puede tomar varios minutos. Profundidad de búsqueda: {profundidad}")
     
+    estado = None
+    if args.incremental:
+        estado = EstadoRastreo(args.estado, urlparse(url_base).netloc)
+        print(f"Modo incremental: {len(estado)} páginas conocidas en {args.estado}")
+    
+    # Las páginas se escriben en disco a medida que se visitan; al reanudar se añaden al final
+    reanudando = checkpoint is not None and checkpoint.previo is not None
+    rutas = rutas_incrementales(url_base, formatos, comprimir)
+    perfilador = Perfilador(ruta_perfil(url_base), args.perfil) if args.perfil else None
+    salida = SalidaIncremental(rutas, clasificar=es_sitio_peru(url_base), anadir=reanudando,
+                               observador=perfilador.observador if perfilador is not None else None)
+    
+    alcance.fijar_base(urlparse(url_base).netloc)
+    canonico = Canonizador(url_base, alias_host=args.alias_host,
+                           conservar_consulta=args.conservar_consulta or args.parametros_permitidos is not None,
+                           parametros_permitidos=args.parametros_permitidos,
+                           parametros_denegados=PARAMETROS_DENEGADOS + tuple(args.parametros_denegados),
+                           memoria_vistas=args.memoria_vistas * 1024 * 1024, admitir_host=alcance.admite_host)
+    
     # Explorar el sitio web
+    if perfilador is not None:
+        perfilador.iniciar()
     try:
-        urls_encontradas = explorar_sitio(url_base, profundidad_maxima=profundidad)
+        urls_encontradas = explorar_sitio(url_base, profundidad_maxima=profundidad,
+                                          concurrencia=args.concurrencia, pausa=args.pausa,
+                                          cache=cache, estado=estado,
+                                          edad_maxima=args.edad_maxima * 3600 if estado else None,
+                                          checkpoint=checkpoint, observador=salida, sitemap=args.sitemap,
+                                          respetar_robots=not args.ignorar_robots,
+                                          memoria_vistas=args.memoria_vistas * 1024 * 1024, canonico=canonico,
+                                          alcance=alcance)
+        salida.cerrar()
         print(f"\nTotal de URLs encontradas: {len(urls_encontradas)}")
+        stats = canonico.estadisticas()
+        print(f"Canonicalización de URLs: {stats['peticiones_evitadas']} peticiones evitadas "
+              f"({stats['variantes_plegadas']} variantes de URL repetidas, "
+              f"{stats['redirecciones_evitadas']} destinos de redirección)")
+        if alcance.descartadas:
+            print(f"Enlaces fuera del alcance descartados sin petición: {alcance.descartadas}")
+        imprimir_estadisticas_http()
+        if cache is not None:
+            stats = cache.estadisticas()
+            print(f"Caché HTTP: {stats['aciertos']} frescas, {stats['revalidadas_304']} sin cambios (304), "
+                  f"{stats['guardadas']} guardadas | {stats['entradas']} entradas, {stats['tamano_mb']} MB")
         
-        # Filtrar URLs administrativas si el sitio es de Perú
-        if 'enperu.org' in url_base or 'peru' in url_base.lower():
-            print("\n=== FILTRANDO URLs ADMINISTRATIVAS ===")
-            urls_administrativas = filtrar_urls_administrativas(urls_encontradas)
-            print(f"URLs administrativas encontradas: {len(urls_administrativas)}")
-            
-            # Categorizar las URLs administrativas
-            departamentos = set()
-            provincias = set()
-            distritos = set()
-            otras = set()
-            
-            for url in urls_administrativas:
-                url_lower = url.lower()
-                if re.search(r'/(amazonas|ancash|apurimac|arequipa|ayacucho|cajamarca|cusco|callao|huancavelica|huanuco|ica|junin|la-libertad|lambayeque|lima|loreto|madre-de-dios|moquegua|pasco|piura|puno|san-martin|tacna|tumbes|ucayali)/?$', url_lower):
-                    departamentos.add(url)
-                elif re.search(r'/informacion-[a-z]+/distrito', url_lower):
-                    distritos.add(url)
-                elif re.search(r'/provincia', url_lower):
-                    provincias.add(url)
-                else:
-                    otras.add(url)
-            
-            # Guardar resultados
-            dominio = urlparse(url_base).netloc.replace('www.', '')
-            archivo_salida = f"urls_{dominio}.txt"
-            
-            with open(archivo_salida, "w", encoding="utf-8") as f:
-                f.write(f"=== RESULTADOS PARA {dominio} ===\n")
-                f.write(f"Total de URLs encontradas: {len(urls_encontradas)}\n")
-                f.write(f"URLs administrativas: {len(urls_administrativas)}\n\n")
-                
-                if departamentos:
-                    f.write("=== DEPARTAMENTOS ===\n")
-                    for url in sorted(departamentos):
-                        f.write(f"{url}\n")
-                    f.write("\n")
-                
-                if provincias:
-                    f.write("=== PROVINCIAS ===\n")
-                    for url in sorted(provincias):
-                        f.write(f"{url}\n")
-                    f.write("\n")
-                
-                if distritos:
-                    f.write("=== DISTRITOS ===\n")
-                    for url in sorted(distritos):
-                        f.write(f"{url}\n")
-                    f.write("\n")
-                
-                if otras:
-                    f.write("=== OTRAS URLs ADMINISTRATIVAS ===\n")
-                    for url in sorted(otras):
-                        f.write(f"{url}\n")
-        else:
-            # Para sitios que no son de Perú, guardar todas las URLs encontradas
-            dominio = urlparse(url_base).netloc.replace('www.', '')
-            archivo_salida = f"urls_{dominio}.txt"
-            
-            with open(archivo_salida, "w", encoding="utf-8") as f:
-                f.write(f"=== TODAS LAS URLs ENCONTRADAS EN {dominio} ===\n\n")
-                for url in sorted(urls_encontradas):
-                    f.write(f"{url}\n")
+        # El archivo final se ordena a partir de la lista provisional, no de la memoria
+        encontradas = leer_urls(rutas[0])
+        if reanudando:
+            encontradas = itertools.chain(encontradas, checkpoint.previo.resultados)
+        archivo_salida = guardar_resultados(url_base, encontradas)
+        os.remove(rutas[0])
+        dominio = urlparse(url_base).netloc.replace('www.', '')
         
         print(f"\n=== RESULTADOS GUARDADOS ===")
         print(f"Los resultados se han guardado en: {archivo_salida}")
+        for ruta in rutas[1:]:
+            print(f"Páginas visitadas: {ruta}")
+        
+        if estado is not None:
+            anadidas, eliminadas = estado.finalizar(urls_encontradas)
+            estado.cerrar()
+            archivo_cambios = guardar_cambios(dominio, anadidas, eliminadas)
+            c = estado.contadores
+            print(f"Páginas conocidas: {c['sin_peticion']} sin petición, {c['no_modificadas']} sin cambios (304), "
+                  f"{c['mismo_contenido']} con el mismo contenido, {c['cambiadas']} cambiadas")
+            print(f"Cambios respecto a la ejecución anterior: +{len(anadidas)} / -{len(eliminadas)} "
+                  f"(guardados en {archivo_cambios})")
+        
+        # El rastreo terminó y los resultados ya están guardados: el checkpoint sobra
+        if checkpoint is not None:
+            checkpoint.eliminar()
         
     except KeyboardInterrupt:
+        salida.cerrar()
         print("\n\nBúsqueda interrumpida por el usuario.")
+        print(f"URLs encontradas hasta ahora: {rutas[0]}")
+        if checkpoint is not None:
+            print(f"Progreso guardado en {checkpoint.ruta}. Use --reanudar para continuar.")
     except Exception as e:
+        salida.cerrar()
         print(f"\nError durante la exploración: {e}")
+    finally:
+        if perfilador is not None:
+            artefactos = perfilador.detener()
+            print(f"Perfil ({perfilador.modo}) guardado en {perfilador.directorio}/: {', '.join(sorted(artefactos))}")
 
 if __name__ == "__main__":
+    argumentos = analizar_argumentos()
     try:
-        main()
+        main(argumentos)
     except KeyboardInterrupt:
         print("\nPrograma interrumpido por el usuario.")
     except Exception as e:
         print(f"\nError inesperado: {e}")
     
-    input("\nPresione Enter para salir...")
\ No newline at end of file
+    # Solo en modo interactivo se espera a que el usuario cierre la ventana
+    if not argumentos.url:
+        input("\nPresione Enter para salir...")
\ No newline at end of file
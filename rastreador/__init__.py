@@ -0,0 +1,3 @@
+"""
+Núcleo de rastreo compartido por la CLI (main.py), la API web (app.py) y la GUI (gui.py)
+"""
@@ -0,0 +1,165 @@
+"""
+Resolución de la URL base accesible de un sitio.
+
+Las variantes de la URL pedida (https/http × con y sin www.) se prueban con
+peticiones HEAD en paralelo, al estilo "happy eyeballs" (RFC 8305): cada
+variante empieza `ESPERA_VARIANTE` segundos después de la anterior, en orden de
+preferencia (la URL tal como se pidió, su variante www., y después las mismas
+por http), o en cuanto falla la última lanzada. Gana la primera que responde 200
+tras seguir las redirecciones; las que aún no habían empezado se cancelan. Cada
+variante usa su propia sesión (SesionAislada del cliente), que se cierra al
+resolverse: las que siguen en curso se cortan en vez de seguir ocupando un hilo y
+una conexión hasta su timeout. Si la URL pedida es http:// explícita no se prueba
+https.
+
+Las URLs base resueltas se guardan por dominio durante `TTL_URL_BASE` segundos;
+los fallos no se guardan.
+"""
+import logging
+import queue
+import threading
+import time
+
+from .cliente import obtener_cliente
+
+logger = logging.getLogger(__name__)
+
+TTL_URL_BASE = 3600
+# Segundos entre el inicio de una variante y el de la siguiente
+ESPERA_VARIANTE = 0.25
+TIMEOUT_VARIANTE = 10
+
+
+def variantes_url(url_objetivo):
+    """
+    Variantes de la URL en orden de preferencia
+    """
+    explicita_http = url_objetivo.startswith('http://')
+    if not url_objetivo.startswith(('http://', 'https://')):
+        url_objetivo = 'https://' + url_objetivo
+    variantes = [url_objetivo]
+    if 'www.' not in url_objetivo:
+        variantes.append(url_objetivo.replace('://', '://www.', 1))
+    if not explicita_http:
+        variantes += [url.replace('https://', 'http://', 1) for url in variantes]
+    return variantes
+
+
+def clave_dominio(url_objetivo):
+    """
+    Clave de la caché: la URL pedida sin barra final, en minúsculas y con el esquema solo si es http://
+    """
+    clave = url_objetivo.strip().rstrip('/').lower()
+    if clave.startswith('https://'):
+        clave = clave[len('https://'):]
+    return clave
+
+
+class CacheUrlsBase:
+    """
+    Caché con caducidad (segundos) de la URL base resuelta para cada dominio
+    """
+
+    def __init__(self, ttl=TTL_URL_BASE):
+        self.ttl = ttl
+        self.aciertos = 0
+        self.fallos = 0
+        self._entradas = {}
+        self._lock = threading.Lock()
+
+    def obtener(self, clave):
+        ahora = time.monotonic()
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada and entrada[1] > ahora:
+                self.aciertos += 1
+                return entrada[0]
+            self._entradas.pop(clave, None)
+            self.fallos += 1
+            return None
+
+    def guardar(self, clave, url_base):
+        with self._lock:
+            self._entradas[clave] = (url_base, time.monotonic() + self.ttl)
+
+    def invalidar(self, clave=None):
+        with self._lock:
+            if clave is None:
+                self._entradas.clear()
+            else:
+                self._entradas.pop(clave, None)
+
+    def estadisticas(self):
+        with self._lock:
+            return {'entradas': len(self._entradas), 'aciertos': self.aciertos, 'fallos': self.fallos,
+                    'ttl': self.ttl}
+
+
+cache_urls_base = CacheUrlsBase()
+
+
+def _probar(sesion, url, timeout, resultados, resuelto):
+    try:
+        response = sesion.head(url, timeout=timeout, allow_redirects=True)
+    except Exception as e:
+        resultados.put((url, None, e))
+        return
+    response.close()
+    if resuelto.is_set():
+        return
+    if response.status_code == 200:
+        resultados.put((url, response.url.rstrip('/') + '/', None))  # Normalizar URL
+    else:
+        resultados.put((url, None, f"HTTP {response.status_code}"))
+
+
+def resolver_url_base(url_objetivo, timeout=TIMEOUT_VARIANTE, espera=ESPERA_VARIANTE, cache=cache_urls_base):
+    """
+    URL base accesible (terminada en '/') de `url_objetivo`, o None si ninguna variante responde 200
+    """
+    clave = clave_dominio(url_objetivo)
+    if cache is not None:
+        url_base = cache.obtener(clave)
+        if url_base is not None:
+            logger.info("URL base en caché para %s: %s", url_objetivo, url_base)
+            return url_base
+
+    cliente = obtener_cliente()
+    pendientes = variantes_url(url_objetivo)
+    resultados = queue.Queue()
+    resuelto = threading.Event()
+    sesiones = []
+    en_curso = 0
+    siguiente = time.monotonic()
+    try:
+        while pendientes or en_curso:
+            ahora = time.monotonic()
+            if pendientes and (ahora >= siguiente or not en_curso):
+                url = pendientes.pop(0)
+                logger.info("Probando: %s", url)
+                sesiones.append(cliente.sesion_aislada())
+                # Hilos daemon: una variante lenta que pierde la carrera no retrasa la salida del proceso
+                threading.Thread(target=_probar, args=(sesiones[-1], url, timeout, resultados, resuelto),
+                                 name='variante-url', daemon=True).start()
+                en_curso += 1
+                siguiente = ahora + espera
+                continue
+            try:
+                url, url_base, error = resultados.get(timeout=max(0.0, siguiente - ahora) if pendientes else None)
+            except queue.Empty:
+                continue
+            en_curso -= 1
+            if url_base is not None:
+                logger.info("Acceso exitoso a: %s", url_base)
+                if cache is not None:
+                    cache.guardar(clave, url_base)
+                return url_base
+            logger.warning("Error al acceder a %s: %s", url, error, extra={'url': url})
+            # Un fallo lanza la siguiente variante sin esperar
+            siguiente = time.monotonic()
+        return None
+    finally:
+        resuelto.set()
+        # Corta las variantes que siguen en curso y libera sus conexiones
+        for sesion in sesiones:
+            sesion.cerrar()
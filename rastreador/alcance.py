@@ -0,0 +1,224 @@
+"""
+Reglas de alcance del rastreo: qué URLs enlazadas llegan a la frontera.
+
+Cada regla tiene la forma `[+|-]tipo:valor`; '-' excluye y '+' (o sin signo)
+incluye. Tipos:
+
+- glob:PATRÓN    comodines de fnmatch sobre la URL completa si el patrón contiene
+                 '://' y, si no, sobre la ruta con su consulta (glob:/noticias/*).
+- regex:EXPR     expresión regular buscada en la URL completa.
+- ruta:PREFIJO   la ruta empieza por PREFIJO (ruta:/distritos).
+- ext:LISTA      extensión del último segmento de la ruta (ext:pdf,docx).
+- tipo:CLASE     clase de contenido por extensión: una de CLASES_TIPO (imagen,
+                 documento...) o un tipo MIME, con comodines (image/*, application/pdf).
+- dominio:HOST   HOST y sus subdominios.
+
+Las reglas de dominio deciden qué hosts se rastrean: el host base (con sus alias,
+ver rastreador.canonico) siempre, más los de +dominio, menos los de -dominio. Las
+demás reglas de inclusión filtran: si hay alguna, la URL tiene que cumplir al
+menos una. Cualquier regla de exclusión que se cumpla descarta la URL; por
+defecto se excluyen los archivos (EXTENSIONES_ARCHIVO). `max_consulta` descarta
+las URLs con una consulta más larga. La URL base siempre se rastrea.
+
+Las reglas se compilan una vez: las de cada sentido se unen en una sola
+expresión regular, de modo que comprobar un enlace cuesta una o dos búsquedas.
+Las reglas regex se prueban por separado (al unirlas cambiaría la numeración de
+sus grupos y sus indicadores globales no serían válidos).
+"""
+import mimetypes
+import re
+import threading
+from collections import namedtuple
+from fnmatch import fnmatchcase, translate
+
+from .constantes import EXTENSIONES_ARCHIVO
+
+# Extensiones de cada clase de contenido de las reglas tipo:
+CLASES_TIPO = {
+    'documento': ('pdf', 'doc', 'docx', 'xls', 'xlsx', 'ppt', 'pptx', 'odt', 'ods', 'odp', 'rtf', 'csv'),
+    'imagen': ('jpg', 'jpeg', 'png', 'gif', 'bmp', 'webp', 'svg', 'ico', 'tif', 'tiff'),
+    'audio': ('mp3', 'wav', 'ogg', 'oga', 'm4a', 'flac', 'aac'),
+    'video': ('mp4', 'm4v', 'avi', 'mov', 'wmv', 'mkv', 'webm', 'flv', 'mpeg', 'mpg'),
+    'comprimido': ('zip', 'rar', '7z', 'gz', 'tgz', 'tar', 'bz2', 'xz'),
+    'recurso': ('css', 'js', 'json', 'woff', 'woff2', 'ttf', 'otf', 'eot', 'map'),
+}
+# Nombres en inglés de los tipos de regla y de las clases (los usa la API web)
+ALIAS_TIPOS = {'path': 'ruta', 'type': 'tipo', 'domain': 'dominio'}
+ALIAS_CLASES = {'document': 'documento', 'image': 'imagen', 'archive': 'comprimido', 'asset': 'recurso'}
+TIPOS_REGLA = ('glob', 'regex', 'ruta', 'ext', 'tipo', 'dominio')
+
+EXCLUSIONES_PREDETERMINADAS = ('-ext:' + ','.join(extension.lstrip('.') for extension in EXTENSIONES_ARCHIVO),)
+
+# Esquema y host de una URL canónica, delante de los patrones que se aplican a la ruta
+_PREFIJO_RUTA = r'^[a-z][a-z0-9+.-]*://[^/?#]*'
+
+Regla = namedtuple('Regla', 'incluir tipo valor')
+
+
+def leer_regla(texto, incluir=None):
+    """
+    Regla a partir de su texto ('-ext:pdf', '+ruta:/noticias', 'glob:*/tag/*'); `incluir`
+    fija el sentido cuando el texto no lleva signo. ValueError si no es válida.
+    """
+    texto = texto.strip()
+    signo = texto[:1]
+    if signo and signo in '+-':
+        texto = texto[1:].strip()
+        incluir = signo == '+'
+    tipo, separador, valor = texto.partition(':')
+    tipo = ALIAS_TIPOS.get(tipo.strip().lower(), tipo.strip().lower())
+    valor = valor.strip()
+    if not separador or tipo not in TIPOS_REGLA or not valor:
+        raise ValueError(f"Regla de alcance no válida: {texto!r} (use [+|-]tipo:valor con tipo "
+                         f"{', '.join(TIPOS_REGLA)})")
+    regla = Regla(True if incluir is None else incluir, tipo, valor)
+    # Se compila ya para que los errores salgan al leer la regla y no al rastrear
+    if tipo == 'regex':
+        try:
+            re.compile(valor)
+        except re.error as e:
+            raise ValueError(f"Expresión regular no válida en {texto!r}: {e}") from None
+    elif tipo == 'tipo':
+        _extensiones(regla)
+    return regla
+
+
+def leer_reglas(texto):
+    """
+    Reglas de un texto con una por línea; se ignoran las líneas vacías y los comentarios (#)
+    """
+    return [leer_regla(linea) for linea in texto.splitlines() if linea.strip() and not linea.lstrip().startswith('#')]
+
+
+def texto_regla(regla):
+    return f"{'+' if regla.incluir else '-'}{regla.tipo}:{regla.valor}"
+
+
+def _extensiones(regla):
+    if regla.tipo == 'ext':
+        return [extension.strip().lstrip('.').lower() for extension in regla.valor.split(',') if extension.strip()]
+    clase = regla.valor.lower()
+    clase = ALIAS_CLASES.get(clase, clase)
+    if clase in CLASES_TIPO:
+        return list(CLASES_TIPO[clase])
+    if '/' in clase:
+        extensiones = sorted({extension.lstrip('.') for extension, tipo in mimetypes.types_map.items()
+                              if fnmatchcase(tipo, clase)})
+        if extensiones:
+            return extensiones
+    raise ValueError(f"Clase de contenido desconocida: {regla.valor!r} (use {', '.join(CLASES_TIPO)} "
+                     f"o un tipo MIME como image/*)")
+
+
+def _patron(regla):
+    """
+    Expresión regular de una regla glob, ruta, ext o tipo, sobre la URL canónica completa
+    """
+    if regla.tipo == 'ruta':
+        return _PREFIJO_RUTA + re.escape(regla.valor)
+    if regla.tipo == 'glob':
+        return ('^' if '://' in regla.valor else _PREFIJO_RUTA) + translate(regla.valor)
+    extensiones = '|'.join(re.escape(extension) for extension in _extensiones(regla))
+    return _PREFIJO_RUTA + r'[^?#]*\.(?i:' + extensiones + r')(?:[?#]|$)'
+
+
+def _compilar(reglas):
+    """
+    Expresiones compiladas que equivalen a buscar cualquiera de las reglas: una para todas
+    las generadas y una por cada regex
+    """
+    generadas = [_patron(regla) for regla in reglas if regla.tipo != 'regex']
+    expresiones = [re.compile('|'.join(f'(?:{patron})' for patron in generadas))] if generadas else []
+    return tuple(expresiones + [re.compile(regla.valor) for regla in reglas if regla.tipo == 'regex'])
+
+
+class _Dominios:
+    """
+    Conjunto de dominios que también contiene sus subdominios
+    """
+
+    def __init__(self, dominios):
+        self.dominios = frozenset(dominio.lower().lstrip('.') for dominio in dominios)
+        self._sufijos = tuple('.' + dominio for dominio in self.dominios)
+
+    def __contains__(self, host):
+        host = host.split(':', 1)[0]
+        return host in self.dominios or host.endswith(self._sufijos)
+
+    def __bool__(self):
+        return bool(self.dominios)
+
+
+class Alcance:
+    """
+    Reglas de alcance compiladas de un rastreo (ver el docstring del módulo)
+    """
+
+    def __init__(self, reglas=(), max_consulta=None, subdominios=False, exclusiones_predeterminadas=True):
+        reglas = [leer_regla(regla) if isinstance(regla, str) else regla for regla in reglas]
+        self.reglas = reglas
+        self.max_consulta = max_consulta
+        self.subdominios = subdominios
+        self.exclusiones_predeterminadas = exclusiones_predeterminadas
+        if exclusiones_predeterminadas:
+            reglas = [leer_regla(regla) for regla in EXCLUSIONES_PREDETERMINADAS] + reglas
+        self._dominios_incluidos = _Dominios(r.valor for r in reglas if r.tipo == 'dominio' and r.incluir)
+        self._dominios_excluidos = _Dominios(r.valor for r in reglas if r.tipo == 'dominio' and not r.incluir)
+        self._incluir = _compilar([r for r in reglas if r.tipo != 'dominio' and r.incluir])
+        self._excluir = _compilar([r for r in reglas if r.tipo != 'dominio' and not r.incluir])
+        self._base = _Dominios(())
+        self.descartadas = 0
+        self._lock = threading.Lock()
+
+    def fijar_base(self, host):
+        """
+        Host base del rastreo; con `subdominios` se admiten también sus subdominios
+        """
+        host = host.split(':', 1)[0].lower()
+        self._base = _Dominios((host[4:] if host.startswith('www.') else host,))
+        return self
+
+    def admite_host(self, host):
+        """
+        Si se rastrea un host distinto del base y sus alias (subdominios, +dominio)
+        """
+        if host in self._dominios_excluidos:
+            return False
+        if self.subdominios and host in self._base:
+            return True
+        return host in self._dominios_incluidos
+
+    def admite(self, url):
+        """
+        Si la URL canónica `url` entra en el rastreo; las descartadas se cuentan
+        """
+        if self._admite(url):
+            return True
+        with self._lock:
+            self.descartadas += 1
+        return False
+
+    def _admite(self, url):
+        if self.max_consulta is not None:
+            inicio = url.find('?')
+            if inicio >= 0 and len(url) - inicio - 1 > self.max_consulta:
+                return False
+        for expresion in self._excluir:
+            if expresion.search(url):
+                return False
+        if not self._incluir:
+            return True
+        return any(expresion.search(url) for expresion in self._incluir)
+
+    def configuracion(self):
+        """
+        Parámetros serializables en JSON con los que se puede volver a crear el alcance
+        """
+        return {'reglas': [texto_regla(regla) for regla in self.reglas], 'max_consulta': self.max_consulta,
+                'subdominios': self.subdominios}
+
+    @classmethod
+    def desde_configuracion(cls, configuracion):
+        configuracion = configuracion or {}
+        return cls(configuracion.get('reglas', ()), configuracion.get('max_consulta'),
+                   configuracion.get('subdominios', False))
@@ -0,0 +1,207 @@
+"""
+Caché HTTP persistente en SQLite para no volver a descargar páginas sin cambios.
+
+- Las respuestas HTML se guardan con sus validadores (ETag y Last-Modified).
+- Mientras una entrada está fresca (Cache-Control: max-age o Expires) se sirve
+  sin hacer ninguna petición.
+- Cuando caduca se revalida con If-None-Match / If-Modified-Since: un 304 solo
+  actualiza la caducidad y el cuerpo guardado se reutiliza.
+- `no-store` nunca se guarda y `no-cache` se revalida siempre.
+- Si el tamaño total supera `tamano_maximo` se eliminan las entradas usadas hace
+  más tiempo (LRU).
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+TAMANO_MAXIMO = 500 * 1024 * 1024
+
+# Cabeceras que se conservan junto al cuerpo
+CABECERAS_GUARDADAS = ('Content-Type', 'ETag', 'Last-Modified', 'Cache-Control', 'Expires')
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS respuestas (
+    url TEXT PRIMARY KEY,
+    url_final TEXT NOT NULL,
+    cabeceras TEXT NOT NULL,
+    contenido BLOB NOT NULL,
+    tamano INTEGER NOT NULL,
+    guardado REAL NOT NULL,
+    expira REAL NOT NULL,
+    ultimo_acceso REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_respuestas_acceso ON respuestas (ultimo_acceso);
+"""
+
+
+def directivas_cache(cabeceras):
+    """
+    Devuelve las directivas de Cache-Control como diccionario {nombre: valor o True}
+    """
+    directivas = {}
+    for parte in (cabeceras.get('Cache-Control') or '').split(','):
+        nombre, _, valor = parte.strip().partition('=')
+        if nombre:
+            directivas[nombre.lower()] = valor.strip('"') if valor else True
+    return directivas
+
+
+def calcular_expiracion(cabeceras, ahora=None):
+    """
+    Momento (epoch) hasta el que la respuesta es fresca; `ahora` si debe revalidarse siempre
+    """
+    ahora = time.time() if ahora is None else ahora
+    directivas = directivas_cache(cabeceras)
+    if 'no-cache' in directivas:
+        return ahora
+    if 'max-age' in directivas:
+        try:
+            return ahora + max(0, int(directivas['max-age']))
+        except ValueError:
+            return ahora
+    if cabeceras.get('Expires'):
+        try:
+            return parsedate_to_datetime(cabeceras['Expires']).timestamp()
+        except (TypeError, ValueError):
+            return ahora
+    return ahora
+
+
+class EntradaCache:
+    def __init__(self, url, url_final, cabeceras, contenido, expira):
+        self.url = url
+        self.url_final = url_final
+        self.cabeceras = cabeceras
+        self.contenido = contenido
+        self.expira = expira
+
+    @property
+    def fresca(self):
+        return self.expira > time.time()
+
+    def cabeceras_condicionales(self):
+        """
+        Cabeceras para revalidar la entrada con el servidor
+        """
+        condicionales = {}
+        if self.cabeceras.get('ETag'):
+            condicionales['If-None-Match'] = self.cabeceras['ETag']
+        if self.cabeceras.get('Last-Modified'):
+            condicionales['If-Modified-Since'] = self.cabeceras['Last-Modified']
+        return condicionales
+
+
+class CacheHTTP:
+    """
+    Caché de respuestas HTML respaldada por un archivo SQLite, segura entre hilos
+    """
+
+    def __init__(self, ruta, tamano_maximo=TAMANO_MAXIMO):
+        self.ruta = ruta
+        self.tamano_maximo = tamano_maximo
+        directorio = os.path.dirname(os.path.abspath(ruta))
+        os.makedirs(directorio, exist_ok=True)
+        self._conexion = sqlite3.connect(ruta, check_same_thread=False)
+        self._conexion.executescript(_ESQUEMA)
+        self._lock = threading.Lock()
+        self._tamano_total = self._conexion.execute(
+            "SELECT COALESCE(SUM(tamano), 0) FROM respuestas"
+        ).fetchone()[0]
+        self.aciertos = 0
+        self.revalidadas = 0
+        self.fallos = 0
+        self.guardadas = 0
+
+    def obtener(self, url):
+        with self._lock:
+            fila = self._conexion.execute(
+                "SELECT url_final, cabeceras, contenido, expira FROM respuestas WHERE url = ?", (url,)
+            ).fetchone()
+            if fila is None:
+                self.fallos += 1
+                return None
+            self._conexion.execute("UPDATE respuestas SET ultimo_acceso = ? WHERE url = ?", (time.time(), url))
+            self._conexion.commit()
+        url_final, cabeceras, contenido, expira = fila
+        return EntradaCache(url, url_final, json.loads(cabeceras), contenido, expira)
+
+    def guardar(self, url, url_final, cabeceras, contenido):
+        """
+        Guarda una respuesta 200 salvo que el servidor lo prohíba (no-store)
+        """
+        if 'no-store' in directivas_cache(cabeceras):
+            return False
+        guardadas = {nombre: cabeceras[nombre] for nombre in CABECERAS_GUARDADAS if cabeceras.get(nombre)}
+        ahora = time.time()
+        with self._lock:
+            anterior = self._conexion.execute("SELECT tamano FROM respuestas WHERE url = ?", (url,)).fetchone()
+            if anterior:
+                self._tamano_total -= anterior[0]
+            self._conexion.execute(
+                "INSERT OR REPLACE INTO respuestas "
+                "(url, url_final, cabeceras, contenido, tamano, guardado, expira, ultimo_acceso) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, url_final, json.dumps(guardadas), contenido, len(contenido), ahora,
+                 calcular_expiracion(cabeceras, ahora), ahora),
+            )
+            self._tamano_total += len(contenido)
+            self.guardadas += 1
+            self._desalojar()
+            self._conexion.commit()
+        return True
+
+    def renovar(self, entrada, cabeceras):
+        """
+        Actualiza una entrada tras un 304: nuevos validadores y nueva caducidad
+        """
+        for nombre in CABECERAS_GUARDADAS:
+            if cabeceras.get(nombre) and nombre != 'Content-Type':
+                entrada.cabeceras[nombre] = cabeceras[nombre]
+        entrada.expira = calcular_expiracion(entrada.cabeceras)
+        with self._lock:
+            self._conexion.execute(
+                "UPDATE respuestas SET cabeceras = ?, expira = ?, ultimo_acceso = ? WHERE url = ?",
+                (json.dumps(entrada.cabeceras), entrada.expira, time.time(), entrada.url),
+            )
+            self._conexion.commit()
+            self.revalidadas += 1
+
+    def registrar_acierto(self):
+        with self._lock:
+            self.aciertos += 1
+
+    def _desalojar(self):
+        # Se llama con el lock tomado
+        if self._tamano_total <= self.tamano_maximo:
+            return
+        exceso = self._tamano_total - self.tamano_maximo
+        liberado = 0
+        urls = []
+        for url, tamano in self._conexion.execute("SELECT url, tamano FROM respuestas ORDER BY ultimo_acceso"):
+            urls.append((url,))
+            liberado += tamano
+            if liberado >= exceso:
+                break
+        self._conexion.executemany("DELETE FROM respuestas WHERE url = ?", urls)
+        self._tamano_total -= liberado
+
+    def estadisticas(self):
+        with self._lock:
+            entradas, tamano = self._conexion.execute(
+                "SELECT COUNT(*), COALESCE(SUM(tamano), 0) FROM respuestas"
+            ).fetchone()
+        return {
+            'aciertos': self.aciertos,
+            'revalidadas_304': self.revalidadas,
+            'fallos': self.fallos,
+            'guardadas': self.guardadas,
+            'entradas': entradas,
+            'tamano_mb': round(tamano / 1024 / 1024, 2),
+        }
+
+    def cerrar(self):
+        with self._lock:
+            self._conexion.close()
@@ -0,0 +1,166 @@
+"""
+Caché de resultados de rastreos recientes.
+
+Cada entrada caduca a los `ttl` segundos y, si se supera `max_entradas`, se
+descarta la usada hace más tiempo (LRU). Sirve para responder al momento a
+peticiones repetidas del mismo sitio con las mismas opciones.
+
+CacheResultadosSQLite guarda las entradas en un archivo SQLite para compartirlas
+entre procesos (los resultados los produce un proceso y los consulta otro).
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+TTL_RESULTADOS = 3600
+MAX_ENTRADAS = 256
+
+
+class CacheResultados:
+    """
+    Diccionario clave -> resultado con caducidad y tamaño máximo, seguro entre hilos
+    """
+
+    def __init__(self, ttl=TTL_RESULTADOS, max_entradas=MAX_ENTRADAS):
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self._entradas = OrderedDict()   # clave -> (guardado, valor)
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.caducadas = 0
+        self.desalojadas = 0
+
+    def obtener(self, clave, valida=None):
+        """
+        Devuelve (valor, guardado) si hay una entrada vigente o None.
+        `valida(valor)` permite descartar entradas cuyo resultado ya no sirve
+        (por ejemplo, porque se borró el archivo de salida).
+        """
+        ahora = time.time()
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None and ahora - entrada[0] > self.ttl:
+                del self._entradas[clave]
+                self.caducadas += 1
+                entrada = None
+            if entrada is not None and valida is not None and not valida(entrada[1]):
+                del self._entradas[clave]
+                entrada = None
+            if entrada is None:
+                self.fallos += 1
+                return None
+            self._entradas.move_to_end(clave)
+            self.aciertos += 1
+            return entrada[1], entrada[0]
+
+    def guardar(self, clave, valor):
+        with self._lock:
+            self._entradas[clave] = (time.time(), valor)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+                self.desalojadas += 1
+
+    def invalidar(self, clave):
+        with self._lock:
+            self._entradas.pop(clave, None)
+
+    def estadisticas(self):
+        with self._lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                'entradas': len(self._entradas),
+                'max_entradas': self.max_entradas,
+                'ttl_s': self.ttl,
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'tasa_aciertos': round(self.aciertos / consultas, 3) if consultas else 0.0,
+                'caducadas': self.caducadas,
+                'desalojadas': self.desalojadas,
+            }
+
+
+class CacheResultadosSQLite:
+    """
+    Misma interfaz que CacheResultados, con las entradas en SQLite.
+    Los contadores de aciertos y fallos son de este proceso.
+    """
+
+    def __init__(self, ruta, ttl=TTL_RESULTADOS, max_entradas=MAX_ENTRADAS):
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+        self._conexion = sqlite3.connect(ruta, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conexion.execute("PRAGMA journal_mode=WAL")
+        self._conexion.execute(
+            "CREATE TABLE IF NOT EXISTS cache_resultados ("
+            "clave TEXT PRIMARY KEY, guardado REAL NOT NULL, ultimo_acceso REAL NOT NULL, valor TEXT NOT NULL)"
+        )
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.caducadas = 0
+        self.desalojadas = 0
+
+    def obtener(self, clave, valida=None):
+        clave = json.dumps(clave)
+        ahora = time.time()
+        with self._lock:
+            fila = self._conexion.execute(
+                "SELECT guardado, valor FROM cache_resultados WHERE clave = ?", (clave,)
+            ).fetchone()
+            valor = json.loads(fila[1]) if fila is not None else None
+            if fila is not None and ahora - fila[0] > self.ttl:
+                self.caducadas += 1
+                valor = None
+            elif valor is not None and valida is not None and not valida(valor):
+                valor = None
+            if valor is None:
+                if fila is not None:
+                    self._conexion.execute("DELETE FROM cache_resultados WHERE clave = ?", (clave,))
+                self.fallos += 1
+                return None
+            self._conexion.execute("UPDATE cache_resultados SET ultimo_acceso = ? WHERE clave = ?", (ahora, clave))
+            self.aciertos += 1
+            return valor, fila[0]
+
+    def guardar(self, clave, valor):
+        ahora = time.time()
+        with self._lock:
+            self._conexion.execute("BEGIN IMMEDIATE")
+            self._conexion.execute(
+                "INSERT OR REPLACE INTO cache_resultados (clave, guardado, ultimo_acceso, valor) VALUES (?, ?, ?, ?)",
+                (json.dumps(clave), ahora, ahora, json.dumps(valor)),
+            )
+            sobrantes = self._conexion.execute("SELECT COUNT(*) FROM cache_resultados").fetchone()[0] \
+                - self.max_entradas
+            if sobrantes > 0:
+                self._conexion.execute(
+                    "DELETE FROM cache_resultados WHERE clave IN "
+                    "(SELECT clave FROM cache_resultados ORDER BY ultimo_acceso LIMIT ?)", (sobrantes,)
+                )
+                self.desalojadas += sobrantes
+            self._conexion.execute("COMMIT")
+
+    def invalidar(self, clave):
+        with self._lock:
+            self._conexion.execute("DELETE FROM cache_resultados WHERE clave = ?", (json.dumps(clave),))
+
+    def estadisticas(self):
+        with self._lock:
+            entradas = self._conexion.execute("SELECT COUNT(*) FROM cache_resultados").fetchone()[0]
+            consultas = self.aciertos + self.fallos
+            return {
+                'entradas': entradas,
+                'max_entradas': self.max_entradas,
+                'ttl_s': self.ttl,
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'tasa_aciertos': round(self.aciertos / consultas, 3) if consultas else 0.0,
+                'caducadas': self.caducadas,
+                'desalojadas': self.desalojadas,
+            }
@@ -0,0 +1,260 @@
+"""
+Canonicalización de URLs antes de la deduplicación de la frontera.
+
+Cada enlace del sitio se reduce a una URL canónica para que una misma página
+lógica se pida una sola vez:
+
+- Host: en minúsculas, sin el puerto predeterminado del esquema, y los alias del
+  host base (por defecto la variante con/sin www., más los de `alias_host`) se
+  pliegan al host y al esquema de la URL base. Los enlaces a otros hosts quedan
+  fuera del rastreo (`canonizar` devuelve None) salvo los que acepte
+  `admitir_host` (por ejemplo, los subdominios de rastreador.alcance), que
+  conservan su host y su esquema.
+- Ruta: escapes %XX de caracteres no reservados decodificados y el resto en
+  mayúsculas, caracteres no ASCII y espacios escapados, sin parámetros de sesión
+  (;jsessionid=...), sin los documentos índice (index.html, index.php...) y sin
+  barra final.
+- Consulta: por defecto se elimina, como en la normalización anterior, para no
+  cambiar la deduplicación de los rastreos existentes. Con `conservar_consulta=True`
+  se conservan los parámetros permitidos (todos si `parametros_permitidos` es None)
+  salvo los denegados (los de seguimiento y sesión de `PARAMETROS_DENEGADOS`;
+  admiten comodines, como utm_*), ordenados y con una codificación uniforme.
+- Fragmento: se elimina.
+- Redirecciones aprendidas: si una URL redirige a otra del sitio, los enlaces
+  posteriores a la primera se reescriben directamente a su destino.
+
+`estadisticas()` cuenta las peticiones evitadas frente a la normalización anterior
+(esquema, host y ruta tal cual, sin consulta, fragmento ni barra final): URLs
+enlazadas que esa normalización habría pedido aparte pero cuya forma canónica ya
+se conocía, y destinos de redirección que ya no hace falta pedir. Las variantes
+que ya se unían antes (barra final, fragmento, consulta) no se cuentan. Los conjuntos
+de hashes de esas estadísticas ocupan una parte acotada de `memoria_vistas`
+(`memoria_reservada`, la cuarta parte) que MotorRastreo descuenta de la frontera.
+"""
+import re
+import threading
+from fnmatch import fnmatchcase
+from urllib.parse import parse_qsl, quote, urlencode, urlsplit
+
+from .constantes import MEMORIA_VISTAS
+from .metricas import PETICIONES_EVITADAS
+from .vistas import ConjuntoVistas
+
+# Parámetros de consulta de seguimiento y de sesión que no identifican la página
+PARAMETROS_DENEGADOS = (
+    'utm_*', 'fbclid', 'gclid', 'dclid', 'gbraid', 'wbraid', 'msclkid', 'yclid', 'igshid', 'mc_cid', 'mc_eid',
+    '_ga', '_gl', 'phpsessid', 'jsessionid', 'aspsessionid*', 'sessionid', 'sid', 'replytocom',
+)
+DOCUMENTOS_INDICE = ('index.html', 'index.htm', 'index.php', 'default.htm', 'default.html', 'default.aspx')
+PUERTOS_PREDETERMINADOS = {'http': '80', 'https': '443'}
+
+# Caracteres no reservados (RFC 3986) que nunca necesitan escaparse
+_NO_RESERVADOS = frozenset('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-._~')
+_ESCAPE = re.compile(r'%([0-9A-Fa-f]{2})')
+_PARAMETRO_SESION = re.compile(r';(?:jsessionid|phpsessid|sid)=[^/]*', re.IGNORECASE)
+# Caracteres que se dejan tal cual en la ruta (los reservados y los escapes ya hechos)
+_SEGUROS_RUTA = "/%:@!$&'()*+,;=-._~"
+# Entradas de la memoria de URLs ya canonizadas; se vacía al llenarse
+_TAMANO_MEMORIA = 100_000
+# Fracción de memoria_vistas para los conjuntos de las estadísticas; la frontera usa el resto
+FRACCION_ESTADISTICAS = 4
+_SIN_CALCULAR = object()
+
+
+def _normalizar_escape(coincidencia):
+    caracter = chr(int(coincidencia.group(1), 16))
+    return caracter if caracter in _NO_RESERVADOS else '%' + coincidencia.group(1).upper()
+
+
+def normalizar_ruta(ruta, indices=DOCUMENTOS_INDICE):
+    """
+    Ruta con los escapes normalizados, sin parámetros de sesión, sin documento índice y sin barra final
+    """
+    if ';' in ruta:
+        ruta = _PARAMETRO_SESION.sub('', ruta)
+    if '%' in ruta:
+        ruta = _ESCAPE.sub(_normalizar_escape, ruta)
+    if not ruta.isascii() or ' ' in ruta:
+        ruta = quote(ruta, safe=_SEGUROS_RUTA)
+    if indices:
+        inicio = ruta.rfind('/') + 1
+        if ruta[inicio:].lower() in indices:
+            ruta = ruta[:inicio]
+    return ruta.rstrip('/')
+
+
+def _forma_anterior(url):
+    """
+    URL normalizada como antes de la canonicalización: esquema, host y ruta sin barra final
+    """
+    partes = urlsplit(url)
+    return f"{partes.scheme}://{partes.netloc}{partes.path}".rstrip('/')
+
+
+def _host_canonico(host):
+    host = host.lower().rstrip('.')
+    if not host.isascii():
+        try:
+            host = host.encode('idna').decode('ascii')
+        except UnicodeError:
+            pass
+    return host
+
+
+def _variante_www(host):
+    return host[4:] if host.startswith('www.') else 'www.' + host
+
+
+class Canonizador:
+    """
+    Reglas de canonicalización de las URLs de un sitio (ver el docstring del módulo)
+    """
+
+    def __init__(self, url_base, alias_host=(), plegar_www=True, conservar_consulta=False,
+                 parametros_permitidos=None, parametros_denegados=PARAMETROS_DENEGADOS, indices=DOCUMENTOS_INDICE,
+                 memoria_vistas=MEMORIA_VISTAS, admitir_host=None):
+        partes = urlsplit(url_base)
+        self.esquema = partes.scheme.lower() or 'https'
+        self.host = self._netloc(self.esquema, partes.hostname or '', partes.port)
+        self.alias_host = tuple(alias_host)
+        self.plegar_www = plegar_www
+        # Hosts que se pliegan al host base, con su puerto si no es el predeterminado
+        self.alias = {self.host}
+        if plegar_www:
+            self.alias.add(_variante_www(self.host))
+        for alias in alias_host:
+            alias = urlsplit(alias if '://' in alias else '//' + alias)
+            self.alias.add(self._netloc(alias.scheme.lower() or self.esquema, alias.hostname or '', alias.port))
+        self.conservar_consulta = conservar_consulta
+        self.parametros_permitidos = None if parametros_permitidos is None else \
+            frozenset(nombre.lower() for nombre in parametros_permitidos)
+        self.parametros_denegados = tuple(parametros_denegados)
+        self._denegados_exactos = frozenset(p.lower() for p in parametros_denegados if '*' not in p and '?' not in p)
+        self._denegados_comodin = tuple(p.lower() for p in parametros_denegados if '*' in p or '?' in p)
+        self.indices = tuple(indice.lower() for indice in indices)
+        self.admitir_host = admitir_host
+
+        self._memoria = {}
+        self._redirecciones = {}
+        self._lock = threading.Lock()
+        # URLs enlazadas en su _forma_anterior y sus formas canónicas, solo sus hashes. Solo sirven para
+        # las estadísticas: se reparten memoria_vistas // FRACCION_ESTADISTICAS y el resto pasa a disco
+        self.memoria_reservada = memoria_vistas // FRACCION_ESTADISTICAS
+        self._originales = ConjuntoVistas(memoria_maxima=self.memoria_reservada // 2)
+        self._canonicas = ConjuntoVistas(memoria_maxima=self.memoria_reservada // 2)
+        self.variantes_plegadas = 0
+        self.redirecciones_evitadas = 0
+
+    @staticmethod
+    def _netloc(esquema, host, puerto):
+        host = _host_canonico(host)
+        if puerto is None or str(puerto) == PUERTOS_PREDETERMINADOS.get(esquema):
+            return host
+        return f"{host}:{puerto}"
+
+    def _parametro_permitido(self, nombre):
+        nombre = nombre.lower()
+        if self.parametros_permitidos is not None and nombre not in self.parametros_permitidos:
+            return False
+        if nombre in self._denegados_exactos:
+            return False
+        return not any(fnmatchcase(nombre, patron) for patron in self._denegados_comodin)
+
+    def normalizar_consulta(self, consulta):
+        if not consulta or not self.conservar_consulta:
+            return ''
+        parametros = [(nombre, valor) for nombre, valor in parse_qsl(consulta, keep_blank_values=True)
+                      if self._parametro_permitido(nombre)]
+        return urlencode(sorted(parametros), quote_via=quote)
+
+    def _normalizar(self, url):
+        try:
+            partes = urlsplit(url)
+            esquema = partes.scheme.lower()
+            netloc = self._netloc(esquema, partes.hostname or '', partes.port)
+        except ValueError:
+            # Puerto no numérico o IPv6 mal formada
+            return None
+        if esquema not in PUERTOS_PREDETERMINADOS:
+            return None
+        if netloc in self.alias:
+            esquema, netloc = self.esquema, self.host
+        elif self.admitir_host is None or not self.admitir_host(netloc):
+            return None
+        url = f"{esquema}://{netloc}{normalizar_ruta(partes.path, self.indices)}"
+        consulta = self.normalizar_consulta(partes.query)
+        return f"{url}?{consulta}" if consulta else url
+
+    def canonizar(self, url):
+        """
+        URL canónica de `url`, o None si está fuera del sitio
+        """
+        canonica = self._memoria.get(url, _SIN_CALCULAR)
+        if canonica is _SIN_CALCULAR:
+            canonica = self._normalizar(url)
+            if len(self._memoria) >= _TAMANO_MEMORIA:
+                self._memoria.clear()
+            self._memoria[url] = canonica
+        if canonica is None:
+            return None
+        canonica = self._redirecciones.get(canonica, canonica)
+        anterior = _forma_anterior(url)
+        with self._lock:
+            # Una URL que la normalización anterior no habría unido a ninguna vista, pero cuya forma
+            # canónica ya se conocía, habría sido una petición más
+            nueva = self._originales.agregar(anterior)
+            conocida = not self._canonicas.agregar(canonica)
+            if nueva and conocida:
+                self.variantes_plegadas += 1
+                PETICIONES_EVITADAS.incrementar(self.host, 'variant')
+        return canonica
+
+    def aprender_redireccion(self, origen, destino):
+        """
+        Registra que la URL canónica `origen` redirige a `destino`; devuelve el destino canónico
+        (None si está fuera del sitio o es la misma URL)
+        """
+        destino = self._normalizar(destino)
+        if destino is None or destino == origen:
+            return None
+        with self._lock:
+            self._redirecciones[origen] = destino
+        return destino
+
+    def redireccion(self, url):
+        return self._redirecciones.get(url)
+
+    def contar_redireccion_evitada(self):
+        with self._lock:
+            self.redirecciones_evitadas += 1
+        PETICIONES_EVITADAS.incrementar(self.host, 'redirect')
+
+    def configuracion(self):
+        """
+        Opciones serializables en JSON con las que se pueden volver a crear las reglas
+        """
+        return {'alias_host': list(self.alias_host), 'plegar_www': self.plegar_www,
+                'conservar_consulta': self.conservar_consulta,
+                'parametros_permitidos': None if self.parametros_permitidos is None else
+                sorted(self.parametros_permitidos),
+                'parametros_denegados': list(self.parametros_denegados), 'indices': list(self.indices)}
+
+    @classmethod
+    def desde_configuracion(cls, url_base, configuracion, **opciones):
+        """
+        Reglas de `url_base` con las opciones de configuracion(); `opciones` añade las que no se
+        guardan (memoria_vistas, admitir_host)
+        """
+        return cls(url_base, **(configuracion or {}), **opciones)
+
+    def cerrar(self):
+        self._originales.cerrar()
+        self._canonicas.cerrar()
+
+    def estadisticas(self):
+        return {
+            'peticiones_evitadas': self.variantes_plegadas + self.redirecciones_evitadas,
+            'variantes_plegadas': self.variantes_plegadas,
+            'redirecciones_aprendidas': len(self._redirecciones),
+            'redirecciones_evitadas': self.redirecciones_evitadas,
+        }
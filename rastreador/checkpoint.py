@@ -0,0 +1,134 @@
+"""
+Puntos de control de un rastreo en un registro de solo anexado.
+
+En lugar de reescribir una instantánea completa, cada evento añade una línea:
+
+    C <json>            cabecera: URL base, profundidad y demás opciones del rastreo
+    E <prof> <url>      URL añadida a la frontera con su profundidad
+    V <url>             URL ya procesada (con o sin éxito)
+    R <url>             URL encontrada (forma parte del resultado)
+    F                   rastreo terminado
+
+Las líneas se escriben con búfer y se vuelcan a disco cada `intervalo` segundos,
+así que una interrupción solo pierde los últimos segundos de trabajo. Al reanudar,
+las URLs encoladas que no llegaron a procesarse vuelven a la frontera.
+"""
+import json
+import os
+import time
+
+INTERVALO_VOLCADO = 5.0
+
+
+class EstadoCheckpoint:
+    """
+    Estado reconstruido a partir de un registro existente
+    """
+
+    def __init__(self, metadatos):
+        self.metadatos = metadatos
+        self.encoladas = {}
+        self.visitadas = set()
+        self.resultados = set()
+        self.terminado = False
+
+    @property
+    def pendientes(self):
+        return [(url, prof) for url, prof in self.encoladas.items() if url not in self.visitadas]
+
+
+def leer_checkpoint(ruta):
+    """
+    Lee un registro de checkpoint. Devuelve un EstadoCheckpoint o None si no existe o está vacío.
+    Una última línea incompleta (escritura interrumpida) se ignora.
+    """
+    if not os.path.exists(ruta):
+        return None
+    estado = None
+    with open(ruta, encoding='utf-8') as f:
+        for linea in f:
+            if not linea.endswith('\n'):
+                break
+            tipo, _, resto = linea.rstrip('\n').partition('\t')
+            if tipo == 'C':
+                estado = EstadoCheckpoint(json.loads(resto))
+            elif estado is None:
+                continue
+            elif tipo == 'E':
+                profundidad, _, url = resto.partition('\t')
+                estado.encoladas.setdefault(url, int(profundidad))
+            elif tipo == 'V':
+                estado.visitadas.add(resto)
+            elif tipo == 'R':
+                estado.resultados.add(resto)
+            elif tipo == 'F':
+                estado.terminado = True
+    return estado
+
+
+def _limpiar(url):
+    return url.replace('\t', '%09').replace('\n', '%0A').replace('\r', '%0D')
+
+
+class Checkpoint:
+    """
+    Registro de checkpoint de un rastreo. Con reanudar=True y un registro existente,
+    `previo` contiene el estado guardado y los nuevos eventos se añaden al final;
+    si no, el registro se crea de cero con `metadatos` como cabecera.
+    Solo debe usarse desde el hilo del bucle de eventos del motor.
+    """
+
+    def __init__(self, ruta, metadatos=None, reanudar=False, intervalo=INTERVALO_VOLCADO):
+        self.ruta = ruta
+        self.intervalo = intervalo
+        self.previo = leer_checkpoint(ruta) if reanudar else None
+        directorio = os.path.dirname(os.path.abspath(ruta))
+        os.makedirs(directorio, exist_ok=True)
+        if self.previo is not None:
+            self.metadatos = self.previo.metadatos
+            self._archivo = open(ruta, 'a', encoding='utf-8')
+        else:
+            self.metadatos = metadatos or {}
+            self._archivo = open(ruta, 'w', encoding='utf-8')
+            self._archivo.write(f"C\t{json.dumps(self.metadatos)}\n")
+        self._ultimo_volcado = time.monotonic()
+
+    def _escribir(self, linea):
+        self._archivo.write(linea)
+        if time.monotonic() - self._ultimo_volcado >= self.intervalo:
+            self.volcar()
+
+    def encolada(self, url, profundidad):
+        self._escribir(f"E\t{profundidad}\t{_limpiar(url)}\n")
+
+    def visitada(self, url):
+        self._escribir(f"V\t{_limpiar(url)}\n")
+
+    def resultado(self, url):
+        self._escribir(f"R\t{_limpiar(url)}\n")
+
+    def volcar(self):
+        if self._archivo.closed:
+            return
+        self._archivo.flush()
+        os.fsync(self._archivo.fileno())
+        self._ultimo_volcado = time.monotonic()
+
+    def terminar(self):
+        self._escribir("F\n")
+        self.volcar()
+
+    def cerrar(self):
+        if not self._archivo.closed:
+            self.volcar()
+            self._archivo.close()
+
+    def eliminar(self):
+        """
+        Cierra y borra el registro (se usa cuando el rastreo termina con éxito)
+        """
+        self.cerrar()
+        try:
+            os.remove(self.ruta)
+        except OSError:
+            pass
@@ -0,0 +1,96 @@
+"""
+Clasificador de URLs administrativas del Perú (departamentos, provincias y distritos).
+
+La expresión regular se compila una sola vez al importar el módulo. Cada URL se
+reconoce y se clasifica con una única búsqueda: los grupos con nombre de la
+coincidencia dan la categoría, el departamento, la provincia y el distrito. Las
+alternativas están ordenadas por prioridad (departamento, distrito, provincia,
+otra), de modo que en las URLs del árbol administrativo el resultado coincide con
+la categorización que hacía main.main; la provincia y el distrito se buscan a
+partir del departamento, no en toda la URL.
+"""
+import re
+from collections import namedtuple
+
+# Lista de departamentos del Perú
+DEPARTAMENTOS = (
+    'amazonas', 'ancash', 'apurimac', 'arequipa', 'ayacucho', 'cajamarca',
+    'cusco', 'callao', 'huancavelica', 'huanuco', 'ica', 'junin',
+    'la-libertad', 'lambayeque', 'lima', 'loreto', 'madre-de-dios',
+    'moquegua', 'pasco', 'piura', 'puno', 'san-martin', 'tacna',
+    'tumbes', 'ucayali'
+)
+
+CATEGORIAS = ('departamento', 'provincia', 'distrito', 'otra')
+
+Clasificacion = namedtuple('Clasificacion', 'categoria departamento provincia distrito')
+
+_DEP = '|'.join(DEPARTAMENTOS)
+
+# Una URL es administrativa si contiene alguna de estas rutas:
+#   /departamento o /departamento/ al final
+#   /departamento/provincia-xxx, /departamento/provincias-xxx o /departamento/provincias/
+#   /departamento/informacion-xxx/distrito... o /departamento/distrito...
+# La categoría sale del resto de la URL a partir del departamento: distrito si contiene
+# /informacion-<provincia>/distrito-<nombre>, provincia si contiene /provincia..., y si no
+# otra (/departamento/distrito-xxx). Una sola búsqueda clasifica la URL; sin coincidencia
+# la URL no es administrativa.
+_PATRON = re.compile(
+    rf'/(?P<departamento>{_DEP})'
+    r'(?:(?P<fin>/?$)'
+    r'|(?=/provincias?-|/provincias/|/informacion-[a-z]+/distrito|/distrito)'
+    r'(?:(?=.*?/informacion-(?P<provincia_distrito>[a-z]+)/distrito(?:-de)?-?(?P<distrito>[^/?#]*))'
+    r'|(?=.*?/provincia(?:s?-|s/)?(?P<provincia>[^/?#]*))'
+    r'|(?=.*?/distrito(?:-de)?-?(?P<distrito_otra>[^/?#]*))))'
+)
+
+
+def es_administrativa(url):
+    """
+    Indica si una URL corresponde a un departamento, provincia o distrito
+    """
+    return _PATRON.search(url.lower()) is not None
+
+
+def _clasificacion(m):
+    if m.group('fin') is not None:
+        return Clasificacion('departamento', m.group('departamento'), None, None)
+    if m.group('provincia_distrito') is not None:
+        return Clasificacion('distrito', m.group('departamento'), m.group('provincia_distrito'),
+                             m.group('distrito') or None)
+    if m.group('provincia') is not None:
+        return Clasificacion('provincia', m.group('departamento'), m.group('provincia') or None, None)
+    return Clasificacion('otra', m.group('departamento'), None, m.group('distrito_otra') or None)
+
+
+def clasificar_url(url):
+    """
+    Devuelve la Clasificacion (categoría, departamento, provincia, distrito) de una URL
+    administrativa, o None si la URL no es administrativa
+    """
+    m = _PATRON.search(url.lower())
+    return None if m is None else _clasificacion(m)
+
+
+def clasificar_lote(urls):
+    """
+    Clasifica muchas URLs de una vez. Genera tuplas (url, Clasificacion) solo para
+    las URLs administrativas.
+    """
+    buscar = _PATRON.search
+    clasificacion = _clasificacion
+    for url in urls:
+        m = buscar(url.lower())
+        if m is not None:
+            yield url, clasificacion(m)
+
+
+def agrupar_por_categoria(urls):
+    """
+    Agrupa las URLs administrativas por categoría.
+    Devuelve un diccionario {categoria: set(urls)} con todas las CATEGORIAS.
+    """
+    grupos = {categoria: set() for categoria in CATEGORIAS}
+    for url, clasificacion in clasificar_lote(urls):
+        grupos[clasificacion.categoria].add(url)
+    return grupos
@@ -0,0 +1,456 @@
+"""
+Capa de descarga HTTP del rastreador.
+
+Todas las peticiones (CLI, API web y GUI) pasan por un único `ClienteHTTP`
+compartido: una sesión de requests con un pool de conexiones keep-alive por host,
+compresión gzip/deflate (y brotli si está instalado) y caché de DNS.
+
+Cada página cuesta una sola petición GET en modo streaming: las cabeceras deciden
+si merece la pena leer el cuerpo y, si no es HTML, la conexión se descarta sin
+descargarlo.
+
+Cada petición registra en rastreador.metricas su estado y la duración de sus
+fases: DNS, conexión, espera de las cabeceras (TTFB) y descarga del cuerpo.
+"""
+import ipaddress
+import socket
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from .constantes import HEADERS, EXTENSIONES_ARCHIVO
+from .metricas import BYTES_RESPUESTA, DURACION_FASES, PETICIONES
+
+try:
+    import brotli  # noqa: F401  (urllib3 lo usa para descomprimir "br")
+    ACCEPT_ENCODING = 'gzip, deflate, br'
+except ImportError:
+    try:
+        import brotlicffi  # noqa: F401
+        ACCEPT_ENCODING = 'gzip, deflate, br'
+    except ImportError:
+        ACCEPT_ENCODING = 'gzip, deflate'
+
+# Tamaño del pool: número de hosts distintos y conexiones abiertas por host
+POOL_HOSTS = 50
+POOL_CONEXIONES_POR_HOST = 20
+TTL_DNS = 300
+
+# Máximo de bytes leídos por página. Si Content-Length lo supera la página se descarta;
+# si el servidor no lo declara, el cuerpo se trunca al llegar al límite.
+LIMITE_BYTES_PAGINA = 5 * 1024 * 1024
+TAMANO_BLOQUE = 64 * 1024
+# Cuerpos no leídos (304, errores, otros tipos) de hasta este tamaño declarado se descartan
+# leyéndolos para que la conexión vuelva al pool; los mayores o sin Content-Length la cierran
+MAX_BYTES_DRENAJE = 64 * 1024
+
+TIPOS_HTML = ('text/html', 'application/xhtml+xml')
+
+# Segundos de DNS y conexión de la petición en curso en cada hilo, que se descuentan del TTFB
+_tiempo_red = threading.local()
+
+
+def _etiqueta_host(host, puerto):
+    # Igual que el netloc de la URL: el puerto solo aparece si no es el predeterminado
+    return host if puerto in (None, 80, 443) else f"{host}:{puerto}"
+
+
+def _sumar_tiempo_red(duracion):
+    _tiempo_red.segundos = getattr(_tiempo_red, 'segundos', 0.0) + duracion
+
+
+class RespuestaPagina:
+    """
+    Resultado de descargar una URL. `contenido` es None cuando el cuerpo no se leyó
+    (error HTTP, tipo no HTML o tamaño excesivo) y `motivo` explica por qué.
+    Con contenido, `motivo` indica si vino de la caché ('cache' o 'no-modificada').
+    """
+
+    def __init__(self, url, estado, contenido=None, url_final=None, cabeceras=None, motivo=None):
+        self.url = url
+        self.estado = estado
+        self.contenido = contenido
+        self.url_final = url_final or url
+        self.cabeceras = cabeceras or {}
+        self.motivo = motivo
+
+    @property
+    def charset(self):
+        content_type = self.cabeceras.get('Content-Type', '')
+        for parametro in content_type.split(';')[1:]:
+            nombre, _, valor = parametro.partition('=')
+            if nombre.strip().lower() == 'charset':
+                return valor.strip().strip('"\'') or None
+        return None
+
+    @property
+    def es_html(self):
+        return self.contenido is not None
+
+    def __repr__(self):
+        return f"RespuestaPagina({self.url!r}, estado={self.estado}, motivo={self.motivo!r})"
+
+
+class CacheDNS:
+    """
+    Caché de resoluciones DNS con caducidad (segundos) compartida por todas las conexiones
+    """
+
+    def __init__(self, ttl=TTL_DNS):
+        self.ttl = ttl
+        self.aciertos = 0
+        self.fallos = 0
+        self._entradas = {}
+        self._lock = threading.Lock()
+
+    def resolver(self, host, puerto):
+        if _es_ip(host):
+            return host
+        clave = (host, puerto)
+        ahora = time.monotonic()
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada and entrada[1] > ahora:
+                self.aciertos += 1
+                return entrada[0]
+            self.fallos += 1
+
+        inicio = time.perf_counter()
+        try:
+            direccion = socket.getaddrinfo(host, puerto, 0, socket.SOCK_STREAM)[0][4][0]
+        finally:
+            duracion = time.perf_counter() - inicio
+            DURACION_FASES.observar(duracion, 'dns', _etiqueta_host(host, puerto))
+            _sumar_tiempo_red(duracion)
+        with self._lock:
+            self._entradas[clave] = (direccion, ahora + self.ttl)
+        return direccion
+
+    def invalidar(self, host, puerto):
+        with self._lock:
+            self._entradas.pop((host, puerto), None)
+
+
+def _es_ip(host):
+    try:
+        ipaddress.ip_address(host.strip('[]'))
+        return True
+    except ValueError:
+        return False
+
+
+def _clases_pool(cliente, registro=None):
+    """
+    Crea las clases de pool de urllib3 cuyas conexiones resuelven el host con la
+    caché DNS del cliente y registran cada conexión nueva (TCP + TLS) en sus estadísticas
+    (y en `registro`, una SesionAislada, si se indica).
+    """
+
+    class _MixinConexion:
+        def _new_conn(self):
+            host = self._dns_host
+            inicio = time.perf_counter()
+            try:
+                self._dns_host = cliente.dns.resolver(host, self.port)
+            except OSError:
+                # Se deja que urllib3 resuelva y genere su error habitual
+                return super()._new_conn()
+            try:
+                return super()._new_conn()
+            except Exception:
+                cliente.dns.invalidar(host, self.port)
+                raise
+            finally:
+                self._dns_host = host
+                self._duracion_dns = time.perf_counter() - inicio
+
+        def connect(self):
+            self._duracion_dns = 0.0
+            inicio = time.perf_counter()
+            super().connect()
+            duracion = time.perf_counter() - inicio
+            cliente._registrar_conexion(duracion)
+            # La resolución (dentro de _new_conn) ya se contó como fase 'dns'
+            conexion = max(0.0, duracion - self._duracion_dns)
+            DURACION_FASES.observar(conexion, 'connect', _etiqueta_host(self.host, self.port))
+            _sumar_tiempo_red(conexion)
+            if registro is not None:
+                registro._abierta(self)
+
+    class ConexionHTTP(_MixinConexion, HTTPConnection):
+        pass
+
+    class ConexionHTTPS(_MixinConexion, HTTPSConnection):
+        pass
+
+    class PoolHTTP(HTTPConnectionPool):
+        ConnectionCls = ConexionHTTP
+
+    class PoolHTTPS(HTTPSConnectionPool):
+        ConnectionCls = ConexionHTTPS
+
+    return {'http': PoolHTTP, 'https': PoolHTTPS}
+
+
+class _AdaptadorPool(HTTPAdapter):
+    def __init__(self, cliente, registro=None, **kwargs):
+        self._cliente = cliente
+        self._registro = registro
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = _clases_pool(self._cliente, self._registro)
+
+
+class SesionAislada:
+    """
+    Sesión de corta vida del cliente con sus propias conexiones (mismas cabeceras, caché DNS y
+    estadísticas), para peticiones que pueden abandonarse: `cerrar()` corta también las que
+    están en curso, sin ocupar conexiones del pool compartido.
+    """
+
+    def __init__(self, cliente):
+        self.sesion = cliente._nueva_sesion(_AdaptadorPool(cliente, self, pool_connections=2, pool_maxsize=1))
+        self.cerrada = False
+        self._conexiones = []
+        self._lock = threading.Lock()
+
+    def head(self, url, **kwargs):
+        return self.sesion.head(url, **kwargs)
+
+    def _abierta(self, conexion):
+        with self._lock:
+            self._conexiones.append(conexion)
+            cerrada = self.cerrada
+        if cerrada:
+            _cortar(conexion)
+
+    def cerrar(self):
+        with self._lock:
+            self.cerrada = True
+            conexiones = list(self._conexiones)
+        self.sesion.close()
+        for conexion in conexiones:
+            _cortar(conexion)
+
+
+def _cortar(conexion):
+    # shutdown() despierta al hilo bloqueado leyendo del socket, que falla al momento
+    sock = getattr(conexion, 'sock', None)
+    if sock is None:
+        return
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+
+class ClienteHTTP:
+    """
+    Sesión HTTP compartida con pool de conexiones keep-alive, compresión y caché de DNS.
+    Lleva la cuenta de peticiones y conexiones abiertas para medir cuánto se reutilizan.
+    """
+
+    def __init__(self, pool_hosts=POOL_HOSTS, conexiones_por_host=POOL_CONEXIONES_POR_HOST, ttl_dns=TTL_DNS):
+        self.dns = CacheDNS(ttl=ttl_dns)
+        self.sesion = self._nueva_sesion(_AdaptadorPool(self, pool_connections=pool_hosts,
+                                                        pool_maxsize=conexiones_por_host))
+
+        self._lock = threading.Lock()
+        self._peticiones = 0
+        self._conexiones = 0
+        self._tiempo_conexion = 0.0
+
+    def _nueva_sesion(self, adaptador):
+        sesion = requests.Session()
+        sesion.headers.update(HEADERS)
+        sesion.headers['Accept-Encoding'] = ACCEPT_ENCODING
+        sesion.hooks['response'].append(self._registrar_respuesta)
+        sesion.mount('http://', adaptador)
+        sesion.mount('https://', adaptador)
+        return sesion
+
+    def sesion_aislada(self):
+        """
+        SesionAislada de este cliente, que se cierra con su método cerrar()
+        """
+        return SesionAislada(self)
+
+    def get(self, url, **kwargs):
+        return self.sesion.get(url, **kwargs)
+
+    def head(self, url, **kwargs):
+        return self.sesion.head(url, **kwargs)
+
+    def _registrar_respuesta(self, response, *args, **kwargs):
+        with self._lock:
+            self._peticiones += 1
+
+    def _registrar_conexion(self, duracion):
+        with self._lock:
+            self._conexiones += 1
+            self._tiempo_conexion += duracion
+
+    def estadisticas(self):
+        """
+        Devuelve las estadísticas de reutilización de conexiones y de la caché DNS.
+        El ahorro estimado multiplica las conexiones reutilizadas por el coste medio
+        de abrir una conexión nueva (TCP + TLS).
+        """
+        with self._lock:
+            peticiones = self._peticiones
+            conexiones = self._conexiones
+            tiempo = self._tiempo_conexion
+        reutilizadas = max(0, peticiones - conexiones)
+        media = tiempo / conexiones if conexiones else 0.0
+        return {
+            'peticiones': peticiones,
+            'conexiones_nuevas': conexiones,
+            'conexiones_reutilizadas': reutilizadas,
+            'tasa_reutilizacion': round(reutilizadas / peticiones, 3) if peticiones else 0.0,
+            'tiempo_conexion_medio_ms': round(media * 1000, 2),
+            'tiempo_ahorrado_estimado_s': round(reutilizadas * media, 3),
+            'dns_aciertos': self.dns.aciertos,
+            'dns_fallos': self.dns.fallos,
+        }
+
+
+_cliente = None
+_cliente_lock = threading.Lock()
+
+
+def obtener_cliente():
+    """
+    Devuelve el cliente HTTP compartido por todo el proceso (se crea la primera vez)
+    """
+    global _cliente
+    if _cliente is None:
+        with _cliente_lock:
+            if _cliente is None:
+                _cliente = ClienteHTTP()
+    return _cliente
+
+
+def es_archivo(url):
+    """
+    Indica si la URL apunta a un archivo que no se debe explorar (.pdf, .jpg, etc.)
+    """
+    return url.lower().endswith(EXTENSIONES_ARCHIVO)
+
+
+def es_tipo_html(content_type):
+    # Sin Content-Type se asume HTML, igual que hacía la versión con HEAD+GET
+    if not content_type:
+        return True
+    return content_type.split(';', 1)[0].strip().lower() in TIPOS_HTML
+
+
+def _liberar_conexion(response, maximo=MAX_BYTES_DRENAJE):
+    """
+    Devuelve la conexión de una respuesta cuyo cuerpo no se va a usar al pool, leyendo y
+    descartando el cuerpo si es corto; si no, se cierra al cerrar la respuesta
+    """
+    try:
+        longitud = int(response.headers.get('Content-Length', ''))
+    except ValueError:
+        longitud = None
+    if response.status_code not in (204, 304) and (longitud is None or longitud > maximo):
+        return
+    response.raw.drain_conn()
+    response.raw.release_conn()
+
+
+def descargar_pagina(url, limite_bytes=LIMITE_BYTES_PAGINA, timeout=15, cliente=None, cache=None,
+                     validadores=None, antes_de_pedir=None):
+    """
+    Descarga una página con un único GET en streaming.
+    Solo lee el cuerpo si la respuesta es 200 y HTML, y nunca más de `limite_bytes`; los
+    cuerpos cortos de las demás respuestas se descartan para reutilizar la conexión.
+    Con una `cache` (CacheHTTP) las páginas frescas no generan petición y las
+    caducadas se revalidan con una petición condicional.
+    `validadores` (If-None-Match / If-Modified-Since) permite una petición condicional
+    sin caché: si el servidor responde 304 se devuelve estado 304 sin contenido.
+    `antes_de_pedir()` se llama justo antes de la petición de red (no en los aciertos de caché).
+    """
+    if es_archivo(url):
+        return RespuestaPagina(url, None, motivo='archivo')
+
+    entrada = cache.obtener(url) if cache is not None else None
+    if entrada is not None and entrada.fresca:
+        cache.registrar_acierto()
+        return RespuestaPagina(url, 200, contenido=entrada.contenido, url_final=entrada.url_final,
+                               cabeceras=entrada.cabeceras, motivo='cache')
+    condicionales = entrada.cabeceras_condicionales() if entrada is not None else (validadores or {})
+
+    if antes_de_pedir is not None:
+        antes_de_pedir()
+    cliente = cliente or obtener_cliente()
+    host = urlparse(url).netloc
+    _tiempo_red.segundos = 0.0
+    try:
+        response = cliente.get(url, headers=condicionales, timeout=timeout, stream=True, allow_redirects=True)
+    except Exception:
+        PETICIONES.incrementar(host, 'error')
+        raise
+    PETICIONES.incrementar(host, str(response.status_code))
+    # elapsed va del envío a las cabeceras e incluye el DNS y la conexión nueva, si la hubo
+    DURACION_FASES.observar(max(0.0, response.elapsed.total_seconds() - _tiempo_red.segundos), 'ttfb', host)
+    with response:
+        cabeceras = response.headers
+        if response.status_code == 304 and entrada is not None:
+            _liberar_conexion(response)
+            cache.renovar(entrada, cabeceras)
+            return RespuestaPagina(url, 200, contenido=entrada.contenido, url_final=entrada.url_final,
+                                   cabeceras=entrada.cabeceras, motivo='no-modificada')
+        if response.status_code == 304 and condicionales:
+            _liberar_conexion(response)
+            return RespuestaPagina(url, 304, url_final=response.url, cabeceras=cabeceras, motivo='no-modificada')
+
+        if response.status_code != 200:
+            _liberar_conexion(response)
+            return RespuestaPagina(url, response.status_code, url_final=response.url,
+                                   cabeceras=cabeceras, motivo='estado')
+
+        # Redirecciones hacia archivos
+        if es_archivo(response.url):
+            _liberar_conexion(response)
+            return RespuestaPagina(url, response.status_code, url_final=response.url,
+                                   cabeceras=cabeceras, motivo='archivo')
+
+        if not es_tipo_html(cabeceras.get('Content-Type')):
+            _liberar_conexion(response)
+            return RespuestaPagina(url, response.status_code, url_final=response.url,
+                                   cabeceras=cabeceras, motivo='tipo')
+
+        try:
+            longitud = int(cabeceras.get('Content-Length', ''))
+        except ValueError:
+            longitud = None
+        if longitud is not None and longitud > limite_bytes:
+            return RespuestaPagina(url, response.status_code, url_final=response.url,
+                                   cabeceras=cabeceras, motivo='tamano')
+
+        bloques = []
+        leidos = 0
+        truncada = False
+        inicio = time.perf_counter()
+        for bloque in response.iter_content(TAMANO_BLOQUE):
+            bloques.append(bloque)
+            leidos += len(bloque)
+            if leidos >= limite_bytes:
+                truncada = True
+                break
+        contenido = b''.join(bloques)[:limite_bytes]
+        DURACION_FASES.observar(time.perf_counter() - inicio, 'download', host)
+        BYTES_RESPUESTA.incrementar(host, cantidad=leidos)
+
+    # Las páginas truncadas no se guardan: su cuerpo está incompleto
+    if cache is not None and not truncada:
+        cache.guardar(url, response.url, cabeceras, contenido)
+    return RespuestaPagina(url, 200, contenido=contenido, url_final=response.url, cabeceras=cabeceras)
@@ -0,0 +1,20 @@
+"""
+Constantes compartidas por los distintos módulos del rastreador
+"""
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+# Extensiones de archivo que no se exploran
+EXTENSIONES_ARCHIVO = (
+    '.pdf', '.jpg', '.jpeg', '.png', '.gif', '.zip', '.doc', '.docx', '.xls', '.xlsx'
+)
+
+# Valores por defecto del motor de rastreo
+CONCURRENCIA_GLOBAL = 10
+CONCURRENCIA_POR_HOST = 4
+# Límite de páginas por rastreo (None = sin límite, la profundidad acota el rastreo)
+LIMITE_PAGINAS = None
+# Memoria máxima (bytes) de la tabla de URLs vistas; por encima se vuelca a disco
+MEMORIA_VISTAS = 64 * 1024 * 1024
@@ -0,0 +1,177 @@
+"""
+Control adaptativo del ritmo de peticiones por host.
+
+Cada host tiene un cubo de fichas (token bucket) que se rellena a `tasa`
+peticiones por segundo. La tasa se ajusta con AIMD: sube poco a poco mientras
+la latencia se mantiene cerca de la mejor observada y se reduce a la mitad
+cuando el servidor responde 429/502/503/504 o falla la conexión. Retry-After
+detiene las peticiones al host hasta la fecha indicada y el Crawl-delay de
+robots.txt limita la tasa máxima.
+"""
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+TASA_INICIAL = 4.0       # peticiones por segundo
+TASA_MINIMA = 0.1
+TASA_MAXIMA = 50.0
+# Aumento aditivo: unas INCREMENTO peticiones/s más por cada segundo de respuestas sanas
+INCREMENTO = 1.0
+# Reducción multiplicativa ante errores de sobrecarga y ante latencia alta
+REDUCCION_ERROR = 0.5
+REDUCCION_LATENCIA = 0.8
+# La latencia es "alta" si su media supera este múltiplo de la latencia base y además
+# la excede en MARGEN_LATENCIA segundos (evita reaccionar al ruido de servidores muy rápidos)
+FACTOR_LATENCIA = 2.0
+MARGEN_LATENCIA = 0.05
+_ALFA_LATENCIA = 0.2
+# Pausa máxima aceptada de un Retry-After (segundos)
+MAX_RETRY_AFTER = 300
+
+ESTADOS_SOBRECARGA = (429, 502, 503, 504)
+
+
+def segundos_retry_after(valor, ahora=None):
+    """
+    Segundos indicados por una cabecera Retry-After (número o fecha HTTP), o None
+    """
+    if not valor:
+        return None
+    valor = valor.strip()
+    try:
+        segundos = float(valor)
+    except ValueError:
+        try:
+            segundos = parsedate_to_datetime(valor).timestamp() - (ahora or time.time())
+        except (TypeError, ValueError):
+            return None
+    return min(max(segundos, 0.0), MAX_RETRY_AFTER)
+
+
+class LimitadorHost:
+    """
+    Ritmo de peticiones a un host. `reservar` se llama antes de cada petición y
+    `registrar` con su resultado; es seguro entre hilos.
+    """
+
+    def __init__(self, host, tasa_inicial=TASA_INICIAL, tasa_minima=TASA_MINIMA, tasa_maxima=TASA_MAXIMA,
+                 rafaga=1, retraso=None):
+        self.host = host
+        self.tasa_minima = tasa_minima
+        self.tasa_maxima = tasa_maxima
+        self.rafaga = max(1, rafaga)
+        self.retraso = retraso
+        if retraso:
+            # Crawl-delay: como mucho una petición cada `retraso` segundos, sin ráfagas
+            self.tasa_maxima = min(self.tasa_maxima, 1.0 / retraso)
+            self.rafaga = 1
+        self.tasa = min(tasa_inicial, self.tasa_maxima)
+        self._fichas = float(self.rafaga)
+        self._actualizado = time.monotonic()
+        self._pausado_hasta = 0.0
+        self._ultima_reduccion = 0.0
+        self._latencia_media = None
+        self._latencia_base = None
+        self._lock = threading.Lock()
+        self.peticiones = 0
+        self.sobrecargas = 0
+        self.reducciones = 0
+        self.espera_total = 0.0
+        self._inicio = self._actualizado
+
+    def reservar(self):
+        """
+        Consume una ficha y devuelve los segundos que hay que esperar antes de la petición
+        """
+        with self._lock:
+            ahora = time.monotonic()
+            self._fichas = min(self.rafaga, self._fichas + (ahora - self._actualizado) * self.tasa)
+            self._actualizado = ahora
+            self._fichas -= 1
+            espera = -self._fichas / self.tasa if self._fichas < 0 else 0.0
+            espera = max(espera, self._pausado_hasta - ahora)
+            self.peticiones += 1
+            self.espera_total += espera
+            return espera
+
+    def registrar(self, estado, latencia, retry_after=None):
+        """
+        Ajusta la tasa con el resultado de una petición: `estado` HTTP (None si falló
+        la conexión), `latencia` en segundos y la cabecera Retry-After si la hay
+        """
+        with self._lock:
+            ahora = time.monotonic()
+            if estado is None or estado in ESTADOS_SOBRECARGA:
+                self.sobrecargas += 1
+                self._reducir(REDUCCION_ERROR, ahora, forzar=True)
+                segundos = segundos_retry_after(retry_after)
+                if segundos:
+                    self._pausado_hasta = max(self._pausado_hasta, ahora + segundos)
+                return
+
+            self._latencia_media = latencia if self._latencia_media is None else \
+                _ALFA_LATENCIA * latencia + (1 - _ALFA_LATENCIA) * self._latencia_media
+            if self._latencia_base is None or self._latencia_media < self._latencia_base:
+                self._latencia_base = self._latencia_media
+            else:
+                # La base sigue despacio a la media por si el servidor se vuelve más lento de forma estable
+                self._latencia_base += (self._latencia_media - self._latencia_base) * 0.01
+
+            if self._latencia_media > max(FACTOR_LATENCIA * self._latencia_base,
+                                          self._latencia_base + MARGEN_LATENCIA):
+                self._reducir(REDUCCION_LATENCIA, ahora)
+            else:
+                self.tasa = min(self.tasa_maxima, self.tasa + INCREMENTO / max(self.tasa, 1.0))
+
+    def _reducir(self, factor, ahora, forzar=False):
+        # Como mucho una reducción por latencia en cada intervalo de latencia media (mínimo 1 s)
+        intervalo = max(self._latencia_media or 0.0, 1.0)
+        if not forzar and ahora - self._ultima_reduccion < intervalo:
+            return
+        self.tasa = max(self.tasa_minima, self.tasa * factor)
+        self._ultima_reduccion = ahora
+        self.reducciones += 1
+
+    def estado(self):
+        with self._lock:
+            ahora = time.monotonic()
+            transcurrido = ahora - self._inicio
+            return {
+                'rate_limit_rps': round(self.tasa, 2),
+                'effective_rps': round(self.peticiones / transcurrido, 2) if transcurrido > 0 else 0.0,
+                'requests': self.peticiones,
+                'throttled': self.sobrecargas,
+                'backoffs': self.reducciones,
+                'avg_latency_ms': round(self._latencia_media * 1000, 1) if self._latencia_media is not None else None,
+                'base_latency_ms': round(self._latencia_base * 1000, 1) if self._latencia_base is not None else None,
+                'waited_s': round(self.espera_total, 2),
+                'paused_for_s': round(max(0.0, self._pausado_hasta - ahora), 1),
+                'crawl_delay_s': self.retraso,
+            }
+
+
+class ControlCortesia:
+    """
+    Limitadores por host creados bajo demanda
+    """
+
+    def __init__(self, rafaga=1, retrasos=None, **opciones):
+        self.rafaga = rafaga
+        self.retrasos = retrasos or {}   # host -> Crawl-delay
+        self.opciones = opciones
+        self._limitadores = {}
+        self._lock = threading.Lock()
+
+    def limitador(self, host):
+        with self._lock:
+            limitador = self._limitadores.get(host)
+            if limitador is None:
+                limitador = LimitadorHost(host, rafaga=self.rafaga, retraso=self.retrasos.get(host),
+                                          **self.opciones)
+                self._limitadores[host] = limitador
+            return limitador
+
+    def estado(self):
+        with self._lock:
+            limitadores = list(self._limitadores.values())
+        return {limitador.host: limitador.estado() for limitador in limitadores}
@@ -0,0 +1,192 @@
+"""
+Extracción de enlaces de una página HTML sin construir el árbol DOM.
+
+Los extractores reciben eventos (etiqueta de apertura, texto, cierre) y solo
+guardan los atributos que interesan:
+- `href` de <a>, <link> y <area>
+- <base href>, que cambia la URL contra la que se resuelven los enlaces relativos
+- el texto de <loc>, para páginas que son sitemaps XML
+
+Backends disponibles: 'html.parser' (biblioteca estándar), 'lxml' (opcional, más
+rápido) y 'bs4' (el análisis con BeautifulSoup anterior, útil para comparar).
+'auto' usa lxml si está instalado. Única diferencia conocida: con atributos href
+duplicados lxml se queda con el primero (como los navegadores) y los demás con el último.
+"""
+import warnings
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+ETIQUETAS_ENLACE = frozenset(('a', 'link', 'area'))
+PREFIJOS_IGNORADOS = ('javascript:', 'mailto:', 'tel:', '#')
+BACKENDS = ('auto', 'html.parser', 'lxml', 'bs4')
+
+
+class _Recolector:
+    """
+    Acumula los href encontrados y resuelve las URLs al final, cuando ya se conoce <base>
+    """
+
+    def __init__(self, etiquetas):
+        self.etiquetas = etiquetas
+        self.hrefs = []
+        self.base = None
+        self._en_loc = False
+        self._texto_loc = []
+
+    def inicio(self, tag, attrs):
+        if tag in self.etiquetas:
+            href = attrs.get('href')
+            if href is not None:
+                self.hrefs.append(href)
+        elif tag == 'base':
+            if self.base is None and attrs.get('href'):
+                self.base = attrs['href'].strip()
+        elif tag == 'loc':
+            self._en_loc = True
+            self._texto_loc = []
+
+    def texto(self, data):
+        if self._en_loc:
+            self._texto_loc.append(data)
+
+    def fin(self, tag):
+        if tag == 'loc' and self._en_loc:
+            self._en_loc = False
+            self.hrefs.append(''.join(self._texto_loc))
+
+    def resultado(self, url_pagina):
+        base = urljoin(url_pagina, self.base) if self.base else url_pagina
+        urls = []
+        for href in self.hrefs:
+            href = href.strip()
+            if not href or href.startswith(PREFIJOS_IGNORADOS):
+                continue
+            urls.append(urljoin(base, href))
+        return urls
+
+
+class _ParserEstandar(HTMLParser):
+    def __init__(self, recolector):
+        super().__init__(convert_charrefs=True)
+        self.recolector = recolector
+
+    def handle_starttag(self, tag, attrs):
+        # Con atributos repetidos gana el último, como en BeautifulSoup
+        self.recolector.inicio(tag, dict(attrs))
+
+    def handle_endtag(self, tag):
+        self.recolector.fin(tag)
+
+    def handle_data(self, data):
+        self.recolector.texto(data)
+
+
+class _DestinoLxml:
+    """
+    Destino de eventos para el parser de lxml (no se crea ningún árbol)
+    """
+
+    def __init__(self, recolector):
+        self.recolector = recolector
+
+    def start(self, tag, attrib):
+        if isinstance(tag, str):
+            self.recolector.inicio(tag.lower(), attrib)
+
+    def end(self, tag):
+        if isinstance(tag, str):
+            self.recolector.fin(tag.lower())
+
+    def data(self, data):
+        self.recolector.texto(data)
+
+    def comment(self, text):
+        pass
+
+    def close(self):
+        return self.recolector
+
+
+def _decodificar(contenido, charset):
+    if isinstance(contenido, str):
+        return contenido
+    if charset:
+        try:
+            return contenido.decode(charset, errors='replace')
+        except LookupError:
+            pass
+    try:
+        return contenido.decode('utf-8')
+    except UnicodeDecodeError:
+        return contenido.decode('latin-1')
+
+
+def _extraer_html_parser(contenido, recolector, charset):
+    parser = _ParserEstandar(recolector)
+    parser.feed(_decodificar(contenido, charset))
+    parser.close()
+
+
+def _extraer_lxml(contenido, recolector, charset):
+    if isinstance(contenido, str):
+        contenido = contenido.encode('utf-8')
+        charset = 'utf-8'
+    elif charset is None:
+        # Sin charset declarado libxml2 asume latin-1; se prefiere UTF-8 si es válido
+        try:
+            contenido.decode('utf-8')
+            charset = 'utf-8'
+        except UnicodeDecodeError:
+            pass
+    parser = etree.HTMLParser(target=_DestinoLxml(recolector), encoding=charset, recover=True)
+    parser.feed(contenido)
+    parser.close()
+
+
+def _extraer_bs4(contenido, recolector, charset):
+    from bs4 import BeautifulSoup, XMLParsedAsHTMLWarning
+
+    with warnings.catch_warnings():
+        # Los sitemaps XML se analizan igual que el HTML, a propósito
+        warnings.simplefilter('ignore', XMLParsedAsHTMLWarning)
+        soup = BeautifulSoup(contenido, 'html.parser',
+                             from_encoding=None if isinstance(contenido, str) else charset)
+    base = soup.find('base', href=True)
+    if base:
+        recolector.inicio('base', {'href': base['href']})
+    for link in soup.find_all(list(recolector.etiquetas), href=True):
+        recolector.hrefs.append(link['href'])
+    for loc in soup.find_all('loc'):
+        recolector.hrefs.append(loc.get_text())
+
+
+def resolver_backend(backend='auto'):
+    if backend not in BACKENDS:
+        raise ValueError(f"Extractor de enlaces desconocido: {backend!r} (use {', '.join(BACKENDS)})")
+    if backend == 'auto':
+        return 'lxml' if etree is not None else 'html.parser'
+    if backend == 'lxml' and etree is None:
+        raise ValueError("El extractor 'lxml' requiere instalar lxml (pip install lxml)")
+    return backend
+
+
+_EXTRACTORES = {
+    'html.parser': _extraer_html_parser,
+    'lxml': _extraer_lxml,
+    'bs4': _extraer_bs4,
+}
+
+
+def extraer_enlaces(contenido, url_pagina, backend='auto', charset=None, etiquetas=ETIQUETAS_ENLACE):
+    """
+    Devuelve la lista de URLs absolutas enlazadas desde la página (en orden de aparición),
+    sin los enlaces javascript:, mailto:, tel: ni los fragmentos locales (#...)
+    """
+    recolector = _Recolector(etiquetas)
+    _EXTRACTORES[resolver_backend(backend)](contenido, recolector, charset)
+    return recolector.resultado(url_pagina)
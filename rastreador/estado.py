@@ -0,0 +1,181 @@
+"""
+Estado persistente de rastreo para el modo incremental.
+
+Por cada URL se guarda la fecha de la última visita, los validadores HTTP (ETag y
+Last-Modified), un hash del contenido y los enlaces salientes. En la siguiente
+ejecución el motor:
+- no vuelve a pedir las páginas visitadas hace menos de `edad_maxima` segundos,
+- revalida las demás con una petición condicional,
+- reutiliza los enlaces guardados si la página no ha cambiado (304 o mismo hash),
+- visita primero las páginas más antiguas.
+
+Al terminar se comparan las URLs encontradas con las de la ejecución anterior
+para obtener las añadidas y las eliminadas.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Número de páginas actualizadas entre dos commits a disco
+LOTE_COMMIT = 200
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS paginas (
+    url TEXT PRIMARY KEY,
+    dominio TEXT NOT NULL,
+    ultima_visita REAL NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    hash TEXT,
+    enlaces TEXT,
+    encontrada INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_paginas_dominio ON paginas (dominio);
+CREATE TABLE IF NOT EXISTS ejecuciones (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    dominio TEXT NOT NULL,
+    inicio REAL NOT NULL,
+    fin REAL NOT NULL,
+    encontradas INTEGER NOT NULL,
+    anadidas INTEGER NOT NULL,
+    eliminadas INTEGER NOT NULL
+);
+"""
+
+
+def hash_contenido(contenido):
+    return hashlib.blake2b(contenido, digest_size=16).hexdigest()
+
+
+class PaginaGuardada:
+    def __init__(self, url, ultima_visita, etag, last_modified, hash, enlaces, encontrada):
+        self.url = url
+        self.ultima_visita = ultima_visita
+        self.etag = etag
+        self.last_modified = last_modified
+        self.hash = hash
+        # None si la página nunca se analizó (por ejemplo, estaba en el último nivel)
+        self.enlaces = json.loads(enlaces) if enlaces is not None else None
+        self.encontrada = bool(encontrada)
+
+    def validadores(self):
+        """
+        Cabeceras condicionales para comprobar si la página ha cambiado
+        """
+        cabeceras = {}
+        if self.etag:
+            cabeceras['If-None-Match'] = self.etag
+        if self.last_modified:
+            cabeceras['If-Modified-Since'] = self.last_modified
+        return cabeceras
+
+
+class EstadoRastreo:
+    """
+    Metadatos por URL de las ejecuciones anteriores de un dominio, en SQLite
+    """
+
+    def __init__(self, ruta, dominio):
+        self.ruta = ruta
+        self.dominio = dominio
+        directorio = os.path.dirname(os.path.abspath(ruta))
+        os.makedirs(directorio, exist_ok=True)
+        self._conexion = sqlite3.connect(ruta, check_same_thread=False)
+        self._conexion.executescript(_ESQUEMA)
+        self._lock = threading.Lock()
+        self._pendientes = 0
+        self.inicio = time.time()
+        # Cómo se resolvió cada página conocida en esta ejecución
+        self.contadores = dict.fromkeys(('sin_peticion', 'no_modificadas', 'mismo_contenido', 'cambiadas'), 0)
+
+        # Fecha de última visita en memoria para priorizar sin consultar la base de datos
+        self._ultimas_visitas = dict(self._conexion.execute(
+            "SELECT url, ultima_visita FROM paginas WHERE dominio = ?", (dominio,)
+        ))
+        self.anteriores = {url for (url,) in self._conexion.execute(
+            "SELECT url FROM paginas WHERE dominio = ? AND encontrada = 1", (dominio,)
+        )}
+
+    def __len__(self):
+        return len(self._ultimas_visitas)
+
+    def antiguedad(self, url):
+        """
+        Fecha de la última visita (0 si nunca se visitó): sirve de prioridad, primero lo más antiguo
+        """
+        return self._ultimas_visitas.get(url, 0.0)
+
+    def prioridad(self, url, profundidad):
+        return (self.antiguedad(url), profundidad)
+
+    def obtener(self, url):
+        if url not in self._ultimas_visitas:
+            return None
+        with self._lock:
+            fila = self._conexion.execute(
+                "SELECT url, ultima_visita, etag, last_modified, hash, enlaces, encontrada "
+                "FROM paginas WHERE url = ?", (url,)
+            ).fetchone()
+        return PaginaGuardada(*fila) if fila else None
+
+    def contar(self, clave):
+        with self._lock:
+            self.contadores[clave] += 1
+
+    def registrar(self, url, encontrada, enlaces=None, cabeceras=None, hash=None):
+        """
+        Guarda el resultado de visitar una URL. Los valores None conservan lo guardado antes.
+        """
+        cabeceras = cabeceras or {}
+        ahora = time.time()
+        with self._lock:
+            self._conexion.execute(
+                "INSERT INTO paginas (url, dominio, ultima_visita, etag, last_modified, hash, enlaces, encontrada) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(url) DO UPDATE SET ultima_visita = excluded.ultima_visita, "
+                "etag = COALESCE(excluded.etag, paginas.etag), "
+                "last_modified = COALESCE(excluded.last_modified, paginas.last_modified), "
+                "hash = COALESCE(excluded.hash, paginas.hash), "
+                "enlaces = COALESCE(excluded.enlaces, paginas.enlaces), "
+                "encontrada = excluded.encontrada",
+                (url, self.dominio, ahora, cabeceras.get('ETag'), cabeceras.get('Last-Modified'), hash,
+                 json.dumps(enlaces) if enlaces is not None else None, int(encontrada)),
+            )
+            self._ultimas_visitas[url] = ahora
+            self._pendientes += 1
+            if self._pendientes >= LOTE_COMMIT:
+                self._conexion.commit()
+                self._pendientes = 0
+
+    def finalizar(self, urls_encontradas):
+        """
+        Marca las URLs encontradas en esta ejecución y devuelve (añadidas, eliminadas)
+        respecto a la ejecución anterior
+        """
+        urls_encontradas = set(urls_encontradas)
+        anadidas = urls_encontradas - self.anteriores
+        eliminadas = self.anteriores - urls_encontradas
+        with self._lock:
+            self._conexion.executemany(
+                "UPDATE paginas SET encontrada = 0 WHERE url = ?", ((url,) for url in eliminadas)
+            )
+            self._conexion.executemany(
+                "UPDATE paginas SET encontrada = 1 WHERE url = ?", ((url,) for url in anadidas)
+            )
+            self._conexion.execute(
+                "INSERT INTO ejecuciones (dominio, inicio, fin, encontradas, anadidas, eliminadas) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (self.dominio, self.inicio, time.time(), len(urls_encontradas), len(anadidas), len(eliminadas)),
+            )
+            self._conexion.commit()
+            self._pendientes = 0
+        self.anteriores = urls_encontradas
+        return anadidas, eliminadas
+
+    def cerrar(self):
+        with self._lock:
+            self._conexion.commit()
+            self._conexion.close()
@@ -0,0 +1,62 @@
+"""
+Canal de eventos de progreso de un trabajo para enviarlos en streaming (SSE).
+
+Los eventos se numeran en orden de publicación; cada cliente lee desde su última
+posición, así que quien se conecta tarde (o se reconecta) recibe lo anterior. Solo
+se conservan los últimos `max_eventos`: un cliente que pide posiciones ya
+descartadas recibe los eventos desde la más antigua que queda, y la API web le
+envía antes una instantánea del estado del trabajo.
+"""
+import threading
+import time
+from collections import deque
+from itertools import islice
+
+# Eventos conservados por canal (uno por página rastreada, más los de estado)
+MAX_EVENTOS = 10_000
+
+
+class CanalEventos:
+    """
+    Cola acotada de eventos (tipo, datos) de solo anexado con espera para los lectores
+    """
+
+    def __init__(self, max_eventos=MAX_EVENTOS):
+        self._eventos = deque(maxlen=max_eventos)
+        # Eventos ya descartados por el límite: posición del primero que se conserva
+        self.descartados = 0
+        self._cond = threading.Condition()
+        self.cerrado_en = None
+
+    @property
+    def cerrado(self):
+        return self.cerrado_en is not None
+
+    def publicar(self, tipo, datos):
+        with self._cond:
+            if len(self._eventos) == self._eventos.maxlen:
+                self.descartados += 1
+            self._eventos.append((tipo, datos))
+            self._cond.notify_all()
+
+    def cerrar(self):
+        with self._cond:
+            if self.cerrado_en is None:
+                self.cerrado_en = time.time()
+            self._cond.notify_all()
+
+    def leer(self, desde, espera=15.0):
+        """
+        Devuelve (inicio, eventos, cerrado) con los eventos a partir de la posición `desde`,
+        esperando hasta `espera` segundos si todavía no hay ninguno nuevo. `inicio` es la
+        posición del primer evento devuelto: mayor que `desde` si esos eventos ya se descartaron.
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: len(self) > desde or self.cerrado_en is not None, espera)
+            inicio = max(desde, self.descartados)
+            eventos = list(islice(self._eventos, inicio - self.descartados, None))
+            return inicio, eventos, self.cerrado_en is not None
+
+    def __len__(self):
+        # Eventos publicados en total, incluidos los descartados
+        return self.descartados + len(self._eventos)
@@ -0,0 +1,102 @@
+"""
+Frontera de rastreo: URLs pendientes de visitar junto con su profundidad.
+
+En modo 'bfs' las URLs salen en orden de llegada, de modo que el sitio se recorre
+nivel a nivel. En modo 'prioridad' salen según una función de puntuación (menor
+primero). En ambos casos cada URL se admite una sola vez: un único conjunto
+recuerda todas las URLs vistas (pendientes o ya visitadas). Es un ConjuntoVistas,
+que guarda hashes de 64 bits en lugar de las URLs y pasa a disco por encima de un
+límite de memoria, de modo que la frontera escala a millones de URLs.
+"""
+import heapq
+import itertools
+from collections import deque
+from urllib.parse import urlparse
+
+from .vistas import ConjuntoVistas
+
+MODOS = ('bfs', 'prioridad')
+
+
+def prioridad_por_ruta(url, profundidad):
+    """
+    Puntuación por defecto del modo 'prioridad': primero las URLs menos profundas
+    y, dentro del mismo nivel, las de ruta más corta
+    """
+    ruta = urlparse(url).path
+    return (profundidad, ruta.count('/'), len(ruta))
+
+
+class Frontera:
+    """
+    Cola de URLs pendientes con deduplicación O(1) y control de profundidad máxima
+    """
+
+    def __init__(self, profundidad_maxima=None, modo='bfs', prioridad=prioridad_por_ruta, vistas=None):
+        if modo not in MODOS:
+            raise ValueError(f"Modo de frontera desconocido: {modo!r} (use {', '.join(MODOS)})")
+        self.profundidad_maxima = profundidad_maxima
+        self.modo = modo
+        self.prioridad = prioridad
+        self._vistas = vistas if vistas is not None else ConjuntoVistas()
+        self._cola = deque()
+        self._heap = []
+        self._orden = itertools.count()
+
+    def agregar(self, url, profundidad=0):
+        """
+        Añade la URL si no se ha visto antes y no supera la profundidad máxima.
+        Devuelve True si se ha añadido.
+        """
+        if self.profundidad_maxima is not None and profundidad > self.profundidad_maxima:
+            return False
+        if not self._vistas.agregar(url):
+            return False
+        if self.modo == 'bfs':
+            self._cola.append((url, profundidad))
+        else:
+            clave = self.prioridad(url, profundidad)
+            heapq.heappush(self._heap, (clave, next(self._orden), url, profundidad))
+        return True
+
+    def marcar_vista(self, url):
+        """
+        Registra una URL como ya vista sin encolarla (por ejemplo, al reanudar un rastreo)
+        """
+        self._vistas.agregar(url)
+
+    def siguiente(self):
+        """
+        Devuelve la siguiente tupla (url, profundidad) o None si no quedan URLs
+        """
+        if self.modo == 'bfs':
+            return self._cola.popleft() if self._cola else None
+        if not self._heap:
+            return None
+        _, _, url, profundidad = heapq.heappop(self._heap)
+        return url, profundidad
+
+    def admite_hijos(self, profundidad):
+        """
+        Indica si los enlaces de una página a esta profundidad entrarían en la frontera
+        """
+        return self.profundidad_maxima is None or profundidad < self.profundidad_maxima
+
+    @property
+    def vistas(self):
+        return len(self._vistas)
+
+    def estadisticas_vistas(self):
+        return self._vistas.estadisticas()
+
+    def cerrar(self):
+        """
+        Libera los archivos temporales del conjunto de URLs vistas
+        """
+        self._vistas.cerrar()
+
+    def __contains__(self, url):
+        return url in self._vistas
+
+    def __len__(self):
+        return len(self._cola) if self.modo == 'bfs' else len(self._heap)
@@ -0,0 +1,227 @@
+"""
+Métricas del rastreo en formato Prometheus, sin dependencias externas.
+
+Cada proceso tiene un registro global (`registro`) con contadores e histogramas
+etiquetados. Las fases de cada página se cronometran por separado:
+
+- 'dns': resolución del host (solo los fallos de la caché DNS).
+- 'connect': apertura de una conexión nueva (TCP + TLS), sin el DNS.
+- 'ttfb': desde el envío de la petición hasta recibir las cabeceras, sin DNS ni conexión.
+- 'download': lectura del cuerpo.
+- 'parse': extracción de enlaces del HTML.
+- 'classify': clasificación administrativa de la URL encontrada.
+
+`instantanea()` devuelve el contenido del registro como un dict serializable en
+JSON y `combinar` suma las de varios procesos (los workers del backend SQLite
+publican la suya en la base de datos de trabajos); `exportar` genera el texto
+que se sirve en /metrics. `exportar` admite también métricas de tipo 'gauge'
+(con el mismo formato que un contador) construidas aparte.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Límites superiores (segundos) de los cubos de los histogramas de duración
+LIMITES_DURACION = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+FASES = ('dns', 'connect', 'ttfb', 'download', 'parse', 'classify')
+
+
+class Contador:
+    """
+    Contador monotónico con una serie por combinación de valores de etiquetas
+    """
+    tipo = 'counter'
+
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def incrementar(self, *valores, cantidad=1):
+        with self._lock:
+            self._series[valores] = self._series.get(valores, 0) + cantidad
+
+    def series(self):
+        with self._lock:
+            return [[list(valores), total] for valores, total in self._series.items()]
+
+
+class Histograma:
+    """
+    Histograma de cubos fijos: por serie guarda las observaciones de cada cubo, su suma y su número
+    """
+    tipo = 'histogram'
+
+    def __init__(self, nombre, ayuda, etiquetas=(), limites=LIMITES_DURACION):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self.limites = tuple(limites)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observar(self, valor, *valores):
+        # El último cubo es +Inf
+        cubo = bisect_left(self.limites, valor)
+        with self._lock:
+            serie = self._series.get(valores)
+            if serie is None:
+                serie = self._series[valores] = [[0] * (len(self.limites) + 1), 0.0, 0]
+            serie[0][cubo] += 1
+            serie[1] += valor
+            serie[2] += 1
+
+    def observar_lote(self, observaciones, *valores):
+        """
+        Registra varias observaciones de la misma serie tomando el lock una sola vez
+        """
+        cubos = [bisect_left(self.limites, valor) for valor in observaciones]
+        with self._lock:
+            serie = self._series.get(valores)
+            if serie is None:
+                serie = self._series[valores] = [[0] * (len(self.limites) + 1), 0.0, 0]
+            for cubo in cubos:
+                serie[0][cubo] += 1
+            serie[1] += sum(observaciones)
+            serie[2] += len(observaciones)
+
+    def series(self):
+        with self._lock:
+            return [[list(valores), [list(cubos), suma, n]] for valores, (cubos, suma, n) in self._series.items()]
+
+
+class RegistroMetricas:
+    def __init__(self):
+        self._metricas = {}
+
+    def contador(self, nombre, ayuda, etiquetas=()):
+        return self._registrar(Contador(nombre, ayuda, etiquetas))
+
+    def histograma(self, nombre, ayuda, etiquetas=(), limites=LIMITES_DURACION):
+        return self._registrar(Histograma(nombre, ayuda, etiquetas, limites))
+
+    def _registrar(self, metrica):
+        if metrica.nombre in self._metricas:
+            raise ValueError(f"Métrica ya registrada: {metrica.nombre}")
+        self._metricas[metrica.nombre] = metrica
+        return metrica
+
+    def instantanea(self):
+        return {
+            nombre: {
+                'tipo': metrica.tipo,
+                'ayuda': metrica.ayuda,
+                'etiquetas': list(metrica.etiquetas),
+                'limites': list(getattr(metrica, 'limites', ())),
+                'series': metrica.series(),
+            }
+            for nombre, metrica in self._metricas.items()
+        }
+
+    def exportar(self):
+        return exportar(self.instantanea())
+
+
+def combinar(instantaneas):
+    """
+    Suma instantáneas de varios procesos serie a serie
+    """
+    resultado = {}
+    for instantanea in instantaneas:
+        for nombre, metrica in instantanea.items():
+            destino = resultado.setdefault(nombre, {**metrica, 'series': {}})
+            for valores, dato in metrica['series']:
+                clave = tuple(valores)
+                anterior = destino['series'].get(clave)
+                if anterior is None:
+                    destino['series'][clave] = dato if metrica['tipo'] == 'counter' else \
+                        [list(dato[0]), dato[1], dato[2]]
+                elif metrica['tipo'] == 'counter':
+                    destino['series'][clave] = anterior + dato
+                else:
+                    anterior[0] = [a + b for a, b in zip(anterior[0], dato[0])]
+                    anterior[1] += dato[1]
+                    anterior[2] += dato[2]
+    for metrica in resultado.values():
+        metrica['series'] = [[list(valores), dato] for valores, dato in metrica['series'].items()]
+    return resultado
+
+
+def indicador(ayuda, etiquetas, valores):
+    """
+    Métrica 'gauge' para `exportar`: `valores` asocia cada tupla de valores de etiquetas a su valor actual
+    """
+    return {'tipo': 'gauge', 'ayuda': ayuda, 'etiquetas': list(etiquetas), 'limites': [],
+            'series': [[list(clave), valor] for clave, valor in valores.items()]}
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _etiquetas(nombres, valores, extra=None):
+    pares = [f'{nombre}="{_escapar(valor)}"' for nombre, valor in zip(nombres, valores)]
+    if extra is not None:
+        pares.append(f'{extra[0]}="{extra[1]}"')
+    return '{' + ','.join(pares) + '}' if pares else ''
+
+
+def _numero(valor):
+    if valor == float('inf'):
+        return '+Inf'
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+def exportar(instantanea):
+    """
+    Texto en el formato de exposición de Prometheus (versión 0.0.4)
+    """
+    lineas = []
+    for nombre, metrica in sorted(instantanea.items()):
+        lineas.append(f"# HELP {nombre} {metrica['ayuda']}")
+        lineas.append(f"# TYPE {nombre} {metrica['tipo']}")
+        nombres = metrica['etiquetas']
+        for valores, dato in sorted(metrica['series'], key=lambda serie: serie[0]):
+            if metrica['tipo'] != 'histogram':
+                lineas.append(f"{nombre}{_etiquetas(nombres, valores)} {_numero(dato)}")
+                continue
+            cubos, suma, n = dato
+            acumulado = 0
+            for limite, cantidad in zip(list(metrica['limites']) + [float('inf')], cubos):
+                acumulado += cantidad
+                lineas.append(f"{nombre}_bucket{_etiquetas(nombres, valores, ('le', _numero(limite)))} {acumulado}")
+            lineas.append(f"{nombre}_sum{_etiquetas(nombres, valores)} {_numero(suma)}")
+            lineas.append(f"{nombre}_count{_etiquetas(nombres, valores)} {n}")
+    return '\n'.join(lineas) + '\n'
+
+
+registro = RegistroMetricas()
+
+DURACION_FASES = registro.histograma(
+    'crawler_phase_seconds', 'Time spent in each phase of fetching and processing a page',
+    ('phase', 'host'))
+PETICIONES = registro.contador(
+    'crawler_requests_total', 'HTTP requests sent while crawling, by response status (error: no response)',
+    ('host', 'status'))
+PAGINAS = registro.contador(
+    'crawler_pages_total', 'Pages processed by the crawl engine, by outcome', ('host', 'result'))
+BYTES_RESPUESTA = registro.contador(
+    'crawler_response_bytes_total', 'Body bytes read from HTML responses', ('host',))
+PETICIONES_EVITADAS = registro.contador(
+    'crawler_fetches_saved_total', 'Fetches avoided by URL canonicalization (folded URL variants, learned redirects)',
+    ('host', 'reason'))
+
+
+@contextmanager
+def cronometrar(fase, host):
+    """
+    Registra en crawler_phase_seconds la duración del bloque
+    """
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        DURACION_FASES.observar(time.perf_counter() - inicio, fase, host)
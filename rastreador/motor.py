@@ -0,0 +1,429 @@
+"""
+Motor de rastreo concurrente basado en asyncio.
+
+Las peticiones HTTP (un GET en streaming por página) siguen usando `requests`,
+pero se ejecutan en un pool de hilos coordinado por asyncio, con un límite global
+de peticiones simultáneas y otro por host.
+
+El progreso se escribe con logging (logger 'rastreador.motor'): una línea INFO por
+página y WARNING por cada fallo, con la URL y el estado HTTP en `extra`. El
+resultado de cada página y la duración del análisis de enlaces se registran en
+rastreador.metricas.
+
+Los enlaces, la URL base y las semillas pasan por un Canonizador (rastreador.canonico)
+antes de llegar a la frontera, de modo que cada página lógica se pide una sola vez, y
+los enlaces y las semillas fuera del alcance (rastreador.alcance) no llegan a encolarse.
+"""
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+from .alcance import Alcance
+from .canonico import Canonizador
+from .cliente import descargar_pagina, LIMITE_BYTES_PAGINA
+from .constantes import CONCURRENCIA_GLOBAL, CONCURRENCIA_POR_HOST, LIMITE_PAGINAS, MEMORIA_VISTAS
+from .cortesia import ControlCortesia, ESTADOS_SOBRECARGA
+from .enlaces import extraer_enlaces, resolver_backend
+from .estado import hash_contenido
+from .frontera import Frontera
+from .metricas import PAGINAS, cronometrar
+from .vistas import ConjuntoVistas
+
+logger = logging.getLogger(__name__)
+
+# Reintentos de una página cuando el servidor responde que está saturado (429, 503...)
+REINTENTOS_SOBRECARGA = 2
+
+
+class MotorRastreo:
+    """
+    Explora un sitio web a partir de una URL base usando varias peticiones en paralelo
+    """
+
+    def __init__(self, url_base, profundidad_maxima=2, concurrencia=CONCURRENCIA_GLOBAL,
+                 concurrencia_por_host=CONCURRENCIA_POR_HOST, pausa=None,
+                 limite_paginas=LIMITE_PAGINAS, limite_bytes=LIMITE_BYTES_PAGINA,
+                 modo_frontera='bfs', extractor='auto', cache=None, estado=None, edad_maxima=None,
+                 checkpoint=None, observador=None, robots=None, semillas=None, memoria_vistas=MEMORIA_VISTAS,
+                 canonico=None, alcance=None):
+        # Reglas de alcance: qué enlaces se encolan (por defecto, todos los del sitio salvo los archivos)
+        self.alcance = alcance if alcance is not None else Alcance().fijar_base(urlparse(url_base).netloc)
+        # Reglas de canonicalización de las URLs del sitio (por defecto las de Canonizador)
+        self.canonico = canonico if canonico is not None else \
+            Canonizador(url_base, memoria_vistas=memoria_vistas, admitir_host=self.alcance.admite_host)
+        self.url_base = self.canonico.canonizar(url_base) or url_base
+        self.dominio_base = urlparse(self.url_base).netloc
+        self.profundidad_maxima = profundidad_maxima
+        self.concurrencia = max(1, int(concurrencia))
+        self.concurrencia_por_host = max(1, int(concurrencia_por_host))
+        self.pausa = pausa
+        self.limite_paginas = limite_paginas
+        self.limite_bytes = limite_bytes
+        self.extractor = resolver_backend(extractor)
+        self.cache = cache
+
+        # Modo incremental: estado de ejecuciones anteriores; se visitan primero las páginas más antiguas
+        self.estado = estado
+        self.edad_maxima = edad_maxima
+        # Las URLs vistas se guardan como hashes; por encima de memoria_vistas bytes (menos la parte que
+        # reservan las estadísticas del Canonizador) pasan a disco
+        vistas = ConjuntoVistas(memoria_maxima=max(memoria_vistas - self.canonico.memoria_reservada,
+                                                   memoria_vistas // 2))
+        if estado is not None:
+            self.frontera = Frontera(profundidad_maxima=profundidad_maxima, modo='prioridad',
+                                     prioridad=estado.prioridad, vistas=vistas)
+        else:
+            self.frontera = Frontera(profundidad_maxima=profundidad_maxima, modo=modo_frontera, vistas=vistas)
+        self.urls_encontradas = set()
+        self.paginas_visitadas = 0
+        self.errores = 0
+        self._lock_errores = threading.Lock()
+
+        # observador(evento, datos) recibe el progreso: 'pagina' tras cada página y 'fin' al terminar
+        self.observador = observador
+
+        # Registro de checkpoint (rastreador.checkpoint.Checkpoint) para poder reanudar
+        self.checkpoint = checkpoint
+
+        # Reglas de robots.txt (rastreador.robots.ReglasRobots): las URLs no permitidas no se encolan
+        self.robots = robots
+        self.bloqueadas_robots = 0
+        # URLs iniciales además de la base (por ejemplo, las de los sitemaps), con profundidad 1
+        self.semillas = semillas
+        # Página desde la que se encoló cada URL pendiente (se informa al observador)
+        self._padres = {}
+
+        # Sin pausa fija, el ritmo de peticiones de cada host se adapta a sus respuestas
+        # (respetando el Crawl-delay de robots.txt para el dominio base)
+        self.cortesia = None
+        if pausa is None:
+            retrasos = {self.dominio_base: robots.retraso} if robots is not None and robots.retraso else None
+            self.cortesia = ControlCortesia(rafaga=self.concurrencia_por_host, retrasos=retrasos)
+
+        # Cada elemento de la cola representa una URL pendiente en la frontera;
+        # la frontera decide cuál se visita (orden BFS o por prioridad)
+        self._cola = None
+        self._semaforos_host = {}
+        self._executor = None
+
+    def ejecutar(self):
+        """
+        Ejecuta el rastreo completo y devuelve el conjunto de URLs encontradas
+        """
+        try:
+            return asyncio.run(self.rastrear())
+        finally:
+            # También ante KeyboardInterrupt: el progreso queda en disco para reanudar
+            if self.checkpoint is not None:
+                self.checkpoint.cerrar()
+            self.frontera.cerrar()
+            self.canonico.cerrar()
+
+    async def rastrear(self):
+        self._cola = asyncio.Queue()
+        self._semaforos_host = {}
+        previo = self.checkpoint.previo if self.checkpoint is not None else None
+        if previo is not None:
+            self._restaurar(previo)
+        else:
+            self._encolar(self.url_base, 0)
+            if self.semillas is not None:
+                for url in self.semillas:
+                    url = self.canonico.canonizar(url)
+                    if url is not None and self.alcance.admite(url):
+                        self._encolar(url, 1)
+                logger.info("URLs iniciales en la frontera: %d", len(self.frontera))
+
+        with ThreadPoolExecutor(max_workers=self.concurrencia) as executor:
+            self._executor = executor
+            trabajadores = [asyncio.create_task(self._trabajador()) for _ in range(self.concurrencia)]
+            await self._cola.join()
+            for trabajador in trabajadores:
+                trabajador.cancel()
+            await asyncio.gather(*trabajadores, return_exceptions=True)
+            self._executor = None
+
+        if self.checkpoint is not None:
+            self.checkpoint.terminar()
+        if self.observador is not None:
+            self.observador('fin', self._progreso())
+        logger.info("Exploración completada. URLs encontradas: %d", len(self.urls_encontradas),
+                    extra={'visitadas': self.paginas_visitadas, 'encontradas': len(self.urls_encontradas),
+                           'errores': self.errores})
+        if self.bloqueadas_robots:
+            logger.info("URLs no rastreadas por robots.txt: %d", self.bloqueadas_robots)
+        if self.alcance.descartadas:
+            logger.info("Enlaces fuera del alcance descartados sin petición: %d", self.alcance.descartadas)
+        canonicalizacion = self.canonico.estadisticas()
+        if canonicalizacion['peticiones_evitadas']:
+            logger.info("Peticiones evitadas por la canonicalización de URLs: %d (%d variantes de URL, "
+                        "%d redirecciones aprendidas)", canonicalizacion['peticiones_evitadas'],
+                        canonicalizacion['variantes_plegadas'], canonicalizacion['redirecciones_aprendidas'],
+                        extra=canonicalizacion)
+        vistas = self.frontera.estadisticas_vistas()
+        if vistas['volcados']:
+            logger.info("URLs vistas: %d (%d MB en memoria, %d MB en disco)", vistas['entradas'],
+                        vistas['bytes_memoria'] // (1024 * 1024), vistas['bytes_disco'] // (1024 * 1024))
+        for host, estado in self._estado_hosts().items():
+            logger.info("Ritmo en %s: %s peticiones/s efectivas (límite final %s/s, %d respuestas de saturación, "
+                        "%s s de espera)", host, estado['effective_rps'], estado['rate_limit_rps'],
+                        estado['throttled'], estado['waited_s'], extra={'host': host})
+        return self.urls_encontradas
+
+    def _restaurar(self, previo):
+        """
+        Reconstruye la frontera y los resultados a partir de un checkpoint
+        """
+        self.urls_encontradas.update(previo.resultados)
+        self.paginas_visitadas = len(previo.visitadas)
+        for url in previo.visitadas:
+            self.frontera.marcar_vista(url)
+        pendientes = previo.pendientes
+        for url, profundidad in pendientes:
+            if self.frontera.agregar(url, profundidad):
+                self._cola.put_nowait(None)
+        logger.info("Reanudando rastreo: %d páginas ya visitadas, %d pendientes, %d URLs encontradas",
+                    len(previo.visitadas), len(pendientes), len(previo.resultados))
+
+    def _encolar(self, url, profundidad, padre=None):
+        if self.robots is not None and url not in self.frontera and not self.robots.permitida(url):
+            # Se marca como vista para no volver a evaluarla cada vez que aparezca enlazada
+            self.frontera.marcar_vista(url)
+            self.bloqueadas_robots += 1
+            return
+        if self.frontera.agregar(url, profundidad):
+            self._cola.put_nowait(None)
+            if padre is not None and self.observador is not None:
+                self._padres[url] = padre
+            if self.checkpoint is not None:
+                self.checkpoint.encolada(url, profundidad)
+
+    def _semaforo_para(self, url):
+        host = urlparse(url).netloc
+        semaforo = self._semaforos_host.get(host)
+        if semaforo is None:
+            semaforo = asyncio.Semaphore(self.concurrencia_por_host)
+            self._semaforos_host[host] = semaforo
+        return semaforo
+
+    async def _trabajador(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._cola.get()
+            url_actual = None
+            estado = None
+            try:
+                url_actual, profundidad = self.frontera.siguiente()
+                padre = self._padres.pop(url_actual, None)
+
+                # Límite de seguridad opcional
+                if self.limite_paginas is not None and self.paginas_visitadas >= self.limite_paginas:
+                    continue
+
+                self.paginas_visitadas += 1
+                logger.info("Explorando: %s (profundidad %d, página %d)", url_actual, profundidad,
+                            self.paginas_visitadas, extra={'url': url_actual, 'profundidad': profundidad})
+
+                analizar_enlaces = self.frontera.admite_hijos(profundidad)
+                async with self._semaforo_para(url_actual):
+                    enlaces, estado = await loop.run_in_executor(
+                        self._executor, self._procesar_pagina, url_actual, analizar_enlaces
+                    )
+                    self._plegar_redireccion(url_actual)
+                    if enlaces is None:
+                        self._marcar_visitada(url_actual)
+                        self._notificar(url_actual, profundidad, False, estado, padre)
+                        continue
+
+                    self.urls_encontradas.add(url_actual)
+                    if self.checkpoint is not None:
+                        self.checkpoint.resultado(url_actual)
+                    for enlace in enlaces:
+                        self._encolar(enlace, profundidad + 1, url_actual)
+                    self._marcar_visitada(url_actual)
+                    self._notificar(url_actual, profundidad, True, estado, padre)
+
+                    # Pequeña pausa para no saturar el servidor
+                    if self.pausa:
+                        await asyncio.sleep(self.pausa)
+            except Exception as e:
+                logger.warning("  Error al procesar %s: %s", url_actual, e, extra={'url': url_actual})
+                if url_actual is not None:
+                    PAGINAS.incrementar(urlparse(url_actual).netloc, 'error')
+                    self._contar_error()
+                    self._marcar_visitada(url_actual)
+                    self._notificar(url_actual, profundidad, False, estado, padre)
+            finally:
+                self._cola.task_done()
+
+    def _plegar_redireccion(self, url):
+        # Si la página redirigió a otra URL del sitio, el destino ya está descargado: no se vuelve a pedir
+        destino = self.canonico.redireccion(url)
+        if destino is not None and destino not in self.frontera:
+            self.frontera.marcar_vista(destino)
+            self.canonico.contar_redireccion_evitada()
+
+    def _marcar_visitada(self, url):
+        if self.checkpoint is not None:
+            self.checkpoint.visitada(url)
+
+    def _contar_error(self):
+        # Se llama también desde los hilos del pool
+        with self._lock_errores:
+            self.errores += 1
+
+    def _progreso(self):
+        return {
+            'visitadas': self.paginas_visitadas,
+            'pendientes': len(self.frontera),
+            'encontradas': len(self.urls_encontradas),
+            'errores': self.errores,
+            'hosts': self._estado_hosts(),
+            'canonicalizacion': self.canonico.estadisticas(),
+            'fuera_de_alcance': self.alcance.descartadas,
+        }
+
+    def _estado_hosts(self):
+        return self.cortesia.estado() if self.cortesia is not None else {}
+
+    def _notificar(self, url, profundidad, encontrada, estado=None, padre=None):
+        if self.observador is None:
+            return
+        datos = self._progreso()
+        datos.update(url=url, profundidad=profundidad, encontrada=encontrada, estado=estado, padre=padre)
+        try:
+            self.observador('pagina', datos)
+        except Exception as e:
+            logger.warning("  Error en el observador de progreso: %s", e, extra={'url': url})
+
+    def _procesar_pagina(self, url_actual, analizar_enlaces=True):
+        """
+        Descarga y analiza una página (se ejecuta en un hilo del pool).
+        Devuelve (enlaces, estado): la lista de enlaces del mismo dominio (None si la página
+        no es válida) y el código HTTP de la respuesta (None si no hubo petición).
+        En el último nivel de profundidad no se analizan los enlaces.
+        """
+        host = urlparse(url_actual).netloc
+        guardada = self.estado.obtener(url_actual) if self.estado is not None else None
+        reutilizable = guardada is not None and (guardada.enlaces is not None or not analizar_enlaces)
+
+        # Modo incremental: las páginas visitadas recientemente no se vuelven a pedir
+        if reutilizable and self.edad_maxima is not None \
+                and time.time() - guardada.ultima_visita < self.edad_maxima:
+            self.estado.contar('sin_peticion')
+            PAGINAS.incrementar(host, 'fresh')
+            if not guardada.encontrada:
+                return None, None
+            return (guardada.enlaces if analizar_enlaces else []), None
+
+        try:
+            respuesta = self._descargar(url_actual, validadores=guardada.validadores() if reutilizable else None)
+        except Exception as e:
+            logger.warning("  Error en GET para %s: %s", url_actual, e, extra={'url': url_actual})
+            PAGINAS.incrementar(host, 'error')
+            self._contar_error()
+            self._registrar_estado(url_actual, False)
+            return None, None
+        if respuesta.url_final != url_actual:
+            self.canonico.aprender_redireccion(url_actual, respuesta.url_final)
+
+        if respuesta.estado == 304:
+            # Sin cambios desde la última visita: se reutilizan los enlaces guardados
+            self.estado.contar('no_modificadas')
+            PAGINAS.incrementar(host, 'not_modified')
+            self._registrar_estado(url_actual, True, cabeceras=respuesta.cabeceras)
+            return (guardada.enlaces if analizar_enlaces else []), respuesta.estado
+        if respuesta.motivo == 'estado':
+            logger.warning("  Error: Código %s para %s", respuesta.estado, url_actual,
+                           extra={'url': url_actual, 'estado': respuesta.estado})
+            PAGINAS.incrementar(host, 'error')
+            self._contar_error()
+            self._registrar_estado(url_actual, False)
+            return None, respuesta.estado
+        if respuesta.motivo == 'archivo':
+            logger.info("  Saltando archivo: %s", url_actual, extra={'url': url_actual})
+            PAGINAS.incrementar(host, 'skipped')
+            return None, respuesta.estado
+        if not respuesta.es_html:
+            logger.info("  Saltando contenido no HTML (%s): %s", respuesta.motivo, url_actual,
+                        extra={'url': url_actual, 'motivo': respuesta.motivo})
+            PAGINAS.incrementar(host, 'skipped')
+            self._registrar_estado(url_actual, False)
+            return None, respuesta.estado
+
+        hash = hash_contenido(respuesta.contenido) if self.estado is not None else None
+        if reutilizable and hash == guardada.hash:
+            self.estado.contar('mismo_contenido')
+            PAGINAS.incrementar(host, 'unchanged')
+            self._registrar_estado(url_actual, True, cabeceras=respuesta.cabeceras, hash=hash)
+            return (guardada.enlaces if analizar_enlaces else []), respuesta.estado
+        if guardada is not None:
+            self.estado.contar('cambiadas')
+
+        PAGINAS.incrementar(host, 'fetched')
+        if not analizar_enlaces:
+            self._registrar_estado(url_actual, True, cabeceras=respuesta.cabeceras, hash=hash)
+            return [], respuesta.estado
+
+        with cronometrar('parse', host):
+            enlaces = self._analizar_enlaces(respuesta)
+        self._registrar_estado(url_actual, True, enlaces=enlaces, cabeceras=respuesta.cabeceras, hash=hash)
+        return enlaces, respuesta.estado
+
+    def _descargar(self, url, validadores=None):
+        """
+        Descarga la página al ritmo que permite el limitador de su host. Las respuestas
+        de saturación se reintentan hasta REINTENTOS_SOBRECARGA veces, tras la espera
+        que imponga el limitador (incluido Retry-After).
+        """
+        if self.cortesia is None:
+            return descargar_pagina(url, limite_bytes=self.limite_bytes, cache=self.cache, validadores=validadores)
+
+        limitador = self.cortesia.limitador(urlparse(url).netloc)
+        for intento in range(REINTENTOS_SOBRECARGA + 1):
+            inicio = []
+
+            def turno():
+                espera = limitador.reservar()
+                if espera > 0:
+                    time.sleep(espera)
+                inicio.append(time.monotonic())
+
+            try:
+                respuesta = descargar_pagina(url, limite_bytes=self.limite_bytes, cache=self.cache,
+                                             validadores=validadores, antes_de_pedir=turno)
+            except Exception:
+                if inicio:
+                    limitador.registrar(None, time.monotonic() - inicio[0])
+                raise
+            if not inicio:
+                # Servida por la caché HTTP sin petición de red
+                return respuesta
+            limitador.registrar(respuesta.estado, time.monotonic() - inicio[0],
+                                respuesta.cabeceras.get('Retry-After'))
+            if respuesta.estado not in ESTADOS_SOBRECARGA or intento == REINTENTOS_SOBRECARGA:
+                return respuesta
+            logger.warning("  Servidor saturado (%s), se reintentará: %s", respuesta.estado, url,
+                           extra={'url': url, 'estado': respuesta.estado})
+
+    def _analizar_enlaces(self, respuesta):
+        """
+        Extrae los enlaces del mismo sitio dentro del alcance, canonizados, sin construir el árbol DOM
+        """
+        canonizar = self.canonico.canonizar
+        admite = self.alcance.admite
+        enlaces = []
+        for full_url in extraer_enlaces(respuesta.contenido, respuesta.url_final,
+                                        backend=self.extractor, charset=respuesta.charset):
+            # None si es de otro dominio
+            url = canonizar(full_url)
+            if url is not None and admite(url):
+                enlaces.append(url)
+        return enlaces
+
+    def _registrar_estado(self, url, encontrada, **datos):
+        if self.estado is not None:
+            self.estado.registrar(url, encontrada, **datos)
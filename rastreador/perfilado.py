@@ -0,0 +1,253 @@
+"""
+Perfilado bajo demanda de un rastreo (CPU y memoria) sin reiniciar el proceso.
+
+`Perfilador(directorio, modo)` se inicia antes del rastreo y se detiene al
+terminar; deja en `directorio` los artefactos:
+
+- modo 'cprofile': perfil determinista del hilo que lo inicia (el bucle de
+  asyncio) y de los hilos creados mientras está activo (el pool de descargas).
+  perfil.pstats (para pstats, snakeviz...) y perfil.txt (funciones ordenadas por
+  tiempo acumulado y por tiempo propio).
+- modo 'muestreo': un hilo toma cada `intervalo` segundos la pila de los mismos
+  hilos (sys._current_frames). Es tiempo real, no de CPU, y cuesta mucho menos
+  que cProfile en sitios grandes. muestras.txt tiene las pilas en formato
+  "collapsed" (una por línea con su número de muestras, la entrada de
+  flamegraph.pl o speedscope) y muestras_top.txt las funciones con más
+  muestras propias e inclusivas.
+- En los dos modos, memoria.txt: pico de memoria de Python y las líneas que más
+  memoria tienen asignada al final del rastreo (tracemalloc; `capturar_memoria()`
+  fija el momento de la instantánea).
+
+En un proceso que ejecuta varios rastreos a la vez, los hilos de otro rastreo
+creados mientras el perfilador está activo también aparecen en el perfil. Solo
+puede haber un perfil cProfile activo por proceso; si ya lo hay, se usa el modo
+'muestreo'.
+"""
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+MODOS_PERFIL = ('cprofile', 'muestreo')
+INTERVALO_MUESTREO = 0.005
+# Funciones y líneas incluidas en los informes de texto
+TOP_PERFIL = 40
+TOP_MEMORIA = 30
+
+# Desde Python 3.12 cProfile usa sys.monitoring: un único perfil ve todos los hilos
+_PERFIL_GLOBAL = sys.version_info >= (3, 12)
+
+_lock = threading.Lock()
+_cprofile_activo = False
+# Perfiladores que usan tracemalloc y si lo activaron ellos (si ya estaba activo no se detiene)
+_usos_tracemalloc = 0
+_tracemalloc_propio = False
+
+
+def _iniciar_tracemalloc():
+    global _usos_tracemalloc, _tracemalloc_propio
+    with _lock:
+        if _usos_tracemalloc == 0:
+            _tracemalloc_propio = not tracemalloc.is_tracing()
+            if _tracemalloc_propio:
+                tracemalloc.start()
+        _usos_tracemalloc += 1
+
+
+def _detener_tracemalloc():
+    global _usos_tracemalloc
+    with _lock:
+        _usos_tracemalloc -= 1
+        if _usos_tracemalloc == 0 and _tracemalloc_propio:
+            tracemalloc.stop()
+
+
+def _nombre_funcion(codigo):
+    return f"{codigo.co_name} ({os.path.basename(codigo.co_filename)}:{codigo.co_firstlineno})"
+
+
+class _Muestreador(threading.Thread):
+    """
+    Hilo que cuenta las pilas de los hilos vigilados
+    """
+
+    def __init__(self, intervalo, excluidos):
+        super().__init__(name='perfilador-muestreo', daemon=True)
+        self.intervalo = intervalo
+        self.excluidos = excluidos
+        self.pilas = Counter()
+        self.muestras = 0
+        self._parar = threading.Event()
+
+    def run(self):
+        excluidos = self.excluidos | {threading.get_ident()}
+        while not self._parar.wait(self.intervalo):
+            self.muestras += 1
+            for ident, frame in sys._current_frames().items():
+                if ident in excluidos:
+                    continue
+                pila = []
+                while frame is not None:
+                    pila.append(_nombre_funcion(frame.f_code))
+                    frame = frame.f_back
+                self.pilas[tuple(reversed(pila))] += 1
+
+    def parar(self):
+        self._parar.set()
+        self.join()
+
+
+class Perfilador:
+    """
+    Perfil de CPU ('cprofile' o 'muestreo') y de memoria de lo que se ejecute entre
+    `iniciar()` y `detener()`; también sirve como gestor de contexto
+    """
+
+    def __init__(self, directorio, modo='cprofile', intervalo=INTERVALO_MUESTREO):
+        if modo not in MODOS_PERFIL:
+            raise ValueError(f"Modo de perfil desconocido: {modo!r} (use {', '.join(MODOS_PERFIL)})")
+        self.directorio = directorio
+        self.modo = modo
+        self.intervalo = intervalo
+        self.artefactos = {}
+        self._perfiles = []
+        self._muestreador = None
+        self._inicio = None
+        self._memoria = None
+        self.detenido = False
+
+    def iniciar(self):
+        global _cprofile_activo
+        if self.modo == 'cprofile':
+            with _lock:
+                if _cprofile_activo:
+                    self.modo = 'muestreo'
+                else:
+                    _cprofile_activo = True
+        self._inicio = time.perf_counter()
+        _iniciar_tracemalloc()
+        if self.modo == 'cprofile':
+            if not _PERFIL_GLOBAL:
+                # Cada hilo nuevo activa su propio perfil en su primer evento
+                threading.setprofile(self._perfilar_hilo)
+            perfil = cProfile.Profile()
+            self._perfiles.append(perfil)
+            perfil.enable()
+        else:
+            # Los hilos que ya existían (servidor web, otros trabajadores) no se muestrean,
+            # salvo el que inicia el perfil
+            excluidos = {hilo.ident for hilo in threading.enumerate()} - {threading.get_ident()}
+            self._muestreador = _Muestreador(self.intervalo, excluidos)
+            self._muestreador.start()
+        return self
+
+    def _perfilar_hilo(self, frame, evento, argumento):
+        perfil = cProfile.Profile()
+        self._perfiles.append(perfil)
+        perfil.enable()
+
+    def detener(self):
+        """
+        Detiene el perfil, escribe los artefactos y devuelve {nombre: ruta}
+        """
+        global _cprofile_activo
+        if self.detenido:
+            return self.artefactos
+        self.detenido = True
+        duracion = time.perf_counter() - self._inicio
+        os.makedirs(self.directorio, exist_ok=True)
+        if self.modo == 'cprofile':
+            if not _PERFIL_GLOBAL:
+                threading.setprofile(None)
+            for perfil in self._perfiles:
+                perfil.disable()
+            with _lock:
+                _cprofile_activo = False
+            self._escribir_cprofile(duracion)
+        else:
+            self._muestreador.parar()
+            self._escribir_muestras(duracion)
+        self._escribir_memoria()
+        self._memoria = None
+        _detener_tracemalloc()
+        return self.artefactos
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *exc):
+        self.detener()
+
+    def _ruta(self, nombre):
+        ruta = self.artefactos[nombre] = os.path.join(self.directorio, nombre)
+        return ruta
+
+    def _escribir_cprofile(self, duracion):
+        estadisticas = pstats.Stats(*self._perfiles)
+        estadisticas.dump_stats(self._ruta('perfil.pstats'))
+        texto = io.StringIO()
+        estadisticas.stream = texto
+        texto.write(f"Perfil cProfile: {duracion:.2f} s, {len(self._perfiles)} hilos\n\n")
+        estadisticas.sort_stats('cumulative').print_stats(TOP_PERFIL)
+        estadisticas.sort_stats('tottime').print_stats(TOP_PERFIL)
+        with open(self._ruta('perfil.txt'), 'w', encoding='utf-8') as f:
+            f.write(texto.getvalue())
+
+    def _escribir_muestras(self, duracion):
+        pilas = self._muestreador.pilas
+        with open(self._ruta('muestras.txt'), 'w', encoding='utf-8') as f:
+            for pila, cantidad in pilas.most_common():
+                f.write(';'.join(pila) + f" {cantidad}\n")
+        propias = Counter()
+        inclusivas = Counter()
+        for pila, cantidad in pilas.items():
+            propias[pila[-1]] += cantidad
+            for funcion in set(pila):
+                inclusivas[funcion] += cantidad
+        total = sum(pilas.values()) or 1
+        with open(self._ruta('muestras_top.txt'), 'w', encoding='utf-8') as f:
+            f.write(f"Perfil por muestreo: {duracion:.2f} s, {self._muestreador.muestras} muestras cada "
+                    f"{self.intervalo * 1000:g} ms, {total} pilas de hilos\n")
+            for titulo, contador in (('Muestras propias (la función estaba en ejecución)', propias),
+                                     ('Muestras inclusivas (la función estaba en la pila)', inclusivas)):
+                f.write(f"\n{titulo}:\n")
+                for funcion, cantidad in contador.most_common(TOP_PERFIL):
+                    f.write(f"{cantidad:>8} {cantidad / total:>6.1%}  {funcion}\n")
+
+    def capturar_memoria(self):
+        """
+        Toma la instantánea de memoria del informe en este momento (por ejemplo, al final del
+        rastreo, antes de liberar la frontera); sin llamarla se toma en `detener()`
+        """
+        actual, pico = tracemalloc.get_traced_memory()
+        self._memoria = (actual, pico, tracemalloc.take_snapshot())
+
+    def observador(self, evento, datos):
+        """
+        Observador de MotorRastreo: toma la instantánea de memoria al terminar el rastreo
+        """
+        if evento == 'fin':
+            self.capturar_memoria()
+
+    def _escribir_memoria(self):
+        if self._memoria is None:
+            self.capturar_memoria()
+        actual, pico, instantanea = self._memoria
+        estadisticas = instantanea.filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        )).statistics('lineno')
+        with open(self._ruta('memoria.txt'), 'w', encoding='utf-8') as f:
+            f.write(f"Memoria de Python (tracemalloc): {actual / 2 ** 20:.1f} MB en la instantánea, "
+                    f"pico {pico / 2 ** 20:.1f} MB\n\n")
+            f.write("Líneas con más memoria asignada en la instantánea:\n")
+            for estadistica in estadisticas[:TOP_MEMORIA]:
+                marco = estadistica.traceback[0]
+                f.write(f"{estadistica.size / 1024:>10.1f} KB {estadistica.count:>8} bloques  "
+                        f"{marco.filename}:{marco.lineno}\n")
@@ -0,0 +1,249 @@
+"""
+Planificadores de trabajos de rastreo.
+
+PlanificadorTrabajos ejecuta los trabajos en un número fijo de hilos del propio
+proceso:
+
+- Como mucho `trabajadores` rastreos se ejecutan a la vez; el resto espera en una
+  cola de tamaño `capacidad`. Con la cola llena, `enviar` lanza ColaLlena con una
+  estimación de cuándo volver a intentarlo.
+- Las peticiones idénticas (misma clave) mientras hay un trabajo en cola o en
+  ejecución se agrupan en ese trabajo en lugar de rastrear el sitio dos veces.
+- Por cada trabajo se mide el tiempo de espera en cola y el tiempo de ejecución.
+
+PlanificadorSQLite ofrece la misma interfaz sobre la cola de un
+AlmacenTrabajosSQLite: los procesos web solo encolan y los trabajos los ejecutan
+procesos aparte que llaman a `atender`. Mientras un trabajo se ejecuta, un hilo
+renueva su concesión en el almacén; si el proceso muere, el trabajo caduca.
+"""
+import threading
+import time
+import traceback
+from collections import deque
+from urllib.parse import urlparse
+
+# Peso de la última duración en la media móvil usada para estimar Retry-After
+_ALFA_MEDIA = 0.3
+
+
+def normalizar_objetivo(url):
+    """
+    Forma canónica de la URL pedida para agrupar peticiones idénticas:
+    sin esquema, sin 'www.', en minúsculas y sin barra final
+    """
+    url = url.strip().lower()
+    if '://' not in url:
+        url = 'http://' + url
+    partes = urlparse(url)
+    host = partes.netloc
+    if host.startswith('www.'):
+        host = host[4:]
+    return host + partes.path.rstrip('/')
+
+
+class ColaLlena(Exception):
+    """
+    La cola de trabajos está completa
+    """
+
+    def __init__(self, en_cola, reintentar_en):
+        super().__init__(f"Cola de trabajos llena ({en_cola} en espera)")
+        self.en_cola = en_cola
+        self.reintentar_en = reintentar_en
+
+
+class PlanificadorTrabajos:
+    """
+    Ejecuta `funcion(id_trabajo, *args)` en un grupo fijo de hilos.
+    `al_terminar(id_trabajo, metricas)` se llama (fuera del lock) cuando acaba cada trabajo.
+    """
+
+    def __init__(self, funcion, trabajadores=2, capacidad=20, al_terminar=None):
+        self.funcion = funcion
+        self.trabajadores = trabajadores
+        self.capacidad = capacidad
+        self.al_terminar = al_terminar
+        self._cond = threading.Condition()
+        self._pendientes = deque()   # (id_trabajo, clave, args)
+        self._activos = {}           # clave -> id_trabajo en cola o en ejecución
+        self._tiempos = {}           # id_trabajo -> {'encolado': t, 'inicio': t}
+        self._ocupados = 0
+        self._completados = 0
+        self._agrupados = 0
+        self._rechazados = 0
+        self._duracion_media = None
+        self._hilos = []
+
+    def _arrancar(self):
+        # Los hilos se crean en el primer envío (no al importar la aplicación)
+        while len(self._hilos) < self.trabajadores:
+            hilo = threading.Thread(target=self._bucle, name=f"trabajador-{len(self._hilos)}", daemon=True)
+            hilo.start()
+            self._hilos.append(hilo)
+
+    def enviar(self, id_trabajo, clave, *args):
+        """
+        Encola un trabajo. Devuelve (id_trabajo, nuevo): si ya hay un trabajo activo con
+        la misma clave se devuelve su id y nuevo=False. Lanza ColaLlena si no cabe.
+        """
+        with self._cond:
+            existente = self._activos.get(clave)
+            if existente is not None:
+                self._agrupados += 1
+                return existente, False
+            if len(self._pendientes) >= self.capacidad:
+                self._rechazados += 1
+                raise ColaLlena(len(self._pendientes), self._estimar_espera(len(self._pendientes)))
+            self._arrancar()
+            self._activos[clave] = id_trabajo
+            self._tiempos[id_trabajo] = {'encolado': time.monotonic(), 'inicio': None}
+            self._pendientes.append((id_trabajo, clave, args))
+            self._cond.notify()
+            return id_trabajo, True
+
+    def _estimar_espera(self, posicion):
+        # Segundos hasta que un trabajo en `posicion` empiece, según la duración media
+        media = self._duracion_media if self._duracion_media is not None else 60.0
+        return max(1, int(media * (posicion // self.trabajadores + 1)))
+
+    def _bucle(self):
+        while True:
+            with self._cond:
+                while not self._pendientes:
+                    self._cond.wait()
+                id_trabajo, clave, args = self._pendientes.popleft()
+                self._ocupados += 1
+                self._tiempos[id_trabajo]['inicio'] = time.monotonic()
+            try:
+                self.funcion(id_trabajo, *args)
+            except Exception:
+                traceback.print_exc()
+            finally:
+                fin = time.monotonic()
+                with self._cond:
+                    tiempos = self._tiempos.pop(id_trabajo)
+                    self._activos.pop(clave, None)
+                    self._ocupados -= 1
+                    self._completados += 1
+                    duracion = fin - tiempos['inicio']
+                    self._duracion_media = duracion if self._duracion_media is None else \
+                        _ALFA_MEDIA * duracion + (1 - _ALFA_MEDIA) * self._duracion_media
+                metricas = {
+                    'queue_wait_s': round(tiempos['inicio'] - tiempos['encolado'], 3),
+                    'run_time_s': round(duracion, 3),
+                }
+                if self.al_terminar is not None:
+                    self.al_terminar(id_trabajo, metricas)
+
+    def metricas(self, id_trabajo):
+        """
+        Posición en la cola (1 = el siguiente) y tiempos hasta ahora de un trabajo activo,
+        o None si el trabajo ya no está en el planificador
+        """
+        ahora = time.monotonic()
+        with self._cond:
+            tiempos = self._tiempos.get(id_trabajo)
+            if tiempos is None:
+                return None
+            if tiempos['inicio'] is None:
+                posicion = next(i for i, (id_pendiente, _, _) in enumerate(self._pendientes, 1)
+                                if id_pendiente == id_trabajo)
+                return {
+                    'queue_position': posicion,
+                    'queue_wait_s': round(ahora - tiempos['encolado'], 3),
+                    'estimated_start_s': self._estimar_espera(posicion - 1),
+                }
+            return {
+                'queue_wait_s': round(tiempos['inicio'] - tiempos['encolado'], 3),
+                'run_time_s': round(ahora - tiempos['inicio'], 3),
+            }
+
+    def estadisticas(self):
+        with self._cond:
+            return {
+                'workers': self.trabajadores,
+                'busy': self._ocupados,
+                'queued': len(self._pendientes),
+                'capacity': self.capacidad,
+                'completed': self._completados,
+                'coalesced': self._agrupados,
+                'rejected': self._rechazados,
+                'avg_run_time_s': round(self._duracion_media, 3) if self._duracion_media is not None else None,
+            }
+
+
+class PlanificadorSQLite:
+    """
+    Cola de trabajos compartida entre procesos, guardada en un AlmacenTrabajosSQLite
+    """
+
+    def __init__(self, almacen, capacidad=20, al_terminar=None, trabajadores=None):
+        self.almacen = almacen
+        self.capacidad = capacidad
+        self.al_terminar = al_terminar
+        # Solo informativo: los procesos que ejecutan trabajos se lanzan aparte
+        self.trabajadores = trabajadores
+
+    def enviar(self, id_trabajo, clave, *args):
+        """
+        Encola un trabajo ya creado en el almacén. Devuelve (id_trabajo, nuevo) como
+        PlanificadorTrabajos.enviar y lanza ColaLlena si no cabe.
+        """
+        id_asignado, resultado = self.almacen.encolar(id_trabajo, clave, list(args), self.capacidad)
+        if id_asignado is None:
+            raise ColaLlena(resultado, self._estimar_espera(resultado))
+        return id_asignado, resultado
+
+    def _estimar_espera(self, posicion):
+        media = self.almacen.estadisticas_cola()['avg_run_time_s'] or 60.0
+        return max(1, int(media * (posicion // (self.trabajadores or 1) + 1)))
+
+    def metricas(self, id_trabajo):
+        metricas = self.almacen.metricas_cola(id_trabajo)
+        if metricas and 'queue_position' in metricas:
+            metricas['estimated_start_s'] = self._estimar_espera(metricas['queue_position'] - 1)
+        return metricas
+
+    def atender(self, funcion, espera=1.0, parar=None):
+        """
+        Bucle de un proceso trabajador: toma trabajos de la cola y ejecuta
+        `funcion(id_trabajo, *args)` hasta que `parar` (threading/multiprocessing.Event) se active
+        """
+        while parar is None or not parar.is_set():
+            reclamado = self.almacen.reclamar()
+            if reclamado is None:
+                time.sleep(espera)
+                continue
+            id_trabajo, args = reclamado
+            terminado = threading.Event()
+            latido = threading.Thread(target=self._renovar, args=(id_trabajo, terminado),
+                                      name=f'latido-{id_trabajo}', daemon=True)
+            latido.start()
+            try:
+                funcion(id_trabajo, *args)
+            except Exception:
+                traceback.print_exc()
+            finally:
+                terminado.set()
+                latido.join()
+                metricas = self.almacen.terminar(id_trabajo)
+                if metricas is not None and self.al_terminar is not None:
+                    self.al_terminar(id_trabajo, metricas)
+
+    def _renovar(self, id_trabajo, terminado):
+        # Varias renovaciones por concesión, para que un latido perdido no baste para que caduque
+        while not terminado.wait(self.almacen.concesion / 4):
+            try:
+                self.almacen.renovar(id_trabajo)
+            except Exception:
+                traceback.print_exc()
+
+    def estadisticas(self):
+        cola = self.almacen.estadisticas_cola()
+        return {
+            'workers': self.trabajadores,
+            'busy': cola['busy'],
+            'queued': cola['queued'],
+            'capacity': self.capacidad,
+            'avg_run_time_s': round(cola['avg_run_time_s'], 3) if cola['avg_run_time_s'] is not None else None,
+        }
@@ -0,0 +1,74 @@
+"""
+Registro (logging) del rastreador.
+
+Los módulos de `rastreador` escriben sus mensajes con `logging.getLogger(__name__)`
+en lugar de print: cada mensaje tiene un nivel (los de cada página son INFO, los
+fallos WARNING) y datos estructurados en `extra` (url, host, estado...), de modo
+que el ruido de las rutas calientes se puede silenciar subiendo el nivel.
+
+`configurar_registro` instala un único manejador en el logger raíz que escribe en
+el sys.stdout de cada momento (así contextlib.redirect_stdout sigue funcionando),
+en texto plano o con un objeto JSON por línea.
+"""
+import json
+import logging
+import sys
+import time
+
+FORMATOS_REGISTRO = ('texto', 'json')
+NIVELES = ('DEBUG', 'INFO', 'WARNING', 'ERROR')
+
+# Atributos propios de LogRecord; el resto vienen de `extra`
+_ATRIBUTOS_REGISTRO = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class ManejadorSalida(logging.StreamHandler):
+    """
+    StreamHandler que siempre escribe en el sys.stdout actual
+    """
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, valor):
+        pass
+
+
+class FormatoJSON(logging.Formatter):
+    """
+    Un objeto JSON por mensaje con la hora, el nivel, el logger, el texto y los campos de `extra`
+    """
+
+    def format(self, record):
+        datos = {
+            'tiempo': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(record.created)) + f'.{int(record.msecs):03d}',
+            'nivel': record.levelname,
+            'logger': record.name,
+            'mensaje': record.getMessage(),
+        }
+        for clave, valor in vars(record).items():
+            if clave not in _ATRIBUTOS_REGISTRO and not clave.startswith('_'):
+                datos[clave] = valor
+        if record.exc_info:
+            datos['excepcion'] = self.formatException(record.exc_info)
+        return json.dumps(datos, ensure_ascii=False, default=str)
+
+
+def configurar_registro(nivel='INFO', formato='texto', plantilla='%(message)s'):
+    """
+    Configura el logger raíz; se puede llamar varias veces (sustituye el manejador anterior).
+    `plantilla` es el formato de logging del modo 'texto'.
+    """
+    if formato not in FORMATOS_REGISTRO:
+        raise ValueError(f"Formato de registro desconocido: {formato!r} (use {', '.join(FORMATOS_REGISTRO)})")
+    raiz = logging.getLogger()
+    for manejador in list(raiz.handlers):
+        if isinstance(manejador, ManejadorSalida):
+            raiz.removeHandler(manejador)
+    manejador = ManejadorSalida()
+    manejador.setFormatter(FormatoJSON() if formato == 'json' else logging.Formatter(plantilla))
+    raiz.addHandler(manejador)
+    raiz.setLevel(nivel.upper() if isinstance(nivel, str) else nivel)
+    return manejador
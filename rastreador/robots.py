@@ -0,0 +1,132 @@
+"""
+Reglas de robots.txt.
+
+Se aplican las reglas del grupo User-agent que corresponde al rastreador (o el
+grupo '*'): gana la regla Allow/Disallow más larga que coincide con la ruta y,
+a igual longitud, Allow. Se admiten los comodines '*' y '$'. Las líneas Sitemap
+se guardan para la fase de descubrimiento (rastreador.sitemap).
+"""
+import logging
+import re
+from urllib.parse import urljoin, urlparse
+
+from .cliente import obtener_cliente
+from .constantes import HEADERS
+
+logger = logging.getLogger(__name__)
+
+# Tamaño máximo leído de robots.txt; lo que sobra se ignora
+LIMITE_BYTES_ROBOTS = 512 * 1024
+
+
+def _patron(ruta):
+    """
+    Convierte una ruta de robots.txt con '*' y '$' en una expresión regular anclada al inicio
+    """
+    final = ruta.endswith('$')
+    if final:
+        ruta = ruta[:-1]
+    expresion = '.*'.join(re.escape(parte) for parte in ruta.split('*'))
+    return re.compile(expresion + ('$' if final else ''))
+
+
+class ReglasRobots:
+    """
+    Reglas de un robots.txt ya analizado. Sin reglas todo está permitido.
+    """
+
+    def __init__(self, texto='', agente=HEADERS['User-Agent']):
+        self.sitemaps = []
+        self.retraso = None   # Crawl-delay en segundos, si el grupo lo declara
+        self._reglas = []     # (longitud, permitida, patrón)
+        self._analizar(texto, agente.lower())
+
+    def _analizar(self, texto, agente):
+        grupos = []           # [(agentes, reglas, retraso)]
+        agentes, reglas, retraso = [], [], None
+        en_reglas = False
+        for linea in texto.splitlines():
+            linea = linea.split('#', 1)[0].strip()
+            campo, separador, valor = linea.partition(':')
+            if not separador:
+                continue
+            campo = campo.strip().lower()
+            valor = valor.strip()
+            if campo == 'sitemap':
+                # Las líneas Sitemap no pertenecen a ningún grupo
+                if valor:
+                    self.sitemaps.append(valor)
+            elif campo == 'user-agent':
+                if en_reglas:
+                    grupos.append((agentes, reglas, retraso))
+                    agentes, reglas, retraso = [], [], None
+                    en_reglas = False
+                agentes.append(valor.lower())
+            elif campo in ('allow', 'disallow'):
+                en_reglas = True
+                # "Disallow:" vacío no bloquea nada
+                if valor:
+                    reglas.append((len(valor), campo == 'allow', _patron(valor)))
+            elif campo == 'crawl-delay':
+                en_reglas = True
+                try:
+                    retraso = float(valor)
+                except ValueError:
+                    pass
+        if agentes:
+            grupos.append((agentes, reglas, retraso))
+
+        # Se aplica el grupo más específico: el nombre de agente más largo contenido en
+        # nuestro User-Agent, o '*'. Los grupos repetidos con ese agente se combinan.
+        def puntuacion(agentes_grupo):
+            return max(0 if nombre == '*' else (len(nombre) if nombre and nombre in agente else -1)
+                       for nombre in agentes_grupo)
+
+        mejor = max((puntuacion(g[0]) for g in grupos), default=-1)
+        if mejor < 0:
+            return
+        for agentes_grupo, reglas_grupo, retraso_grupo in grupos:
+            if puntuacion(agentes_grupo) == mejor:
+                self._reglas.extend(reglas_grupo)
+                if self.retraso is None:
+                    self.retraso = retraso_grupo
+
+    def permitida(self, url):
+        """
+        Indica si la URL se puede rastrear según las reglas del grupo aplicable
+        """
+        if not self._reglas:
+            return True
+        partes = urlparse(url)
+        ruta = (partes.path or '/') + (f'?{partes.query}' if partes.query else '')
+        mejor = None
+        for longitud, permitida, patron in self._reglas:
+            if patron.match(ruta) and (mejor is None or longitud > mejor[0]
+                                       or (longitud == mejor[0] and permitida)):
+                mejor = (longitud, permitida)
+        return mejor is None or mejor[1]
+
+    def __len__(self):
+        return len(self._reglas)
+
+
+def obtener_robots(url_base, cliente=None, timeout=10):
+    """
+    Descarga y analiza /robots.txt del sitio. Si no existe o no se puede leer,
+    devuelve unas reglas vacías (todo permitido).
+    """
+    url = urljoin(url_base, '/robots.txt')
+    cliente = cliente or obtener_cliente()
+    try:
+        with cliente.get(url, timeout=timeout, stream=True, allow_redirects=True) as response:
+            if response.status_code != 200:
+                return ReglasRobots()
+            contenido = b''
+            for bloque in response.iter_content(64 * 1024):
+                contenido += bloque
+                if len(contenido) >= LIMITE_BYTES_ROBOTS:
+                    break
+    except Exception as e:
+        logger.warning("  No se pudo leer %s: %s", url, e, extra={'url': url})
+        return ReglasRobots()
+    return ReglasRobots(contenido[:LIMITE_BYTES_ROBOTS].decode('utf-8', errors='replace'))
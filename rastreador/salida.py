@@ -0,0 +1,343 @@
+"""
+Escritura de resultados compartida por la CLI, la API web y la GUI.
+
+Durante el rastreo cada página se escribe en cuanto se visita (EscritorResultados,
+normalmente a través del observador SalidaIncremental), así que lo encontrado
+queda en disco aunque el proceso se interrumpa. Formatos:
+
+- 'txt': una URL encontrada por línea.
+- 'jsonl': un objeto por página visitada con url, estado HTTP, profundidad,
+  categoría, página de origen y si la URL se da por encontrada.
+- 'csv': los mismos campos con cabecera.
+
+Añadiendo '.gz' a la ruta el archivo se comprime con gzip.
+
+Al terminar, el archivo agrupado de siempre (URLs ordenadas y, en los sitios de
+Perú, solo las administrativas por categoría) se genera con un orden externo:
+bloques ordenados en archivos temporales que se mezclan con heapq.merge, de modo
+que la memoria no depende del número de URLs.
+"""
+import csv
+import gzip
+import heapq
+import json
+import os
+import tempfile
+import time
+
+from .clasificador import CATEGORIAS, clasificar_url
+from .metricas import DURACION_FASES
+
+FORMATOS = ('txt', 'jsonl', 'csv')
+CAMPOS = ('url', 'estado', 'profundidad', 'categoria', 'padre', 'encontrada')
+
+# Líneas que se ordenan en memoria antes de pasar un bloque a disco
+LINEAS_POR_BLOQUE = 200_000
+# Segundos entre volcados a disco de los escritores incrementales
+INTERVALO_VOLCADO = 2.0
+# Duraciones de la clasificación que se acumulan antes de pasarlas a crawler_phase_seconds
+LOTE_CLASIFICACION = 256
+
+# Grupos del archivo ordenado: categorías administrativas (y el resto) o todas las URLs
+GRUPO_NO_ADMINISTRATIVA = 'no_administrativa'
+GRUPOS_ADMINISTRATIVAS = CATEGORIAS + (GRUPO_NO_ADMINISTRATIVA,)
+GRUPOS_TODAS = ('urls',)
+TITULOS_CATEGORIA = {
+    'departamento': 'DEPARTAMENTOS',
+    'provincia': 'PROVINCIAS',
+    'distrito': 'DISTRITOS',
+    'otra': 'OTRAS URLs ADMINISTRATIVAS',
+}
+
+
+def es_sitio_peru(url):
+    """
+    Indica si en el sitio se filtran y agrupan las URLs administrativas
+    """
+    return 'enperu.org' in url or 'peru' in url.lower()
+
+
+def formato_de(ruta):
+    """
+    Formato según la extensión ('urls.jsonl.gz' -> 'jsonl'); 'txt' si no es ninguno conocido
+    """
+    nombre = ruta[:-3] if ruta.endswith('.gz') else ruta
+    extension = os.path.splitext(nombre)[1].lstrip('.').lower()
+    return extension if extension in FORMATOS else 'txt'
+
+
+def abrir_texto(ruta, modo='r'):
+    """
+    Abre un archivo de texto UTF-8, comprimido con gzip si la ruta termina en '.gz'
+    """
+    if ruta.endswith('.gz'):
+        return gzip.open(ruta, modo + 't', encoding='utf-8', newline='')
+    return open(ruta, modo, encoding='utf-8', newline='')
+
+
+class EscritorResultados:
+    """
+    Escribe páginas {url, estado, profundidad, categoria, padre, encontrada} a medida que llegan.
+    En formato 'txt' solo se escriben las URLs encontradas.
+    """
+
+    def __init__(self, ruta, formato=None, anadir=False, intervalo=INTERVALO_VOLCADO):
+        self.ruta = ruta
+        self.formato = formato or formato_de(ruta)
+        if self.formato not in FORMATOS:
+            raise ValueError(f"Formato de salida desconocido: {self.formato!r} (use {', '.join(FORMATOS)})")
+        self.intervalo = intervalo
+        self.escritas = 0
+        existia = anadir and os.path.exists(ruta) and os.path.getsize(ruta) > 0
+        directorio = os.path.dirname(os.path.abspath(ruta))
+        os.makedirs(directorio, exist_ok=True)
+        self._archivo = abrir_texto(ruta, 'a' if anadir else 'w')
+        self._csv = None
+        if self.formato == 'csv':
+            self._csv = csv.writer(self._archivo, lineterminator='\n')
+            if not existia:
+                self._csv.writerow(CAMPOS)
+        self._ultimo_volcado = time.monotonic()
+
+    def escribir(self, pagina):
+        if self.formato == 'txt':
+            if not pagina.get('encontrada', True):
+                return
+            self._archivo.write(pagina['url'] + '\n')
+        elif self.formato == 'jsonl':
+            fila = {campo: pagina.get(campo) for campo in CAMPOS}
+            self._archivo.write(json.dumps(fila, ensure_ascii=False) + '\n')
+        else:
+            self._csv.writerow(['' if pagina.get(campo) is None else pagina.get(campo) for campo in CAMPOS])
+        self.escritas += 1
+        if time.monotonic() - self._ultimo_volcado >= self.intervalo:
+            self.volcar()
+
+    def volcar(self):
+        if not self._archivo.closed:
+            self._archivo.flush()
+            self._ultimo_volcado = time.monotonic()
+
+    def cerrar(self):
+        if not self._archivo.closed:
+            self._archivo.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+
+class SalidaIncremental:
+    """
+    Observador del motor de rastreo que escribe cada página visitada en uno o varios
+    archivos (el formato sale de la extensión). `observador`, si se indica, recibe
+    después los mismos eventos. La duración de cada clasificación se acumula por host
+    y se registra en la fase 'classify' por lotes, fuera del camino de cada escritura.
+    """
+
+    def __init__(self, rutas, clasificar=False, anadir=False, observador=None):
+        self.escritores = [EscritorResultados(ruta, anadir=anadir) for ruta in rutas]
+        self.clasificar = clasificar
+        self.observador = observador
+        self._duraciones = {}
+        self._pendientes = 0
+
+    def __call__(self, evento, datos):
+        if evento == 'pagina':
+            self.escribir(datos)
+        elif evento == 'fin':
+            self._registrar_duraciones()
+            for escritor in self.escritores:
+                escritor.volcar()
+        if self.observador is not None:
+            self.observador(evento, datos)
+
+    def escribir(self, datos):
+        categoria = None
+        if self.clasificar and datos['encontrada']:
+            url = datos['url']
+            inicio = time.perf_counter()
+            clasificacion = clasificar_url(url)
+            duracion = time.perf_counter() - inicio
+            # Host de una URL absoluta sin pasar por urlparse
+            host = url.split('/', 3)[2]
+            duraciones = self._duraciones.get(host)
+            if duraciones is None:
+                duraciones = self._duraciones[host] = []
+            duraciones.append(duracion)
+            self._pendientes += 1
+            if self._pendientes >= LOTE_CLASIFICACION:
+                self._registrar_duraciones()
+            categoria = clasificacion.categoria if clasificacion else None
+        pagina = {'url': datos['url'], 'estado': datos.get('estado'), 'profundidad': datos['profundidad'],
+                  'categoria': categoria, 'padre': datos.get('padre'), 'encontrada': datos['encontrada']}
+        for escritor in self.escritores:
+            escritor.escribir(pagina)
+
+    def _registrar_duraciones(self):
+        for host, duraciones in self._duraciones.items():
+            DURACION_FASES.observar_lote(duraciones, 'classify', host)
+        self._duraciones = {}
+        self._pendientes = 0
+
+    def cerrar(self):
+        self._registrar_duraciones()
+        for escritor in self.escritores:
+            escritor.cerrar()
+
+
+def leer_urls(ruta):
+    """
+    URLs de un archivo de resultados en cualquiera de los FORMATOS (solo las encontradas)
+    """
+    formato = formato_de(ruta)
+    with abrir_texto(ruta) as f:
+        if formato == 'txt':
+            for linea in f:
+                linea = linea.strip()
+                if linea:
+                    yield linea
+        elif formato == 'jsonl':
+            for linea in f:
+                if linea.strip():
+                    pagina = json.loads(linea)
+                    if pagina.get('encontrada', True):
+                        yield pagina['url']
+        else:
+            for fila in csv.DictReader(f):
+                if fila.get('encontrada') in ('True', 'true', '1', ''):
+                    yield fila['url']
+
+
+def _volcar_bloque(lineas, directorio):
+    bloque = tempfile.TemporaryFile('w+', encoding='utf-8', newline='\n', dir=directorio)
+    for linea in sorted(set(lineas)):
+        bloque.write(linea + '\n')
+    bloque.seek(0)
+    return bloque
+
+
+def ordenar_externo(lineas, lineas_por_bloque=LINEAS_POR_BLOQUE, directorio=None):
+    """
+    Genera las líneas (sin saltos de línea) ordenadas y sin repetir. Si no caben en un
+    bloque de `lineas_por_bloque`, se ordenan por bloques en archivos temporales que
+    después se mezclan.
+    """
+    bloques = []
+    try:
+        bloque = []
+        for linea in lineas:
+            bloque.append(linea)
+            if len(bloque) >= lineas_por_bloque:
+                bloques.append(_volcar_bloque(bloque, directorio))
+                bloque = []
+        if not bloques:
+            fuentes = [sorted(set(bloque))]
+        else:
+            if bloque:
+                bloques.append(_volcar_bloque(bloque, directorio))
+            del bloque
+            fuentes = [(linea.rstrip('\n') for linea in archivo) for archivo in bloques]
+        anterior = None
+        for linea in heapq.merge(*fuentes):
+            if linea != anterior:
+                yield linea
+                anterior = linea
+    finally:
+        for archivo in bloques:
+            archivo.close()
+
+
+def ordenar_resultados(urls, ruta_destino, administrativas=False, lineas_por_bloque=LINEAS_POR_BLOQUE):
+    """
+    Ordena y deduplica las URLs encontradas y las guarda en `ruta_destino` como líneas
+    '<grupo>\\t<url>', grupo a grupo en el orden de GRUPOS_ADMINISTRATIVAS (sitios de Perú)
+    o GRUPOS_TODAS. Devuelve {grupo: número de URLs} con todos los grupos.
+    """
+    grupos = GRUPOS_ADMINISTRATIVAS if administrativas else GRUPOS_TODAS
+    conteo = dict.fromkeys(grupos, 0)
+
+    def claves():
+        for url in urls:
+            if administrativas:
+                clasificacion = clasificar_url(url)
+                grupo = clasificacion.categoria if clasificacion else GRUPO_NO_ADMINISTRATIVA
+            else:
+                grupo = GRUPOS_TODAS[0]
+            # El número delante del grupo fija el orden entre grupos
+            yield f"{grupos.index(grupo)}\t{grupo}\t{url}"
+
+    directorio = os.path.dirname(os.path.abspath(ruta_destino))
+    with open(ruta_destino, 'w', encoding='utf-8', newline='\n') as f:
+        for linea in ordenar_externo(claves(), lineas_por_bloque, directorio):
+            _, grupo, url = linea.split('\t', 2)
+            conteo[grupo] += 1
+            f.write(f"{grupo}\t{url}\n")
+    return conteo
+
+
+def leer_grupos(ruta_ordenada, grupos):
+    """
+    Recorre un archivo de ordenar_resultados y genera pares (grupo, iterador de URLs) para
+    cada uno de `grupos`, en orden y también los vacíos. Cada iterador debe consumirse
+    antes de pedir el siguiente par.
+    """
+    with open(ruta_ordenada, encoding='utf-8', newline='\n') as f:
+        lineas = (linea.rstrip('\n').split('\t', 1) for linea in f)
+        actual = next(lineas, None)
+
+        def urls_del_grupo(grupo):
+            nonlocal actual
+            while actual is not None and actual[0] == grupo:
+                yield actual[1]
+                actual = next(lineas, None)
+
+        for posicion, grupo in enumerate(grupos):
+            # Se saltan las líneas de grupos no pedidos (o cuyo iterador no se consumió)
+            restantes = grupos[posicion:]
+            while actual is not None and actual[0] not in restantes:
+                actual = next(lineas, None)
+            yield grupo, urls_del_grupo(grupo)
+
+
+def escribir_agrupado(ruta_ordenada, ruta_salida, dominio, conteo, administrativas=False):
+    """
+    Escribe el archivo de resultados de siempre a partir de un archivo de ordenar_resultados
+    """
+    total = sum(conteo.values())
+    with open(ruta_salida, 'w', encoding='utf-8') as f:
+        if not administrativas:
+            f.write(f"=== TODAS LAS URLs ENCONTRADAS EN {dominio} ===\n\n")
+            for _, urls in leer_grupos(ruta_ordenada, GRUPOS_TODAS):
+                for url in urls:
+                    f.write(f"{url}\n")
+            return
+        f.write(f"=== RESULTADOS PARA {dominio} ===\n")
+        f.write(f"Total de URLs encontradas: {total}\n")
+        f.write(f"URLs administrativas: {total - conteo[GRUPO_NO_ADMINISTRATIVA]}\n\n")
+        for categoria, urls in leer_grupos(ruta_ordenada, CATEGORIAS):
+            if not conteo[categoria]:
+                continue
+            f.write(f"=== {TITULOS_CATEGORIA[categoria]} ===\n")
+            for url in urls:
+                f.write(f"{url}\n")
+            # Como antes, sin línea en blanco tras la última sección
+            if categoria != 'otra':
+                f.write("\n")
+
+
+def guardar_agrupado(urls, ruta_salida, dominio, administrativas=False, lineas_por_bloque=LINEAS_POR_BLOQUE):
+    """
+    Ordena las URLs (un iterable cualquiera, por ejemplo leer_urls de un archivo
+    incremental) y escribe el archivo agrupado. Devuelve el conteo por grupo.
+    """
+    ruta_ordenada = ruta_salida + '.ordenadas'
+    try:
+        conteo = ordenar_resultados(urls, ruta_ordenada, administrativas, lineas_por_bloque)
+        escribir_agrupado(ruta_ordenada, ruta_salida, dominio, conteo, administrativas)
+    finally:
+        if os.path.exists(ruta_ordenada):
+            os.remove(ruta_ordenada)
+    return conteo
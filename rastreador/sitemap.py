@@ -0,0 +1,162 @@
+"""
+Descubrimiento de URLs a partir de los sitemaps del sitio.
+
+Los sitemaps se leen de las líneas Sitemap de robots.txt (o de /sitemap.xml si
+no hay ninguna). Cada archivo se descarga en streaming y se analiza con un
+parser XML incremental: los elementos ya procesados se liberan, de modo que la
+memoria no crece con el tamaño del sitemap. Se admiten índices de sitemaps
+anidados, sitemaps comprimidos con gzip y sitemaps de texto (una URL por línea).
+"""
+import logging
+import xml.etree.ElementTree as ET
+import zlib
+from collections import deque
+from urllib.parse import urljoin, urlparse
+
+from .cliente import obtener_cliente
+from .vistas import ConjuntoVistas
+
+logger = logging.getLogger(__name__)
+
+TAMANO_BLOQUE = 64 * 1024
+# Límites del protocolo: 50.000 URLs y 50 MB sin comprimir por archivo
+LIMITE_BYTES_SITEMAP = 50 * 1024 * 1024
+# Máximo de archivos de sitemap descargados por sitio (índices incluidos)
+MAX_SITEMAPS = 1000
+
+# 'semilla': las URLs de los sitemaps se añaden a la frontera del rastreo;
+# 'solo': se devuelven directamente, sin rastrear las páginas
+MODOS_SITEMAP = ('semilla', 'solo')
+
+
+def _nombre_local(etiqueta):
+    # '{http://www.sitemaps.org/schemas/sitemap/0.9}loc' -> 'loc'
+    return etiqueta.rsplit('}', 1)[-1]
+
+
+def _bloques_descomprimidos(response, url):
+    """
+    Bloques del cuerpo ya descomprimidos. requests deshace Content-Encoding; los
+    archivos .gz servidos tal cual se descomprimen aquí al vuelo.
+    """
+    descompresor = None
+    leidos = 0
+    for bloque in response.iter_content(TAMANO_BLOQUE):
+        if not bloque:
+            continue
+        if descompresor is None and leidos == 0 and bloque[:2] == b'\x1f\x8b':
+            descompresor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        if descompresor is not None:
+            bloque = descompresor.decompress(bloque)
+        leidos += len(bloque)
+        yield bloque
+        if leidos >= LIMITE_BYTES_SITEMAP:
+            logger.warning("  Sitemap truncado al superar %d MB: %s", LIMITE_BYTES_SITEMAP // (1024 * 1024), url,
+                           extra={'url': url})
+            return
+
+
+def leer_sitemap(url, cliente=None, timeout=30):
+    """
+    Recorre un archivo de sitemap y genera tuplas (tipo, url): 'url' para las páginas
+    de un <urlset> y 'sitemap' para las entradas de un <sitemapindex>
+    """
+    cliente = cliente or obtener_cliente()
+    with cliente.get(url, timeout=timeout, stream=True, allow_redirects=True) as response:
+        if response.status_code != 200:
+            logger.warning("  Sitemap no disponible (%d): %s", response.status_code, url,
+                           extra={'url': url, 'estado': response.status_code})
+            return
+        parser = None
+        es_texto = None
+        texto_pendiente = b''
+        raiz = None
+        tipo = 'url'
+        for bloque in _bloques_descomprimidos(response, url):
+            if es_texto is None:
+                # El primer carácter decide si es XML o texto plano
+                bloque = bloque.lstrip()
+                if not bloque:
+                    continue
+                es_texto = not bloque.startswith(b'<')
+                if not es_texto:
+                    parser = ET.XMLPullParser(events=('start', 'end'))
+            if es_texto:
+                # Sitemap de texto: una URL por línea
+                lineas = (texto_pendiente + bloque).split(b'\n')
+                texto_pendiente = lineas.pop()
+                for linea in lineas:
+                    linea = linea.strip().decode('utf-8', errors='replace')
+                    if linea:
+                        yield 'url', linea
+                continue
+
+            parser.feed(bloque)
+            for evento, elemento in parser.read_events():
+                nombre = _nombre_local(elemento.tag)
+                if evento == 'start':
+                    if raiz is None:
+                        raiz = elemento
+                        tipo = 'sitemap' if nombre == 'sitemapindex' else 'url'
+                    continue
+                if nombre == 'loc' and elemento.text:
+                    yield tipo, elemento.text.strip()
+                elif nombre in ('url', 'sitemap'):
+                    # Entrada completa: se libera todo lo construido hasta ahora
+                    raiz.clear()
+        if parser is not None:
+            parser.close()
+        elif texto_pendiente.strip():
+            yield 'url', texto_pendiente.strip().decode('utf-8', errors='replace')
+
+
+def descubrir_urls(url_base, sitemaps=None, robots=None, cliente=None, limite=None, canonico=None):
+    """
+    Genera las URLs del mismo dominio listadas en los sitemaps del sitio, normalizadas
+    como los enlaces del rastreo (sin parámetros ni barra final) y sin repetir.
+    sitemaps: URLs de partida (las líneas Sitemap de robots.txt); si no hay, /sitemap.xml.
+    robots: ReglasRobots con las que se descartan las URLs no permitidas.
+    limite: número máximo de URLs generadas.
+    canonico: Canonizador (rastreador.canonico) con el que se normalizan y filtran las URLs en
+    lugar de la normalización anterior.
+    Las URLs ya generadas se recuerdan por su hash en un ConjuntoVistas (rastreador.vistas),
+    que pasa a disco por encima de su límite de memoria.
+    """
+    dominio = urlparse(url_base).netloc
+    pendientes = deque(sitemaps or [urljoin(url_base, '/sitemap.xml')])
+    leidos = set()
+    vistas = ConjuntoVistas()
+    generadas = 0
+    try:
+        while pendientes and len(leidos) < MAX_SITEMAPS:
+            url_sitemap = pendientes.popleft()
+            if url_sitemap in leidos:
+                continue
+            leidos.add(url_sitemap)
+            logger.info("Leyendo sitemap: %s", url_sitemap, extra={'url': url_sitemap})
+            try:
+                for tipo, url in leer_sitemap(url_sitemap, cliente=cliente):
+                    if tipo == 'sitemap':
+                        pendientes.append(urljoin(url_sitemap, url))
+                        continue
+                    if canonico is not None:
+                        url = canonico.canonizar(urljoin(url_sitemap, url))
+                        if url is None:
+                            continue
+                    else:
+                        partes = urlparse(urljoin(url_sitemap, url))
+                        if partes.netloc != dominio:
+                            continue
+                        url = f"{partes.scheme}://{partes.netloc}{partes.path}".rstrip('/')
+                    if (robots is not None and not robots.permitida(url)) or not vistas.agregar(url):
+                        continue
+                    yield url
+                    generadas += 1
+                    if limite is not None and generadas >= limite:
+                        return
+            except ET.ParseError as e:
+                logger.warning("  Sitemap con XML no válido (%s): %s", e, url_sitemap, extra={'url': url_sitemap})
+            except Exception as e:
+                logger.warning("  Error al leer el sitemap %s: %s", url_sitemap, e, extra={'url': url_sitemap})
+    finally:
+        vistas.cerrar()
@@ -0,0 +1,642 @@
+"""
+Almacenes de trabajos de la API con tamaño acotado.
+
+- De cada trabajo se guardan solo los metadatos (estado, contadores, archivo de
+  salida...). Los trabajos terminados caducan a los `ttl` segundos y, si hay más
+  de `max_trabajos`, se descartan primero los terminados más antiguos. Los
+  trabajos en cola o en ejecución nunca se descartan.
+- Los archivos de cada trabajo (salida y listas de URLs) van a su propio
+  subdirectorio de `directorio`. Las listas se escriben una URL por línea, lista
+  tras lista, con un índice disperso (posición en bytes cada PASO_INDICE líneas)
+  para leer una página de resultados sin recorrer el archivo.
+- Las claves que empiezan por '_' son internas y no se devuelven en `publico`.
+- Los procesos que ejecutan rastreos publican en el almacén una instantánea de sus
+  métricas (rastreador.metricas) para que /metrics las sume; en memoria no hace
+  falta, porque los rastreos corren en el mismo proceso que la web.
+
+Hay dos implementaciones con la misma interfaz:
+- AlmacenTrabajos: en memoria, para un único proceso.
+- AlmacenTrabajosSQLite: en un archivo SQLite compartido por varios procesos
+  (varios workers de gunicorn y los procesos que ejecutan los rastreos). También
+  hace de cola de trabajos para PlanificadorSQLite. El proceso que ejecuta un
+  trabajo renueva su concesión (`latido`); si deja de hacerlo durante `concesion`
+  segundos (el proceso murió), el trabajo pasa a 'error' y su canal se cierra.
+"""
+import itertools
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from .eventos import CanalEventos
+
+TTL_TRABAJOS = 3600
+MAX_TRABAJOS = 500
+# Segundos que se conservan los eventos de un trabajo terminado
+TTL_CANALES = 300
+# Segundos sin latido tras los que un trabajo en ejecución se da por abandonado
+CONCESION_TRABAJOS = 60
+PASO_INDICE = 1000
+ESTADOS_ACTIVOS = ('queued', 'running')
+ARCHIVO_LISTAS = 'listas.txt'
+
+
+def publico(trabajo):
+    """
+    Metadatos de un trabajo sin las claves internas
+    """
+    return {clave: valor for clave, valor in trabajo.items() if not clave.startswith('_')}
+
+
+def escribir_listas(ruta, listas):
+    """
+    Escribe las listas {nombre: iterable de URLs} (o un iterable de pares (nombre, urls)
+    que se recorre en orden) y devuelve el índice {nombre: (total, posiciones)} para paginarlas
+    """
+    indice = {}
+    with open(ruta, 'w', encoding='utf-8', newline='\n') as f:
+        for nombre, urls in (listas.items() if isinstance(listas, dict) else listas):
+            posiciones = []
+            total = 0
+            for total, url in enumerate(urls, 1):
+                if (total - 1) % PASO_INDICE == 0:
+                    posiciones.append(f.tell())
+                f.write(url + '\n')
+            indice[nombre] = (total, posiciones)
+    return indice
+
+
+def leer_pagina(trabajo, lista, offset, limite):
+    """
+    Devuelve (urls, total) de una página de la lista, o None si la lista no existe
+    """
+    if lista not in (trabajo.get('_index') or {}):
+        return None
+    total, posiciones = trabajo['_index'][lista]
+    offset = max(0, offset)
+    if offset >= total or limite <= 0:
+        return [], total
+    bloque, saltar = divmod(offset, PASO_INDICE)
+    with open(trabajo['_results'], encoding='utf-8', newline='\n') as f:
+        f.seek(posiciones[bloque])
+        lineas = itertools.islice(f, saltar, saltar + min(limite, total - offset))
+        return [linea.rstrip('\n') for linea in lineas], total
+
+
+def _borrar_directorio(ruta_resultados):
+    # Borra el subdirectorio del trabajo (listas y archivo de salida)
+    shutil.rmtree(os.path.dirname(ruta_resultados), ignore_errors=True)
+
+
+class AlmacenTrabajos:
+    """
+    Metadatos de trabajos en memoria y resultados en `directorio`, seguro entre hilos
+    """
+
+    def __init__(self, directorio, ttl=TTL_TRABAJOS, max_trabajos=MAX_TRABAJOS, ttl_canales=TTL_CANALES):
+        self.directorio = directorio
+        self.ttl = ttl
+        self.max_trabajos = max_trabajos
+        self.ttl_canales = ttl_canales
+        os.makedirs(directorio, exist_ok=True)
+        self._trabajos = {}
+        self._canales = {}
+        self._lock = threading.Lock()
+        self.descartados = 0
+
+    def directorio_trabajo(self, id_trabajo):
+        ruta = os.path.join(self.directorio, id_trabajo)
+        os.makedirs(ruta, exist_ok=True)
+        return ruta
+
+    def crear(self, id_trabajo, datos):
+        ahora = time.time()
+        trabajo = dict(datos)
+        if trabajo.get('status') not in ESTADOS_ACTIVOS:
+            trabajo.setdefault('finished_at', ahora)
+        with self._lock:
+            self._trabajos[id_trabajo] = trabajo
+            self._desalojar(ahora)
+
+    def obtener(self, id_trabajo):
+        with self._lock:
+            trabajo = self._trabajos.get(id_trabajo)
+            return dict(trabajo) if trabajo is not None else None
+
+    def actualizar(self, id_trabajo, **campos):
+        """
+        Actualiza campos de un trabajo existente. Devuelve False si ya no existe.
+        """
+        with self._lock:
+            trabajo = self._trabajos.get(id_trabajo)
+            if trabajo is None:
+                return False
+            trabajo.update(campos)
+            if 'status' in campos:
+                if campos['status'] in ESTADOS_ACTIVOS:
+                    trabajo.pop('finished_at', None)
+                else:
+                    trabajo['finished_at'] = time.time()
+            return True
+
+    def reemplazar(self, id_trabajo, trabajo):
+        """
+        Restaura un trabajo tal cual estaba (o lo elimina, con sus eventos, si `trabajo` es None)
+        """
+        with self._lock:
+            if trabajo is None:
+                self._trabajos.pop(id_trabajo, None)
+                self._canales.pop(id_trabajo, None)
+            else:
+                self._trabajos[id_trabajo] = trabajo
+
+    def _desalojar(self, ahora):
+        # Se llama con el lock tomado
+        for id_trabajo in [i for i, canal in self._canales.items()
+                           if canal.cerrado and ahora - canal.cerrado_en > self.ttl_canales]:
+            del self._canales[id_trabajo]
+        terminados = sorted(
+            (trabajo['finished_at'], id_trabajo) for id_trabajo, trabajo in self._trabajos.items()
+            if 'finished_at' in trabajo
+        )
+        sobrantes = len(self._trabajos) - self.max_trabajos
+        for finalizado, id_trabajo in terminados:
+            if sobrantes <= 0 and ahora - finalizado <= self.ttl:
+                break
+            self._eliminar(id_trabajo)
+            sobrantes -= 1
+
+    def _eliminar(self, id_trabajo):
+        trabajo = self._trabajos.pop(id_trabajo)
+        self._canales.pop(id_trabajo, None)
+        self.descartados += 1
+        ruta = trabajo.get('_results')
+        # Un resultado servido desde la caché comparte archivos con el trabajo original
+        if ruta and not any(otro.get('_results') == ruta for otro in self._trabajos.values()):
+            _borrar_directorio(ruta)
+
+    def guardar_resultados(self, id_trabajo, listas):
+        """
+        Escribe las listas de URLs (véase escribir_listas) en disco. Los metadatos del trabajo
+        reciben `lists` ({nombre: número de URLs}) y el índice interno para paginar.
+        """
+        ruta = os.path.join(self.directorio_trabajo(id_trabajo), ARCHIVO_LISTAS)
+        indice = escribir_listas(ruta, listas)
+        self.actualizar(id_trabajo, lists={nombre: total for nombre, (total, _) in indice.items()},
+                        _results=ruta, _index=indice)
+        return ruta
+
+    def leer_resultados(self, id_trabajo, lista, offset=0, limite=100):
+        """
+        Devuelve (urls, total) de una página de la lista, o None si el trabajo o la lista no existen
+        """
+        trabajo = self.obtener(id_trabajo)
+        return leer_pagina(trabajo, lista, offset, limite) if trabajo is not None else None
+
+    def abrir_canal(self, id_trabajo):
+        """
+        Crea (o reinicia) el canal de eventos de progreso del trabajo
+        """
+        with self._lock:
+            canal = self._canales[id_trabajo] = CanalEventos()
+        return canal
+
+    def canal(self, id_trabajo):
+        with self._lock:
+            return self._canales.get(id_trabajo)
+
+    def publicar_metricas(self, proceso, instantanea):
+        pass
+
+    def leer_metricas(self, excluir=None):
+        return []
+
+    def __len__(self):
+        with self._lock:
+            return len(self._trabajos)
+
+    def estadisticas(self):
+        with self._lock:
+            activos = sum(1 for trabajo in self._trabajos.values() if 'finished_at' not in trabajo)
+            return {
+                'backend': 'memory',
+                'jobs': len(self._trabajos),
+                'active': activos,
+                'max_jobs': self.max_trabajos,
+                'ttl_s': self.ttl,
+                'evicted': self.descartados,
+            }
+
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS trabajos (
+    id TEXT PRIMARY KEY,
+    estado TEXT NOT NULL,
+    datos TEXT NOT NULL,
+    creado REAL NOT NULL,
+    finalizado REAL,
+    resultados TEXT,
+    clave TEXT,
+    argumentos TEXT,
+    encolado REAL,
+    inicio REAL,
+    duracion REAL,
+    latido REAL
+);
+CREATE INDEX IF NOT EXISTS idx_trabajos_cola ON trabajos (estado, encolado);
+CREATE INDEX IF NOT EXISTS idx_trabajos_clave ON trabajos (clave);
+CREATE INDEX IF NOT EXISTS idx_trabajos_resultados ON trabajos (resultados);
+CREATE TABLE IF NOT EXISTS eventos (
+    id_trabajo TEXT NOT NULL,
+    posicion INTEGER NOT NULL,
+    tipo TEXT NOT NULL,
+    datos TEXT NOT NULL,
+    PRIMARY KEY (id_trabajo, posicion)
+);
+CREATE TABLE IF NOT EXISTS canales (
+    id_trabajo TEXT PRIMARY KEY,
+    cerrado REAL
+);
+CREATE TABLE IF NOT EXISTS metricas (
+    proceso TEXT PRIMARY KEY,
+    datos TEXT NOT NULL,
+    actualizado REAL NOT NULL
+);
+"""
+
+
+class AlmacenTrabajosSQLite:
+    """
+    Almacén de trabajos compartido entre procesos en un archivo SQLite (modo WAL).
+    Cada proceso abre su propia conexión; las escrituras usan transacciones
+    BEGIN IMMEDIATE para que leer-modificar-escribir sea atómico entre procesos.
+    """
+
+    def __init__(self, ruta, directorio, ttl=TTL_TRABAJOS, max_trabajos=MAX_TRABAJOS, ttl_canales=TTL_CANALES,
+                 concesion=CONCESION_TRABAJOS):
+        self.ruta = ruta
+        self.directorio = directorio
+        self.ttl = ttl
+        self.max_trabajos = max_trabajos
+        self.ttl_canales = ttl_canales
+        self.concesion = concesion
+        os.makedirs(directorio, exist_ok=True)
+        os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+        self._conexion = sqlite3.connect(ruta, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conexion.execute("PRAGMA journal_mode=WAL")
+        self._conexion.execute("PRAGMA synchronous=NORMAL")
+        self._conexion.executescript(_ESQUEMA)
+        # Bases de datos creadas antes de que existiera la concesión de los trabajos
+        columnas = {fila[1] for fila in self._conexion.execute("PRAGMA table_info(trabajos)")}
+        if 'latido' not in columnas:
+            self._conexion.execute("ALTER TABLE trabajos ADD COLUMN latido REAL")
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _transaccion(self):
+        with self._lock:
+            self._conexion.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conexion
+            except BaseException:
+                self._conexion.execute("ROLLBACK")
+                raise
+            self._conexion.execute("COMMIT")
+
+    def _consultar(self, sql, parametros=()):
+        with self._lock:
+            return self._conexion.execute(sql, parametros).fetchall()
+
+    def directorio_trabajo(self, id_trabajo):
+        ruta = os.path.join(self.directorio, id_trabajo)
+        os.makedirs(ruta, exist_ok=True)
+        return ruta
+
+    def crear(self, id_trabajo, datos):
+        ahora = time.time()
+        estado = datos.get('status', 'queued')
+        finalizado = None if estado in ESTADOS_ACTIVOS else datos.get('finished_at', ahora)
+        if finalizado is not None:
+            datos = {**datos, 'finished_at': finalizado}
+        with self._transaccion() as c:
+            c.execute(
+                "INSERT OR REPLACE INTO trabajos (id, estado, datos, creado, finalizado, resultados) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (id_trabajo, estado, json.dumps(datos), ahora, finalizado, datos.get('_results')),
+            )
+            huerfanos = self._desalojar(c, ahora)
+        for ruta in huerfanos:
+            _borrar_directorio(ruta)
+
+    def obtener(self, id_trabajo):
+        filas = self._consultar("SELECT datos FROM trabajos WHERE id = ?", (id_trabajo,))
+        return json.loads(filas[0][0]) if filas else None
+
+    def actualizar(self, id_trabajo, **campos):
+        """
+        Actualiza campos de un trabajo existente. Devuelve False si ya no existe.
+        """
+        with self._transaccion() as c:
+            fila = c.execute("SELECT datos, estado, finalizado FROM trabajos WHERE id = ?", (id_trabajo,)).fetchone()
+            if fila is None:
+                return False
+            datos = json.loads(fila[0])
+            datos.update(campos)
+            estado, finalizado = fila[1], fila[2]
+            if 'status' in campos:
+                estado = campos['status']
+                if estado in ESTADOS_ACTIVOS:
+                    finalizado = None
+                    datos.pop('finished_at', None)
+                else:
+                    finalizado = datos['finished_at'] = time.time()
+            c.execute(
+                "UPDATE trabajos SET datos = ?, estado = ?, finalizado = ?, resultados = ? WHERE id = ?",
+                (json.dumps(datos), estado, finalizado, datos.get('_results'), id_trabajo),
+            )
+            return True
+
+    def reemplazar(self, id_trabajo, trabajo):
+        """
+        Restaura un trabajo tal cual estaba (o lo elimina, con sus eventos, si `trabajo` es None)
+        """
+        if trabajo is not None:
+            self.crear(id_trabajo, trabajo)
+            return
+        with self._transaccion() as c:
+            c.execute("DELETE FROM trabajos WHERE id = ?", (id_trabajo,))
+            c.execute("DELETE FROM eventos WHERE id_trabajo = ?", (id_trabajo,))
+            c.execute("DELETE FROM canales WHERE id_trabajo = ?", (id_trabajo,))
+
+    def _expirar(self, c, ahora):
+        """
+        Dentro de una transacción: pasa a 'error' los trabajos reclamados cuyo proceso dejó de
+        renovar la concesión, y cierra su canal con un evento 'failed'
+        """
+        filas = c.execute(
+            "SELECT id, datos FROM trabajos WHERE estado = 'running' AND latido IS NOT NULL AND latido < ?",
+            (ahora - self.concesion,),
+        ).fetchall()
+        for id_trabajo, datos in filas:
+            datos = json.loads(datos)
+            datos.update(status='error', message='Crawl worker stopped unexpectedly', finished_at=ahora)
+            c.execute("UPDATE trabajos SET estado = 'error', finalizado = ?, datos = ? WHERE id = ?",
+                      (ahora, json.dumps(datos), id_trabajo))
+            c.execute(
+                "INSERT INTO eventos (id_trabajo, posicion, tipo, datos) SELECT ?, COALESCE(MAX(posicion) + 1, 0), "
+                "'failed', ? FROM eventos WHERE id_trabajo = ? AND EXISTS "
+                "(SELECT 1 FROM canales WHERE id_trabajo = ? AND cerrado IS NULL)",
+                (id_trabajo, json.dumps(publico(datos)), id_trabajo, id_trabajo),
+            )
+            c.execute("UPDATE canales SET cerrado = ? WHERE id_trabajo = ? AND cerrado IS NULL", (ahora, id_trabajo))
+
+    def _desalojar(self, c, ahora):
+        # Dentro de una transacción; devuelve los archivos de resultados que ya nadie usa
+        self._expirar(c, ahora)
+        c.execute(
+            "DELETE FROM eventos WHERE id_trabajo IN (SELECT id_trabajo FROM canales WHERE cerrado < ?)",
+            (ahora - self.ttl_canales,),
+        )
+        c.execute("DELETE FROM canales WHERE cerrado < ?", (ahora - self.ttl_canales,))
+        total = c.execute("SELECT COUNT(*) FROM trabajos").fetchone()[0]
+        sobrantes = max(0, total - self.max_trabajos)
+        eliminados = c.execute(
+            "SELECT id, resultados FROM trabajos WHERE finalizado IS NOT NULL "
+            "AND (finalizado < ? OR id IN (SELECT id FROM trabajos WHERE finalizado IS NOT NULL "
+            "ORDER BY finalizado LIMIT ?))",
+            (ahora - self.ttl, sobrantes),
+        ).fetchall()
+        if not eliminados:
+            return []
+        c.executemany("DELETE FROM trabajos WHERE id = ?", ((id_trabajo,) for id_trabajo, _ in eliminados))
+        c.executemany("DELETE FROM eventos WHERE id_trabajo = ?", ((id_trabajo,) for id_trabajo, _ in eliminados))
+        c.executemany("DELETE FROM canales WHERE id_trabajo = ?", ((id_trabajo,) for id_trabajo, _ in eliminados))
+        # Un resultado servido desde la caché comparte archivos con el trabajo original
+        return [ruta for ruta in {ruta for _, ruta in eliminados if ruta}
+                if c.execute("SELECT 1 FROM trabajos WHERE resultados = ? LIMIT 1", (ruta,)).fetchone() is None]
+
+    def guardar_resultados(self, id_trabajo, listas):
+        """
+        Escribe las listas de URLs (véase escribir_listas) en disco. Los metadatos del trabajo
+        reciben `lists` ({nombre: número de URLs}) y el índice interno para paginar.
+        """
+        ruta = os.path.join(self.directorio_trabajo(id_trabajo), ARCHIVO_LISTAS)
+        indice = escribir_listas(ruta, listas)
+        self.actualizar(id_trabajo, lists={nombre: total for nombre, (total, _) in indice.items()},
+                        _results=ruta, _index=indice)
+        return ruta
+
+    def leer_resultados(self, id_trabajo, lista, offset=0, limite=100):
+        trabajo = self.obtener(id_trabajo)
+        return leer_pagina(trabajo, lista, offset, limite) if trabajo is not None else None
+
+    # Cola de trabajos (usada por PlanificadorSQLite)
+
+    def encolar(self, id_trabajo, clave, argumentos, capacidad):
+        """
+        Pone en cola un trabajo ya creado. Devuelve (id, nuevo): si hay un trabajo activo con
+        la misma clave, su id y nuevo=False. Devuelve (None, en_cola) si la cola está llena.
+        """
+        clave = json.dumps(clave)
+        with self._transaccion() as c:
+            # Un trabajo abandonado por un proceso muerto no debe absorber las peticiones nuevas
+            self._expirar(c, time.time())
+            fila = c.execute(
+                "SELECT id FROM trabajos WHERE clave = ? AND estado IN ('queued', 'running') AND id != ?",
+                (clave, id_trabajo),
+            ).fetchone()
+            if fila is not None:
+                return fila[0], False
+            en_cola = c.execute(
+                "SELECT COUNT(*) FROM trabajos WHERE estado = 'queued' AND encolado IS NOT NULL"
+            ).fetchone()[0]
+            if en_cola >= capacidad:
+                return None, en_cola
+            c.execute(
+                "UPDATE trabajos SET clave = ?, argumentos = ?, encolado = ?, inicio = NULL WHERE id = ?",
+                (clave, json.dumps(argumentos), time.time(), id_trabajo),
+            )
+            return id_trabajo, True
+
+    def reclamar(self):
+        """
+        Toma el trabajo en cola más antiguo y lo marca en ejecución. Devuelve (id, argumentos) o None.
+        Quien lo reclama tiene que renovar la concesión (`renovar`) mientras lo ejecuta.
+        """
+        ahora = time.time()
+        with self._transaccion() as c:
+            self._expirar(c, ahora)
+            fila = c.execute(
+                "SELECT id, argumentos, datos FROM trabajos WHERE estado = 'queued' AND encolado IS NOT NULL "
+                "ORDER BY encolado LIMIT 1"
+            ).fetchone()
+            if fila is None:
+                return None
+            id_trabajo, argumentos, datos = fila
+            datos = json.loads(datos)
+            datos['status'] = 'running'
+            c.execute("UPDATE trabajos SET estado = 'running', inicio = ?, latido = ?, datos = ? WHERE id = ?",
+                      (ahora, ahora, json.dumps(datos), id_trabajo))
+            return id_trabajo, json.loads(argumentos)
+
+    def renovar(self, id_trabajo):
+        """
+        Renueva la concesión de un trabajo en ejecución
+        """
+        with self._transaccion() as c:
+            c.execute("UPDATE trabajos SET latido = ? WHERE id = ? AND estado = 'running'", (time.time(), id_trabajo))
+
+    def terminar(self, id_trabajo):
+        """
+        Cierra la ejecución de un trabajo. Devuelve sus métricas de cola y ejecución.
+        Un trabajo que sigue activo (la función falló sin marcarlo) pasa a 'error'.
+        """
+        ahora = time.time()
+        with self._transaccion() as c:
+            fila = c.execute("SELECT encolado, inicio, estado FROM trabajos WHERE id = ?", (id_trabajo,)).fetchone()
+            if fila is None:
+                return None
+            encolado, inicio, estado = fila
+            c.execute("UPDATE trabajos SET duracion = ?, latido = NULL WHERE id = ?", (ahora - inicio, id_trabajo))
+        if estado in ESTADOS_ACTIVOS:
+            self.actualizar(id_trabajo, status='error', message='Crawl worker stopped unexpectedly')
+        return {'queue_wait_s': round(inicio - encolado, 3), 'run_time_s': round(ahora - inicio, 3)}
+
+    def metricas_cola(self, id_trabajo):
+        filas = self._consultar("SELECT estado, encolado, inicio FROM trabajos WHERE id = ?", (id_trabajo,))
+        if not filas or filas[0][1] is None or filas[0][0] not in ESTADOS_ACTIVOS:
+            return None
+        estado, encolado, inicio = filas[0]
+        ahora = time.time()
+        if inicio is None:
+            posicion = self._consultar(
+                "SELECT COUNT(*) FROM trabajos WHERE estado = 'queued' AND encolado IS NOT NULL AND encolado <= ?",
+                (encolado,),
+            )[0][0]
+            return {'queue_position': posicion, 'queue_wait_s': round(ahora - encolado, 3)}
+        return {'queue_wait_s': round(inicio - encolado, 3), 'run_time_s': round(ahora - inicio, 3)}
+
+    def estadisticas_cola(self):
+        (en_cola, en_ejecucion), = self._consultar(
+            "SELECT COALESCE(SUM(estado = 'queued' AND encolado IS NOT NULL), 0), "
+            "COALESCE(SUM(estado = 'running'), 0) FROM trabajos"
+        )
+        (duracion_media,), = self._consultar(
+            "SELECT AVG(duracion) FROM (SELECT duracion FROM trabajos WHERE duracion IS NOT NULL "
+            "ORDER BY finalizado DESC LIMIT 20)"
+        )
+        return {'queued': en_cola, 'busy': en_ejecucion, 'avg_run_time_s': duracion_media}
+
+    # Eventos de progreso
+
+    def abrir_canal(self, id_trabajo):
+        with self._transaccion() as c:
+            c.execute("DELETE FROM eventos WHERE id_trabajo = ?", (id_trabajo,))
+            c.execute("INSERT OR REPLACE INTO canales (id_trabajo, cerrado) VALUES (?, NULL)", (id_trabajo,))
+        return CanalSQLite(self, id_trabajo)
+
+    def canal(self, id_trabajo):
+        filas = self._consultar("SELECT 1 FROM canales WHERE id_trabajo = ?", (id_trabajo,))
+        return CanalSQLite(self, id_trabajo) if filas else None
+
+    def _publicar_evento(self, id_trabajo, tipo, datos):
+        with self._transaccion() as c:
+            c.execute(
+                "INSERT INTO eventos (id_trabajo, posicion, tipo, datos) SELECT ?, COALESCE(MAX(posicion) + 1, 0), ?, ? "
+                "FROM eventos WHERE id_trabajo = ?",
+                (id_trabajo, tipo, json.dumps(datos), id_trabajo),
+            )
+
+    def _leer_eventos(self, id_trabajo, desde):
+        filas = self._consultar(
+            "SELECT tipo, datos FROM eventos WHERE id_trabajo = ? AND posicion >= ? ORDER BY posicion",
+            (id_trabajo, desde),
+        )
+        return [(tipo, json.loads(datos)) for tipo, datos in filas]
+
+    def _cerrar_canal(self, id_trabajo):
+        with self._transaccion() as c:
+            c.execute("UPDATE canales SET cerrado = ? WHERE id_trabajo = ? AND cerrado IS NULL",
+                      (time.time(), id_trabajo))
+
+    def _canal_cerrado_en(self, id_trabajo):
+        filas = self._consultar("SELECT cerrado FROM canales WHERE id_trabajo = ?", (id_trabajo,))
+        return filas[0][0] if filas else time.time()
+
+    # Métricas de los procesos
+
+    def publicar_metricas(self, proceso, instantanea):
+        """
+        Guarda la última instantánea de métricas de un proceso (sustituye la anterior)
+        """
+        with self._transaccion() as c:
+            c.execute("INSERT OR REPLACE INTO metricas (proceso, datos, actualizado) VALUES (?, ?, ?)",
+                      (proceso, json.dumps(instantanea), time.time()))
+
+    def leer_metricas(self, excluir=None):
+        # Se conservan las de los procesos ya terminados para que los contadores no retrocedan
+        filas = self._consultar("SELECT datos FROM metricas WHERE proceso != ?", (excluir or '',))
+        return [json.loads(datos) for datos, in filas]
+
+    def __len__(self):
+        return self._consultar("SELECT COUNT(*) FROM trabajos")[0][0]
+
+    def estadisticas(self):
+        (total, activos), = self._consultar(
+            "SELECT COUNT(*), COALESCE(SUM(finalizado IS NULL), 0) FROM trabajos"
+        )
+        return {
+            'backend': 'sqlite',
+            'jobs': total,
+            'active': activos,
+            'max_jobs': self.max_trabajos,
+            'ttl_s': self.ttl,
+        }
+
+    def cerrar(self):
+        with self._lock:
+            self._conexion.close()
+
+
+class CanalSQLite:
+    """
+    Canal de eventos guardado en AlmacenTrabajosSQLite, con la interfaz de CanalEventos.
+    Los lectores consultan la tabla cada `intervalo` segundos.
+    """
+
+    def __init__(self, almacen, id_trabajo, intervalo=0.25):
+        self.almacen = almacen
+        self.id_trabajo = id_trabajo
+        self.intervalo = intervalo
+
+    @property
+    def cerrado_en(self):
+        return self.almacen._canal_cerrado_en(self.id_trabajo)
+
+    @property
+    def cerrado(self):
+        return self.cerrado_en is not None
+
+    def publicar(self, tipo, datos):
+        self.almacen._publicar_evento(self.id_trabajo, tipo, datos)
+
+    def cerrar(self):
+        self.almacen._cerrar_canal(self.id_trabajo)
+
+    def leer(self, desde, espera=15.0):
+        limite = time.monotonic() + espera
+        while True:
+            # El estado se consulta antes que los eventos para no perder los últimos
+            cerrado = self.cerrado
+            eventos = self.almacen._leer_eventos(self.id_trabajo, desde)
+            if eventos or cerrado or time.monotonic() >= limite:
+                return desde, eventos, cerrado
+            time.sleep(self.intervalo)
+
+    def __len__(self):
+        return self.almacen._consultar(
+            "SELECT COUNT(*) FROM eventos WHERE id_trabajo = ?", (self.id_trabajo,)
+        )[0][0]
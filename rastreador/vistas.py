@@ -0,0 +1,251 @@
+"""
+Conjunto compacto de URLs vistas para rastreos de millones de URLs.
+
+En lugar de guardar cada URL como cadena, se guarda un hash de 64 bits en una
+tabla de direccionamiento abierto respaldada por un array('Q'): 8 bytes por
+ranura frente a los ~150 bytes de una URL en un set. Con millones de URLs la
+probabilidad de que dos URLs distintas compartan hash es despreciable (del
+orden de n² / 2^65), aunque no nula: una colisión haría que una URL nueva se
+diera por vista. El hash es el de Python (SipHash), que cambia entre procesos:
+el conjunto no se guarda entre ejecuciones.
+
+Cuando la tabla necesitaría crecer por encima de `memoria_maxima`, sus hashes
+se vuelcan ordenados a un archivo temporal (un tramo) y la tabla se vacía. Los
+tramos se consultan con búsqueda binaria sobre mmap y se fusionan cuando hay
+demasiados. Un filtro de Bloom opcional delante evita casi todas las
+consultas a disco de las URLs nuevas.
+"""
+import heapq
+import math
+import mmap
+import tempfile
+from array import array
+from bisect import bisect_left
+
+from .constantes import MEMORIA_VISTAS
+
+CAPACIDAD_INICIAL = 1024
+# Ocupación máxima de la tabla antes de ampliarla o volcarla a disco
+CARGA_MAXIMA = 0.7
+# Tramos en disco a partir de los cuales se fusionan en uno solo
+MAX_TRAMOS = 8
+# Hashes escritos de una vez en un tramo
+_BLOQUE_ESCRITURA = 64 * 1024
+# Ranuras de la tabla que se ordenan de una vez al volcarla (acota la memoria temporal)
+_BLOQUE_ORDEN = 1 << 20
+
+
+def hash_url(url):
+    """
+    Hash de 64 bits sin signo de una URL; nunca 0, que marca las ranuras vacías de la tabla
+    """
+    return (hash(url) & 0xFFFFFFFFFFFFFFFF) or 1
+
+
+def _ceros(n):
+    return array('Q', [0]) * n
+
+
+class FiltroBloom:
+    """
+    Filtro de Bloom sobre hashes de 64 bits: sin falsos negativos y con una tasa de
+    falsos positivos cercana a `error` mientras no se superen `capacidad` elementos
+    """
+
+    def __init__(self, capacidad, error=0.01):
+        capacidad = max(1, int(capacidad))
+        self.bits = max(8, int(-capacidad * math.log(error) / math.log(2) ** 2))
+        self.funciones = max(1, round(self.bits / capacidad * math.log(2)))
+        self._bits = bytearray((self.bits + 7) // 8)
+
+    def agregar(self, valor):
+        # Doble hash (Kirsch-Mitzenmacher) a partir de las dos mitades del hash de 64 bits
+        bits, total = self._bits, self.bits
+        posicion, paso = valor & 0xFFFFFFFF, (valor >> 32) | 1
+        for _ in range(self.funciones):
+            posicion %= total
+            bits[posicion >> 3] |= 1 << (posicion & 7)
+            posicion += paso
+
+    def __contains__(self, valor):
+        bits, total = self._bits, self.bits
+        posicion, paso = valor & 0xFFFFFFFF, (valor >> 32) | 1
+        for _ in range(self.funciones):
+            posicion %= total
+            if not bits[posicion >> 3] & (1 << (posicion & 7)):
+                return False
+            posicion += paso
+        return True
+
+    def __len__(self):
+        return len(self._bits)
+
+
+class _Tramo:
+    """
+    Hashes ordenados en un archivo temporal, consultados con búsqueda binaria sobre mmap
+    """
+
+    def __init__(self, hashes):
+        self._archivo = tempfile.TemporaryFile()
+        total = 0
+        bloque = array('Q')
+        for valor in hashes:
+            bloque.append(valor)
+            if len(bloque) >= _BLOQUE_ESCRITURA:
+                bloque.tofile(self._archivo)
+                total += len(bloque)
+                bloque = array('Q')
+        bloque.tofile(self._archivo)
+        total += len(bloque)
+        self._archivo.flush()
+        self._mapa = mmap.mmap(self._archivo.fileno(), 0, access=mmap.ACCESS_READ) if total else None
+        self._vista = memoryview(self._mapa if total else b'')
+        self._hashes = self._vista.cast('Q')
+
+    def __contains__(self, valor):
+        i = bisect_left(self._hashes, valor)
+        return i < len(self._hashes) and self._hashes[i] == valor
+
+    def __iter__(self):
+        return iter(self._hashes)
+
+    def __len__(self):
+        return len(self._hashes)
+
+    def cerrar(self):
+        self._hashes.release()
+        self._vista.release()
+        if self._mapa is not None:
+            self._mapa.close()
+        self._archivo.close()
+
+
+class ConjuntoVistas:
+    """
+    Conjunto de URLs vistas que solo guarda su hash de 64 bits. `agregar` devuelve si
+    la URL era nueva. La tabla en memoria no pasa de `memoria_maxima` bytes; el resto
+    va a disco. Con `bloom` se añade un filtro de Bloom dimensionado para `capacidad` URLs.
+    No se pueden recorrer las URLs guardadas.
+    """
+
+    def __init__(self, memoria_maxima=MEMORIA_VISTAS, bloom=False, capacidad=10_000_000, error_bloom=0.01):
+        self.memoria_maxima = memoria_maxima
+        self.bloom = FiltroBloom(capacidad, error_bloom) if bloom else None
+        self._tabla = _ceros(CAPACIDAD_INICIAL)
+        self._mascara = CAPACIDAD_INICIAL - 1
+        self._limite = int(CAPACIDAD_INICIAL * CARGA_MAXIMA)
+        self._en_tabla = 0
+        self._tramos = []
+        self._en_disco = 0
+        self.volcados = 0
+
+    def _ranura(self, valor):
+        """
+        Posición de `valor` en la tabla, o de la ranura vacía donde iría
+        """
+        tabla = self._tabla
+        mascara = self._mascara
+        i = valor & mascara
+        while True:
+            actual = tabla[i]
+            if actual == valor or actual == 0:
+                return i
+            i = (i + 1) & mascara
+
+    def _en_tramos(self, valor):
+        return any(valor in tramo for tramo in self._tramos)
+
+    def contiene_hash(self, valor):
+        if self.bloom is not None and valor not in self.bloom:
+            return False
+        if self._tabla[self._ranura(valor)] == valor:
+            return True
+        return bool(self._tramos) and self._en_tramos(valor)
+
+    def agregar_hash(self, valor):
+        """
+        Añade un hash de hash_url; devuelve True si no estaba
+        """
+        # Sondeo lineal en línea: es la operación más frecuente del rastreo
+        tabla = self._tabla
+        mascara = self._mascara
+        i = valor & mascara
+        while True:
+            actual = tabla[i]
+            if actual == valor:
+                return False
+            if not actual:
+                break
+            i = (i + 1) & mascara
+        if self._tramos and (self.bloom is None or valor in self.bloom) and self._en_tramos(valor):
+            return False
+        if self._en_tabla >= self._limite:
+            self._hacer_sitio()
+            i = self._ranura(valor)
+        self._tabla[i] = valor
+        self._en_tabla += 1
+        if self.bloom is not None:
+            self.bloom.agregar(valor)
+        return True
+
+    def agregar(self, url):
+        return self.agregar_hash(hash_url(url))
+
+    def __contains__(self, url):
+        return self.contiene_hash(hash_url(url))
+
+    def __len__(self):
+        return self._en_tabla + self._en_disco
+
+    def _hacer_sitio(self):
+        # Se duplica la tabla mientras quepa en la memoria permitida; si no, se vuelca a disco
+        capacidad = len(self._tabla) * 2
+        if self.memoria_maxima is None or capacidad * 8 <= self.memoria_maxima:
+            self._redimensionar(capacidad)
+        else:
+            self._volcar()
+
+    def _redimensionar(self, capacidad):
+        anterior = self._tabla
+        self._tabla = _ceros(capacidad)
+        self._mascara = capacidad - 1
+        self._limite = int(capacidad * CARGA_MAXIMA)
+        for valor in anterior:
+            if valor:
+                self._tabla[self._ranura(valor)] = valor
+
+    def _volcar(self):
+        # La tabla se ordena por partes que luego se mezclan, sin pasar toda a una lista
+        capacidad = len(self._tabla)
+        partes = [array('Q', sorted(valor for valor in self._tabla[inicio:inicio + _BLOQUE_ORDEN] if valor))
+                  for inicio in range(0, capacidad, _BLOQUE_ORDEN)]
+        self._tabla = None
+        self._tramos.append(_Tramo(heapq.merge(*partes)))
+        del partes
+        self._en_disco += self._en_tabla
+        self._en_tabla = 0
+        self._tabla = _ceros(capacidad)
+        self.volcados += 1
+        if len(self._tramos) > MAX_TRAMOS:
+            # Los tramos no comparten hashes, así que la fusión no necesita eliminar repetidos
+            tramos = self._tramos
+            self._tramos = [_Tramo(heapq.merge(*tramos))]
+            for tramo in tramos:
+                tramo.cerrar()
+
+    def estadisticas(self):
+        return {
+            'entradas': len(self),
+            'en_memoria': self._en_tabla,
+            'en_disco': self._en_disco,
+            'bytes_memoria': len(self._tabla) * 8 + (len(self.bloom) if self.bloom is not None else 0),
+            'bytes_disco': self._en_disco * 8,
+            'tramos': len(self._tramos),
+            'volcados': self.volcados,
+        }
+
+    def cerrar(self):
+        for tramo in self._tramos:
+            tramo.cerrar()
+        self._tramos = []
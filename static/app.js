@@ -44,7 +44,7 @@ document.addEventListener('DOMContentLoaded', () => {
           downloadLink.classList.remove('d-none');
         }
         // show categorized lists if present
-        renderCategories(data);
+        renderCategories(job_id, data);
         startBtn.disabled = false;
       } else if (data.status === 'error') {
         progressBar.classList.add('d-none');
@@ -60,26 +60,121 @@ document.addEventListener('DOMContentLoaded', () => {
     }
   }
 
-  function renderCategories(data) {
-    const container = document.getElementById('categories');
-    container.innerHTML = '';
-    if (data.departamentos && data.departamentos.length) {
-      container.appendChild(renderList('Departamentos', data.departamentos));
-    }
-    if (data.provincias && data.provincias.length) {
-      container.appendChild(renderList('Provincias', data.provincias));
-    }
-    if (data.distritos && data.distritos.length) {
-      container.appendChild(renderList('Distritos', data.distritos));
+  // Títulos de las listas de resultados, en el orden en que se muestran
+  const LIST_TITLES = {
+    departamentos: 'Departamentos',
+    provincias: 'Provincias',
+    distritos: 'Distritos',
+    otras: 'Otras administrativas',
+    urls: 'Todas las URLs encontradas'
+  };
+  const MAX_SHOWN = 200;
+
+  function streamEvents(job_id) {
+    // Progreso en vivo por Server-Sent Events; sin soporte se vuelve al sondeo de /status
+    if (!window.EventSource) { pollStatus(job_id); return; }
+    const source = new EventSource(`/events/${job_id}`);
+    const lists = {};
+    let maxProgress = 0;
+    progressBar.classList.remove('d-none');
+
+    source.addEventListener('status', e => {
+      const data = JSON.parse(e.data);
+      statusEl.textContent = data.message || data.status;
+    });
+
+    source.addEventListener('page', e => {
+      const data = JSON.parse(e.data);
+      statusEl.textContent = `Explorando: ${data.visited} páginas visitadas, ${data.found} URLs encontradas, ` +
+        `${data.errors} errores, ${data.pending} pendientes`;
+      // La estimación puede bajar al descubrir nuevas páginas; la barra no retrocede
+      maxProgress = Math.max(maxProgress, data.progress);
+      setProgress(maxProgress);
+      if (data.list) appendUrl(lists, data.list, data.url);
+    });
+
+    source.addEventListener('done', e => {
+      source.close();
+      const data = JSON.parse(e.data);
+      if (!Object.keys(lists).length) {
+        // Resultado en caché: las listas no llegaron por el stream
+        pollStatus(job_id);
+        return;
+      }
+      showResult(job_id, data);
+    });
+
+    source.addEventListener('failed', e => {
+      source.close();
+      const data = JSON.parse(e.data);
+      progressBar.classList.add('d-none');
+      statusEl.textContent = 'Error: ' + (data.message || 'unknown');
+      startBtn.disabled = false;
+    });
+
+    source.onerror = () => {
+      // Conexión perdida definitivamente: seguir con el sondeo
+      if (source.readyState === EventSource.CLOSED) pollStatus(job_id);
+    };
+  }
+
+  function appendUrl(lists, name, url) {
+    let entry = lists[name];
+    if (!entry) {
+      const card = renderList(LIST_TITLES[name] || name, []);
+      entry = lists[name] = { title: card.querySelector('h6'), ul: card.querySelector('ul'), count: 0, card };
+      placeCard(lists, name);
     }
-    if (data.otras && data.otras.length) {
-      container.appendChild(renderList('Otras administrativas', data.otras));
+    entry.count += 1;
+    entry.title.textContent = `${LIST_TITLES[name] || name} (${entry.count})`;
+    if (entry.count <= MAX_SHOWN) entry.ul.appendChild(renderItem(url));
+  }
+
+  function placeCard(lists, name) {
+    // Mantener el orden de LIST_TITLES aunque las listas aparezcan en otro orden
+    const container = document.getElementById('categories');
+    const order = Object.keys(LIST_TITLES);
+    const next = order.slice(order.indexOf(name) + 1).find(other => lists[other]);
+    container.insertBefore(lists[name].card, next ? lists[next].card : null);
+  }
+
+  function showResult(job_id, data) {
+    progressBar.classList.add('d-none');
+    setProgress(100);
+    statusEl.textContent = data.message || data.status;
+    resultCard.classList.remove('d-none');
+    resultPre.textContent = JSON.stringify(data, null, 2);
+    if (data.file) {
+      downloadLink.href = `/result/${job_id}`;
+      downloadLink.classList.remove('d-none');
     }
-    if (data.urls && data.urls.length) {
-      container.appendChild(renderList('Todas las URLs encontradas', data.urls));
+    startBtn.disabled = false;
+  }
+
+  async function renderCategories(job_id, data) {
+    // Las listas se piden a /results (primera página de cada una); /status solo trae contadores
+    const container = document.getElementById('categories');
+    container.innerHTML = '';
+    const sizes = data.lists || {};
+    for (const name of Object.keys(LIST_TITLES)) {
+      if (!sizes[name]) continue;
+      const resp = await fetch(`/results/${job_id}?list=${name}&limit=${MAX_SHOWN}`);
+      if (!resp.ok) continue;
+      const page = await resp.json();
+      container.appendChild(renderList(`${LIST_TITLES[name]} (${page.total})`, page.items));
     }
   }
 
+  function renderItem(url) {
+    const li = document.createElement('li');
+    const a = document.createElement('a');
+    a.href = url;
+    a.textContent = url;
+    a.target = '_blank';
+    li.appendChild(a);
+    return li;
+  }
+
   function renderList(title, items) {
     const card = document.createElement('div');
     card.className = 'card my-2';
@@ -91,15 +186,7 @@ document.addEventListener('DOMContentLoaded', () => {
     body.appendChild(h);
     const ul = document.createElement('ul');
     ul.className = 'small';
-    items.slice(0, 200).forEach(it => {
-      const li = document.createElement('li');
-      const a = document.createElement('a');
-      a.href = it;
-      a.textContent = it;
-      a.target = '_blank';
-      li.appendChild(a);
-      ul.appendChild(li);
-    });
+    items.slice(0, MAX_SHOWN).forEach(it => ul.appendChild(renderItem(it)));
     body.appendChild(ul);
     card.appendChild(body);
     return card;
@@ -123,10 +210,16 @@ document.addEventListener('DOMContentLoaded', () => {
         body: JSON.stringify({ url, depth })
       });
 
-      if (resp.status === 202) {
+      if (resp.status === 202 || resp.status === 200) {
+        // 200: resultado reciente servido desde la caché
         const data = await resp.json();
-        statusEl.textContent = 'Trabajo creado. Iniciando...';
-        pollStatus(data.job_id);
+        if (data.cached) {
+          statusEl.textContent = 'Resultado en caché';
+          pollStatus(data.job_id);
+        } else {
+          statusEl.textContent = 'Trabajo creado. Iniciando...';
+          streamEvents(data.job_id);
+        }
       } else {
         const data = await resp.json();
         statusEl.textContent = 'Error: ' + (data.error || resp.statusText);
@@ -0,0 +1,64 @@
+"""
+Crawl worker processes for the shared SQLite job backend (JOB_BACKEND=sqlite).
+
+The web tier (gunicorn, any number of workers) only queues jobs in JOB_DB_PATH;
+these processes take jobs from that queue and run the crawls, one per process.
+A child process that dies is restarted.
+
+Usage: JOB_BACKEND=sqlite python worker.py [-n PROCESSES]
+"""
+import argparse
+import multiprocessing
+import os
+import signal
+import time
+
+
+def serve(stop):
+    # Imported in the child so every process opens its own SQLite connections
+    import app
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # The parent's SIGTERM handler only applies to the parent
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    app.scheduler.atender(app.process_job, parar=stop)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run crawl jobs queued by the web app")
+    parser.add_argument('-n', '--processes', type=int, default=int(os.environ.get('CRAWL_WORKERS', 2)),
+                        help="Crawls run in parallel, one per process (default CRAWL_WORKERS or 2)")
+    args = parser.parse_args()
+
+    if os.environ.get('JOB_BACKEND', 'memory') != 'sqlite':
+        parser.error("worker.py needs JOB_BACKEND=sqlite; with the memory backend crawls run inside the web process")
+
+    stop = multiprocessing.Event()
+
+    def start(i):
+        process = multiprocessing.Process(target=serve, args=(stop,), name=f"crawl-worker-{i}")
+        process.start()
+        return process
+
+    # Platforms stop the service with SIGTERM: finish the current jobs like on Ctrl+C
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    processes = [start(i) for i in range(max(1, args.processes))]
+    print(f"{len(processes)} crawl worker processes waiting for jobs")
+    try:
+        while True:
+            # A killed or crashed child (OOM, SIGKILL) is replaced; the job it was running
+            # fails once its lease expires (JOB_LEASE_SECONDS)
+            for i, process in enumerate(processes):
+                if not process.is_alive():
+                    print(f"{process.name} exited with code {process.exitcode}, restarting it")
+                    processes[i] = start(i)
+            time.sleep(1.0)
+    except KeyboardInterrupt:
+        # Running crawls finish their current job; queued ones stay in the queue
+        print("Stopping after the current jobs...")
+        stop.set()
+    for process in processes:
+        process.join()
+
+
+if __name__ == '__main__':
+    main()